@@ -18,11 +18,20 @@ CREATE TABLE IF NOT EXISTS conceptos (
     id SERIAL PRIMARY KEY,
     codigo VARCHAR(50) NOT NULL UNIQUE,
     nombre VARCHAR(255) NOT NULL,
-    tipo VARCHAR(20) NOT NULL CHECK (tipo IN ('remunerativo', 'no_remunerativo', 'deduccion')),
+    tipo VARCHAR(20) NOT NULL CHECK (tipo IN ('remunerativo', 'no_remunerativo', 'deduccion', 'contribucion')),
     es_comun BOOLEAN DEFAULT TRUE,
+    porcentaje DECIMAL(6,3),
+    orden INTEGER NOT NULL DEFAULT 100,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Conceptos no comunes que aplica cada convenio
+CREATE TABLE IF NOT EXISTS convenio_conceptos (
+    convenio_id INTEGER REFERENCES convenios(id) ON DELETE CASCADE,
+    concepto_id INTEGER REFERENCES conceptos(id) ON DELETE CASCADE,
+    PRIMARY KEY (convenio_id, concepto_id)
+);
+
 CREATE TABLE IF NOT EXISTS empleados (
     id SERIAL PRIMARY KEY,
     empresa_id INTEGER REFERENCES empresas(id),
@@ -52,8 +61,10 @@ CREATE TABLE IF NOT EXISTS liquidaciones (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Estado de cada tarea, persistido por worker_resultados desde la cola de resultados
 CREATE TABLE IF NOT EXISTS tareas (
     id SERIAL PRIMARY KEY,
+    task_id VARCHAR(100) NOT NULL UNIQUE,
     tipo VARCHAR(50) NOT NULL,
     payload JSONB NOT NULL,
     estado VARCHAR(20) NOT NULL CHECK (estado IN ('pendiente', 'procesando', 'completada', 'error')),
@@ -63,23 +74,240 @@ CREATE TABLE IF NOT EXISTS tareas (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
-CREATE INDEX idx_liquidaciones_empresa ON liquidaciones(empresa_id);
+-- Importaciones de novedades con Idempotency-Key: la respuesta queda guardada para repetirla
+CREATE TABLE IF NOT EXISTS importaciones (
+    lote_id VARCHAR(100) PRIMARY KEY,
+    empresa_id INTEGER NOT NULL,
+    periodo VARCHAR(7) NOT NULL,
+    codigo_http INTEGER,
+    respuesta JSONB,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Totales por empresa, periodo y estado, mantenidos por triggers en la misma transaccion
+-- que cada escritura en liquidaciones (ver src/common/resumen_liquidaciones.py)
+CREATE TABLE IF NOT EXISTS liquidaciones_resumen (
+    empresa_id INTEGER NOT NULL,
+    periodo VARCHAR(7) NOT NULL,
+    estado VARCHAR(20) NOT NULL,
+    cantidad BIGINT NOT NULL DEFAULT 0,
+    total_bruto NUMERIC(18,2) NOT NULL DEFAULT 0,
+    total_neto NUMERIC(18,2) NOT NULL DEFAULT 0,
+    total_cargas NUMERIC(18,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (empresa_id, periodo, estado)
+);
+
+-- Cache de archivos generados (ver src/common/cache_artefactos.py)
+CREATE TABLE IF NOT EXISTS artefactos (
+    clave VARCHAR(64) PRIMARY KEY,
+    tipo VARCHAR(50) NOT NULL,
+    empresa_id INTEGER NOT NULL,
+    periodo VARCHAR(7) NOT NULL,
+    huella VARCHAR(100) NOT NULL,
+    contenedor VARCHAR(100) NOT NULL,
+    nombre VARCHAR(255) NOT NULL,
+    -- Todos los archivos de la entrada en el contenedor (nombre incluido)
+    archivos JSONB NOT NULL DEFAULT '[]',
+    bytes BIGINT NOT NULL DEFAULT 0,
+    resultado JSONB NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    -- Marcada por los triggers; CacheArtefactos.desalojar borra la fila junto con su archivo
+    vencido BOOLEAN NOT NULL DEFAULT FALSE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    ultimo_uso TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
 CREATE INDEX idx_liquidaciones_periodo ON liquidaciones(periodo);
+-- (empresa_id, periodo) con el orden de la paginacion keyset de la API: sirve a los dos usos
+CREATE INDEX idx_liquidaciones_empresa_periodo ON liquidaciones(empresa_id, periodo, created_at DESC, id DESC);
+CREATE INDEX idx_artefactos_empresa_periodo ON artefactos(empresa_id, periodo);
 CREATE INDEX idx_empleados_empresa ON empleados(empresa_id);
-CREATE INDEX idx_tareas_estado ON tareas(estado);
+-- Paginacion keyset de la API: ORDER BY created_at DESC, id DESC con cada filtro como prefijo.
+-- idx_liquidaciones_empresa_recientes sirve tambien a los filtros por empresa_id sola
+CREATE INDEX idx_liquidaciones_recientes ON liquidaciones(created_at DESC, id DESC);
+CREATE INDEX idx_liquidaciones_estado_recientes ON liquidaciones(estado, created_at DESC, id DESC);
+CREATE INDEX idx_liquidaciones_empresa_recientes ON liquidaciones(empresa_id, created_at DESC, id DESC);
+CREATE INDEX idx_tareas_recientes ON tareas(created_at DESC, id DESC);
+CREATE INDEX idx_tareas_estado_recientes ON tareas(estado, created_at DESC, id DESC);
+CREATE INDEX idx_tareas_tipo_recientes ON tareas(tipo, created_at DESC, id DESC);
 
 INSERT INTO convenios (nombre, codigo, descripcion) VALUES
     ('Comercio', 'CCT130', 'Convenio Colectivo de Trabajo 130/75 - Empleados de Comercio'),
     ('Metalurgico', 'CCT260', 'Convenio Colectivo de Trabajo 260/75 - Metalurgicos'),
     ('Construccion', 'CCT076', 'Convenio Colectivo de Trabajo 76/75 - Construccion');
 
-INSERT INTO conceptos (codigo, nombre, tipo, es_comun) VALUES
-    ('00001', 'Sueldo Basico', 'remunerativo', true),
-    ('000100', 'Antiguedad', 'remunerativo', true),
-    ('000200', 'Presentismo', 'remunerativo', true),
-    ('00300', 'Horas Extra 50%', 'remunerativo', true),
-    ('010000', 'Sueldo Anual Complementario', 'remunerativo', true),
-    ('03000', 'Jubilacion 11%', 'deduccion', true),
-    ('03002', 'Ley 19032 3%', 'deduccion', true),
-    ('03010', 'Obra Social 3%', 'deduccion', true),
-    ('03500', 'Aporte Sindical 2.5%', 'deduccion', false);
\ No newline at end of file
+INSERT INTO conceptos (codigo, nombre, tipo, es_comun, porcentaje, orden) VALUES
+    ('00001', 'Sueldo Basico', 'remunerativo', true, NULL, 100),
+    ('000100', 'Antiguedad', 'remunerativo', true, NULL, 100),
+    ('000200', 'Presentismo', 'remunerativo', true, NULL, 100),
+    ('00300', 'Horas Extra 50%', 'remunerativo', true, NULL, 100),
+    ('010000', 'Sueldo Anual Complementario', 'remunerativo', true, NULL, 100),
+    ('03000', 'Jubilacion 11%', 'deduccion', true, 11.000, 10),
+    ('03002', 'Ley 19032 3%', 'deduccion', true, 3.000, 20),
+    ('03010', 'Obra Social 3%', 'deduccion', true, 3.000, 30),
+    ('03500', 'Aporte Sindical 2.5%', 'deduccion', false, 2.500, 40),
+    ('04000', 'Contribuciones Patronales 23%', 'contribucion', true, 23.000, 100);
+
+-- Invalidacion de caches de referencia en los workers (LISTEN cambios_referencia)
+CREATE OR REPLACE FUNCTION notificar_cambio_referencia() RETURNS trigger AS $$
+DECLARE
+    fila JSONB;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        fila := to_jsonb(OLD);
+    ELSE
+        fila := to_jsonb(NEW);
+    END IF;
+    PERFORM pg_notify('cambios_referencia', json_build_object(
+        'tabla', TG_TABLE_NAME,
+        'op', TG_OP,
+        'id', fila->'id',
+        'empresa_id', fila->'empresa_id'
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_empleados_referencia
+    AFTER INSERT OR UPDATE OR DELETE ON empleados
+    FOR EACH ROW EXECUTE FUNCTION notificar_cambio_referencia();
+
+CREATE TRIGGER trg_empresas_referencia
+    AFTER INSERT OR UPDATE OR DELETE ON empresas
+    FOR EACH ROW EXECUTE FUNCTION notificar_cambio_referencia();
+
+-- Cambios de estado de las tareas para la API (LISTEN tareas, ver src/common/espera_tareas.py)
+CREATE OR REPLACE FUNCTION notificar_tarea() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('tareas', NEW.task_id);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_tareas_notificar
+    AFTER INSERT OR UPDATE ON tareas
+    FOR EACH ROW EXECUTE FUNCTION notificar_tarea();
+
+-- Invalidacion de la cache de respuestas de la API (LISTEN cambios_liquidaciones, ver
+-- src/common/cache_respuestas.py): un aviso por sentencia, y Postgres une los iguales de una transaccion
+CREATE OR REPLACE FUNCTION notificar_cambio_liquidaciones() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('cambios_liquidaciones', TG_OP);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_liquidaciones_notificar
+    AFTER INSERT OR UPDATE OR DELETE ON liquidaciones
+    FOR EACH STATEMENT EXECUTE FUNCTION notificar_cambio_liquidaciones();
+
+-- updated_at refleja la ultima modificacion (es parte de la huella de la cache de artefactos)
+CREATE OR REPLACE FUNCTION actualizar_updated_at() RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at := clock_timestamp();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_liquidaciones_updated_at
+    BEFORE UPDATE ON liquidaciones
+    FOR EACH ROW EXECUTE FUNCTION actualizar_updated_at();
+
+-- Invalidacion de artefactos: una vez por sentencia con las (empresa, periodo) afectadas.
+-- Las entradas solo se marcan: el trigger no puede borrar el archivo del storage
+CREATE OR REPLACE FUNCTION invalidar_artefactos_liquidaciones() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE artefactos a SET vencido = TRUE
+        FROM (SELECT DISTINCT empresa_id, periodo FROM nuevas) n
+        WHERE a.empresa_id = n.empresa_id AND a.periodo = n.periodo AND NOT a.vencido;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE artefactos a SET vencido = TRUE
+        FROM (SELECT DISTINCT empresa_id, periodo FROM viejas) v
+        WHERE a.empresa_id = v.empresa_id AND a.periodo = v.periodo AND NOT a.vencido;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_liquidaciones_artefactos_insert
+    AFTER INSERT ON liquidaciones
+    REFERENCING NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION invalidar_artefactos_liquidaciones();
+
+CREATE TRIGGER trg_liquidaciones_artefactos_update
+    AFTER UPDATE ON liquidaciones
+    REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION invalidar_artefactos_liquidaciones();
+
+CREATE TRIGGER trg_liquidaciones_artefactos_delete
+    AFTER DELETE ON liquidaciones
+    REFERENCING OLD TABLE AS viejas
+    FOR EACH STATEMENT EXECUTE FUNCTION invalidar_artefactos_liquidaciones();
+
+-- Los archivos tambien dependen de datos de empleados (CBU, CUIL, nombre) y empresas
+CREATE OR REPLACE FUNCTION invalidar_artefactos_empresa() RETURNS trigger AS $$
+DECLARE
+    campo TEXT := CASE WHEN TG_TABLE_NAME = 'empresas' THEN 'id' ELSE 'empresa_id' END;
+BEGIN
+    -- En un DELETE NEW es NULL; en un UPDATE se cubren la empresa anterior y la nueva
+    UPDATE artefactos SET vencido = TRUE
+    WHERE empresa_id IN ((to_jsonb(OLD)->>campo)::integer, (to_jsonb(NEW)->>campo)::integer) AND NOT vencido;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_empleados_artefactos
+    AFTER UPDATE OR DELETE ON empleados
+    FOR EACH ROW EXECUTE FUNCTION invalidar_artefactos_empresa();
+
+CREATE TRIGGER trg_empresas_artefactos
+    AFTER UPDATE OR DELETE ON empresas
+    FOR EACH ROW EXECUTE FUNCTION invalidar_artefactos_empresa();
+
+-- Resumen de liquidaciones: una vez por sentencia, sumando las filas nuevas y restando las viejas
+CREATE OR REPLACE FUNCTION actualizar_resumen_liquidaciones() RETURNS trigger AS $$
+DECLARE
+    origen TEXT;
+BEGIN
+    origen := CASE TG_OP
+        WHEN 'INSERT' THEN 'SELECT *, 1 AS signo FROM nuevas'
+        WHEN 'DELETE' THEN 'SELECT *, -1 AS signo FROM viejas'
+        ELSE 'SELECT *, 1 AS signo FROM nuevas UNION ALL SELECT *, -1 AS signo FROM viejas'
+    END;
+
+    -- ORDER BY: las filas del resumen se bloquean siempre en el mismo orden (evita deadlocks)
+    EXECUTE '
+        INSERT INTO liquidaciones_resumen AS r (empresa_id, periodo, estado, cantidad, total_bruto, total_neto, total_cargas)
+        SELECT empresa_id, periodo, estado, SUM(signo),
+               SUM(signo * COALESCE(sueldo_bruto, 0)),
+               SUM(signo * COALESCE(sueldo_neto, 0)),
+               SUM(signo * COALESCE(cargas_sociales, 0))
+        FROM (' || origen || ') d
+        GROUP BY empresa_id, periodo, estado
+        ORDER BY empresa_id, periodo, estado
+        ON CONFLICT (empresa_id, periodo, estado) DO UPDATE SET
+            cantidad = r.cantidad + EXCLUDED.cantidad,
+            total_bruto = r.total_bruto + EXCLUDED.total_bruto,
+            total_neto = r.total_neto + EXCLUDED.total_neto,
+            total_cargas = r.total_cargas + EXCLUDED.total_cargas';
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_liquidaciones_resumen_insert
+    AFTER INSERT ON liquidaciones
+    REFERENCING NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION actualizar_resumen_liquidaciones();
+
+CREATE TRIGGER trg_liquidaciones_resumen_update
+    AFTER UPDATE ON liquidaciones
+    REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION actualizar_resumen_liquidaciones();
+
+CREATE TRIGGER trg_liquidaciones_resumen_delete
+    AFTER DELETE ON liquidaciones
+    REFERENCING OLD TABLE AS viejas
+    FOR EACH STATEMENT EXECUTE FUNCTION actualizar_resumen_liquidaciones();
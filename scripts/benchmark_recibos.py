@@ -0,0 +1,80 @@
+import sys
+import os
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from common.recibos_pdf import PlantillaRecibo, PoolRecibos
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def datos_sinteticos(cantidad):
+    """Recibos de prueba con la forma que arma WorkerReportes.datos_recibo (sin base de datos)"""
+    for i in range(cantidad):
+        bruto = round(random.uniform(400000, 3000000), 2)
+        deducciones = [
+            ('03000', 'Jubilacion 11%', round(bruto * 0.11, 2)),
+            ('03002', 'Ley 19032 3%', round(bruto * 0.03, 2)),
+            ('03010', 'Obra Social 3%', round(bruto * 0.03, 2))
+        ]
+        total_deducciones = round(sum(d[2] for d in deducciones), 2)
+        yield {
+            'razon_social': 'Empresa Test SA',
+            'cuit': '30-12345678-1',
+            'apellido': f"Apellido{i}",
+            'nombre': f"Empleado{i}",
+            'cuil': f"20-{30000000 + i}-0",
+            'legajo': f"LEG{i:05d}",
+            'liquidacion_id': i + 1,
+            'periodo': '2025-10',
+            'fecha': '31/10/2025',
+            'conceptos': [('', 'Remuneracion bruta', bruto, None)] + [(c, n, None, m) for c, n, m in deducciones],
+            'total_haberes': bruto,
+            'total_deducciones': total_deducciones,
+            'neto': round(bruto - total_deducciones, 2)
+        }
+
+
+def medir(nombre, cantidad, render):
+    inicio = time.perf_counter()
+    total_bytes = render()
+    segundos = time.perf_counter() - inicio
+    logger.info(f"{nombre:<28} {cantidad / segundos:>10.0f} recibos/s  ({segundos:.2f}s, {total_bytes / cantidad:.0f} bytes/recibo)")
+    return cantidad / segundos
+
+
+def benchmark(cantidad, procesos, bloque):
+    datos = list(datos_sinteticos(cantidad))
+
+    # Referencia: un solo proceso, plantilla ya compilada
+    plantilla = PlantillaRecibo()
+    medir("1 proceso (en linea)", cantidad, lambda: sum(len(plantilla.render(d)) for d in datos))
+
+    niveles = sorted({1, max(procesos // 2, 1), procesos})
+    for nivel in niveles:
+        pool = PoolRecibos(procesos=nivel, bloque=bloque)
+        try:
+            # Arranque de los procesos y compilacion de la plantilla fuera de la medicion
+            pool.renderizar(datos[0])
+            medir(f"pool de {nivel} procesos", cantidad,
+                  lambda: sum(len(pdf) for _, pdf in pool.renderizar_lote(iter(datos))))
+        finally:
+            pool.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Mide el render de recibos PDF (recibos por segundo)')
+    parser.add_argument('--recibos', type=int, default=20000, help='Cantidad de recibos a generar')
+    parser.add_argument('--procesos', type=int, default=os.cpu_count() or 1, help='Maximo de procesos del pool')
+    parser.add_argument('--bloque', type=int, default=64, help='Recibos por envio a cada proceso')
+    args = parser.parse_args()
+
+    logger.info("=" * 60)
+    logger.info(f"BENCHMARK DE RECIBOS PDF - {args.recibos} recibos")
+    logger.info("=" * 60)
+    benchmark(args.recibos, args.procesos, args.bloque)
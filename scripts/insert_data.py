@@ -4,6 +4,7 @@ import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
 from common.database import Database
+from common.validaciones import digito_cbu, digito_cuil
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -21,24 +22,30 @@ def insert_test_data():
         logger.info("Insertando empresa de prueba...")
         db.execute_query(
             "INSERT INTO empresas (razon_social, cuit, activa) VALUES (%s, %s, %s) ON CONFLICT DO NOTHING",
-            ("Empresa Test SA", "30-12345678-9", True),
+            ("Empresa Test SA", "30-12345678-1", True),
             fetch=False
         )
         
         # Insertar empleados de prueba
         logger.info("Insertando empleados de prueba...")
         for i in range(1, 6):
+            # CUIL y CBU con digitos verificadores validos (el archivo bancario los valida)
+            cuil = f"203456789{i}"
+            cuil = f"{cuil[:2]}-{cuil[2:]}-{digito_cuil(cuil)}"
+            banco_sucursal = "0110599"
+            cuenta = f"{i:013d}"
+            cbu = f"{banco_sucursal}{digito_cbu(banco_sucursal)}{cuenta}{digito_cbu(cuenta)}"
             db.execute_query(
                 """INSERT INTO empleados (empresa_id, convenio_id, cuil, nombre, apellido, legajo, cbu, activo)
                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
                    ON CONFLICT (empresa_id, cuil) DO NOTHING""",
-                (1, 1, f"20-3456789{i}-0", f"Empleado{i}", f"Apellido{i}", f"LEG00{i}", "0000003100012345678901", True),
+                (1, 1, cuil, f"Empleado{i}", f"Apellido{i}", f"LEG00{i}", cbu, True),
                 fetch=False
             )
         
         logger.info("Datos de prueba insertados correctamente")
         logger.info("")
-        logger.info("Empresa: Empresa Test SA (CUIT: 30-12345678-9)")
+        logger.info("Empresa: Empresa Test SA (CUIT: 30-12345678-1)")
         logger.info("Empleados: 5 empleados de prueba creados")
         logger.info("")
         logger.info("Ahora puedes iniciar el servidor y los workers")
@@ -0,0 +1,40 @@
+import sys
+import os
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from common.database import Database
+from common.resumen_liquidaciones import diferencias, reconstruir
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def verificar(db, limite=50):
+    """Informa las filas del resumen que no coinciden con liquidaciones"""
+    encontradas = diferencias(db)
+    for clave, guardado, real in encontradas[:limite]:
+        logger.warning(f"liquidaciones_resumen {clave}: guardado={guardado} real={real}")
+    if len(encontradas) > limite:
+        logger.info(f"  ... se muestran las primeras {limite} diferencias")
+    logger.info(f"Diferencias encontradas: {len(encontradas)}")
+    return not encontradas
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Verifica o reconstruye liquidaciones_resumen')
+    parser.add_argument('--reconstruir', action='store_true', help='Recalcular liquidaciones_resumen desde liquidaciones')
+    parser.add_argument('--limite', type=int, default=50, help='Maximo de diferencias a mostrar')
+    args = parser.parse_args()
+
+    db = Database()
+    try:
+        if args.reconstruir:
+            reconstruir(db)
+        ok = verificar(db, args.limite)
+    finally:
+        db.close()
+
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,69 @@
+import sys
+import os
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from common.database import Database
+from common.validaciones import validar_cbus, validar_cuils
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def validar_empleados(empresa_id=None, solo_activos=True, limite=50):
+    """Valida CUIL y CBU de todos los empleados leyendo la tabla por bloques"""
+
+    db = Database()
+    condiciones = []
+    params = []
+    if empresa_id is not None:
+        condiciones.append("empresa_id = %s")
+        params.append(empresa_id)
+    if solo_activos:
+        condiciones.append("activo = true")
+    where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+
+    query = f"SELECT id, empresa_id, legajo, cuil, cbu FROM empleados {where} ORDER BY id"
+
+    total = 0
+    conteo = {}
+    errores = []
+
+    try:
+        for bloque in db.stream_query(query, tuple(params)):
+            total += len(bloque)
+            for campo, reporte in (('cuil', validar_cuils([e['cuil'] for e in bloque])),
+                                   ('cbu', validar_cbus([e['cbu'] for e in bloque]))):
+                for error in reporte.errores_por_fila():
+                    conteo[(campo, error['error'])] = conteo.get((campo, error['error']), 0) + 1
+                    if len(errores) < limite:
+                        empleado = bloque[error['indice']]
+                        errores.append((empleado, campo, error))
+    finally:
+        db.close()
+
+    logger.info(f"Empleados validados: {total}")
+    for (campo, error), cantidad in sorted(conteo.items()):
+        logger.info(f"  {campo} {error}: {cantidad}")
+    for empleado, campo, error in errores:
+        logger.warning(
+            f"Empleado {empleado['id']} (empresa {empleado['empresa_id']}, legajo {empleado['legajo']}): "
+            f"{campo} {error['valor']!r} -> {error['error']}"
+        )
+    if sum(conteo.values()) > len(errores):
+        logger.info(f"  ... se muestran los primeros {len(errores)} errores")
+
+    return not conteo
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Valida CUIL y CBU de la tabla empleados')
+    parser.add_argument('--empresa', type=int, help='Validar solo una empresa')
+    parser.add_argument('--incluir-inactivos', action='store_true', help='Incluir empleados inactivos')
+    parser.add_argument('--limite', type=int, default=50, help='Maximo de errores a listar')
+    args = parser.parse_args()
+
+    ok = validar_empleados(args.empresa, not args.incluir_inactivos, args.limite)
+    sys.exit(0 if ok else 1)
@@ -3,12 +3,30 @@ import os
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
-from flask import Flask, request, jsonify
-from flask_cors import CORS
-import socket
+import io
+import re
+import csv
 import json
+import base64
+import uuid
+import functools
+from datetime import datetime
+from flask import Flask, Response, request, jsonify
+from flask_cors import CORS
 import logging
-from config.settings import SOCKET_HOST, SOCKET_PORT_1, SOCKET_BUFFER_SIZE
+from common.pool_servidores import get_pool_servidores
+from common.database import Database
+from common.resumen_liquidaciones import totales_globales, cantidad_dia
+from common.espera_tareas import get_espera_tareas
+from common.cache_respuestas import get_cache_respuestas
+from common.importacion_novedades import ImportacionNovedades, FormatoInvalido, registros_csv, registros_ndjson
+from config.settings import (
+    SOCKET_MAX_BATCH_SIZE,
+    GATEWAY_SERVIDORES,
+    TAREAS_ESPERA_MAX,
+    API_PAGINA_DEFAULT,
+    API_PAGINA_MAX
+)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -16,32 +34,54 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 CORS(app)
 
+# Pool de conexiones compartido por todos los requests
+db = Database()
 
-def enviar_tarea_socket(tarea, host='localhost', port=SOCKET_PORT_1):
-    """Envía tarea al servidor socket y retorna respuesta"""
+
+def enviar_tarea_socket(tarea):
+    """Envía tarea al servidor socket con menos solicitudes en curso y retorna respuesta"""
     try:
-        client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        client_socket.connect((host, port))
-        
-        mensaje = json.dumps(tarea)
-        client_socket.send(mensaje.encode('utf-8'))
-        
-        respuesta = client_socket.recv(SOCKET_BUFFER_SIZE).decode('utf-8')
-        respuesta_json = json.loads(respuesta)
-        
-        client_socket.close()
-        
-        return respuesta_json
+        return get_pool_servidores().solicitar(tarea)
         
     except Exception as e:
         logger.error(f"Error enviando tarea: {e}")
         return {'status': 'error', 'mensaje': str(e)}
 
 
+def cacheado(*grupos):
+    """
+    Respuesta de la vista cacheada por URL (ver common/cache_respuestas.py),
+    invalidada cuando cambian las tablas de `grupos`. Lleva ETag: si el
+    cliente ya tiene esa version se responde 304 sin cuerpo.
+    """
+    def decorador(vista):
+        @functools.wraps(vista)
+        def envoltura(*args, **kwargs):
+            def calcular():
+                respuesta, status = vista(*args, **kwargs)
+                return respuesta.get_data(), status
+            
+            cuerpo, status, etag = get_cache_respuestas().obtener(grupos, request.full_path, calcular)
+            respuesta = Response(cuerpo, status=status, mimetype='application/json')
+            if status != 200:
+                return respuesta
+            respuesta.set_etag(etag)
+            respuesta.headers['Cache-Control'] = 'no-cache'
+            return respuesta.make_conditional(request)
+        return envoltura
+    return decorador
+
+
 @app.route('/health', methods=['GET'])
 def health():
     """Endpoint de health check"""
-    return jsonify({'status': 'ok', 'service': 'API REST Liquidacion'}), 200
+    return jsonify({
+        'status': 'ok',
+        'service': 'API REST Liquidacion',
+        'db_pool': db.metricas(),
+        'cache_respuestas': get_cache_respuestas().metricas(),
+        'servidores': get_pool_servidores().metricas()
+    }), 200
 
 
 @app.route('/api/liquidacion', methods=['POST'])
@@ -87,7 +127,8 @@ def reporte():
             'tipo_reporte': data.get('tipo_reporte'),
             'liquidacion_id': data.get('liquidacion_id'),
             'empresa_id': data.get('empresa_id'),
-            'periodo': data.get('periodo')
+            'periodo': data.get('periodo'),
+            'formato': data.get('formato')
         }
         
         respuesta = enviar_tarea_socket(tarea)
@@ -182,121 +223,464 @@ def tarea_generica():
         return jsonify({'status': 'error', 'mensaje': str(e)}), 500
 
 
+@app.route('/api/lote', methods=['POST'])
+def lote():
+    """Endpoint para enviar muchas tareas en un solo mensaje"""
+    try:
+        data = request.get_json()
+        
+        if not data or not isinstance(data.get('tareas'), list) or not data['tareas']:
+            return jsonify({'status': 'error', 'mensaje': 'Se esperaba una lista de tareas'}), 400
+        
+        if len(data['tareas']) > SOCKET_MAX_BATCH_SIZE:
+            return jsonify({
+                'status': 'error',
+                'mensaje': f"El lote excede el maximo de {SOCKET_MAX_BATCH_SIZE} tareas"
+            }), 400
+        
+        respuesta = enviar_tarea_socket({'tipo': 'lote', 'tareas': data['tareas']})
+        
+        if respuesta['status'] in ('aceptada', 'parcial'):
+            return jsonify(respuesta), 200
+        else:
+            return jsonify(respuesta), 500
+            
+    except Exception as e:
+        logger.error(f"Error en endpoint lote: {e}")
+        return jsonify({'status': 'error', 'mensaje': str(e)}), 500
+
+
+ESTADOS = ('pendiente', 'procesando', 'completada', 'error')
+
+QUERY_LIQUIDACIONES = """
+    SELECT l.id, l.periodo, l.estado, l.sueldo_bruto, l.sueldo_neto,
+           l.cargas_sociales, l.procesado_por, l.created_at,
+           e.nombre, e.apellido, emp.razon_social
+    FROM liquidaciones l
+    JOIN empleados e ON l.empleado_id = e.id
+    JOIN empresas emp ON l.empresa_id = emp.id
+    {where}
+    ORDER BY l.created_at DESC, l.id DESC
+"""
+
+QUERY_TAREAS = """
+    SELECT id, task_id, tipo, estado, created_at, updated_at
+    FROM tareas
+    {where}
+    ORDER BY created_at DESC, id DESC
+"""
+
+
+class ParametroInvalido(Exception):
+    pass
+
+
+def codificar_cursor(fila):
+    """Cursor opaco con la clave de orden (created_at, id) de la ultima fila de la pagina"""
+    clave = json.dumps([fila['created_at'].isoformat(), fila['id']])
+    return base64.urlsafe_b64encode(clave.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    try:
+        creado, fila_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return datetime.fromisoformat(creado), int(fila_id)
+    except (ValueError, TypeError):
+        raise ParametroInvalido(f"Cursor invalido: {cursor}")
+
+
+def filtros_keyset(filtros, prefijo=''):
+    """
+    WHERE con los filtros (columna, valor) presentes y, si vino ?cursor=, la
+    condicion keyset: (created_at, id) menor que la ultima fila ya entregada.
+    """
+    condiciones = []
+    params = []
+    for columna, valor in filtros:
+        if valor is not None:
+            condiciones.append(f"{prefijo}{columna} = %s")
+            params.append(valor)
+    
+    cursor = request.args.get('cursor')
+    if cursor:
+        condiciones.append(f"({prefijo}created_at, {prefijo}id) < (%s, %s)")
+        params.extend(decodificar_cursor(cursor))
+    
+    where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ''
+    return where, params
+
+
+def limite_pagina():
+    limite = request.args.get('limite', API_PAGINA_DEFAULT, type=int)
+    if limite < 1:
+        raise ParametroInvalido("limite debe ser mayor a 0")
+    return min(limite, API_PAGINA_MAX)
+
+
+def pagina(clave, query, params, serializar):
+    """Una pagina keyset: se lee una fila de mas para saber si hay siguiente"""
+    limite = limite_pagina()
+    filas = db.execute_query(f"{query} LIMIT %s", params + [limite + 1])
+    if filas is None:
+        raise Exception("Error consultando la base de datos")
+    
+    siguiente = codificar_cursor(filas[limite - 1]) if len(filas) > limite else None
+    return jsonify({clave: [serializar(fila) for fila in filas[:limite]], 'siguiente': siguiente}), 200
+
+
+def exportar(clave, query, params, serializar):
+    """
+    Todas las filas como un unico JSON, leido con un cursor del servidor y
+    enviado por bloques (chunked): memoria constante sin importar el total.
+    """
+    def generar():
+        yield f'{{"{clave}": ['
+        separador = ''
+        for bloque in db.stream_query(query, params):
+            yield separador + ','.join(json.dumps(serializar(fila)) for fila in bloque)
+            separador = ','
+        yield ']}'
+    
+    return Response(generar(), mimetype='application/json')
+
+
+def filtros_liquidaciones():
+    estado = request.args.get('estado')
+    if estado is not None and estado not in ESTADOS:
+        raise ParametroInvalido(f"Estado invalido: {estado}")
+    return filtros_keyset([
+        ('empresa_id', request.args.get('empresa_id', type=int)),
+        ('periodo', request.args.get('periodo')),
+        ('estado', estado)
+    ], prefijo='l.')
+
+
+def liquidacion_json(liq):
+    return {
+        'id': liq['id'],
+        'empleado': f"{liq['nombre']} {liq['apellido']}",
+        'empresa': liq['razon_social'],
+        'periodo': liq['periodo'],
+        'estado': liq['estado'],
+        'sueldo_bruto': float(liq['sueldo_bruto']) if liq['sueldo_bruto'] else 0,
+        'sueldo_neto': float(liq['sueldo_neto']) if liq['sueldo_neto'] else 0,
+        'cargas_sociales': float(liq['cargas_sociales']) if liq['cargas_sociales'] else 0,
+        'procesado_por': liq['procesado_por'],
+        'fecha': liq['created_at'].isoformat() if liq['created_at'] else None
+    }
+
+
 @app.route('/api/liquidaciones', methods=['GET'])
+@cacheado('liquidaciones', 'referencia')
 def obtener_liquidaciones():
-    """Obtiene las últimas liquidaciones procesadas"""
+    """
+    Liquidaciones de la mas reciente a la mas antigua, filtrables por
+    empresa_id, periodo y estado. La respuesta trae `siguiente`: se pasa como
+    ?cursor= para pedir la pagina que sigue.
+    """
     try:
-        from common.database import Database
-        db = Database()
-        
-        query = """
-            SELECT l.id, l.periodo, l.estado, l.sueldo_bruto, l.sueldo_neto, 
-                   l.cargas_sociales, l.procesado_por, l.created_at,
-                   e.nombre, e.apellido, emp.razon_social
-            FROM liquidaciones l
-            JOIN empleados e ON l.empleado_id = e.id
-            JOIN empresas emp ON l.empresa_id = emp.id
-            ORDER BY l.created_at DESC
-            LIMIT 50
-        """
+        where, params = filtros_liquidaciones()
+        return pagina('liquidaciones', QUERY_LIQUIDACIONES.format(where=where), params, liquidacion_json)
         
-        liquidaciones = db.execute_query(query)
-        db.close()
-        
-        if liquidaciones:
-            result = []
-            for liq in liquidaciones:
-                result.append({
-                    'id': liq['id'],
-                    'empleado': f"{liq['nombre']} {liq['apellido']}",
-                    'empresa': liq['razon_social'],
-                    'periodo': liq['periodo'],
-                    'estado': liq['estado'],
-                    'sueldo_bruto': float(liq['sueldo_bruto']) if liq['sueldo_bruto'] else 0,
-                    'sueldo_neto': float(liq['sueldo_neto']) if liq['sueldo_neto'] else 0,
-                    'cargas_sociales': float(liq['cargas_sociales']) if liq['cargas_sociales'] else 0,
-                    'procesado_por': liq['procesado_por'],
-                    'fecha': liq['created_at'].isoformat() if liq['created_at'] else None
+    except ParametroInvalido as e:
+        return jsonify({'status': 'error', 'mensaje': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error obteniendo liquidaciones: {e}")
+        return jsonify({'status': 'error', 'mensaje': str(e)}), 500
+
+
+FORMATOS_IMPORTACION = {
+    'text/csv': registros_csv,
+    'application/x-ndjson': registros_ndjson,
+    'application/jsonl': registros_ndjson
+}
+
+
+def reservar_lote(lote_id, empresa_id, periodo):
+    """
+    Registra el lote_id de una importacion con Idempotency-Key. Devuelve None si
+    es nuevo, o (cuerpo, codigo) para responder sin volver a importar.
+    """
+    reservado = db.execute_query(
+        """
+        INSERT INTO importaciones (lote_id, empresa_id, periodo) VALUES (%s, %s, %s)
+        ON CONFLICT (lote_id) DO NOTHING
+        RETURNING lote_id
+        """,
+        (lote_id, empresa_id, periodo)
+    )
+    if reservado is None:
+        raise Exception("Error consultando la base de datos")
+    if reservado:
+        return None
+    previa = db.execute_query("SELECT periodo, codigo_http, respuesta FROM importaciones WHERE lote_id = %s", (lote_id,))
+    if not previa:
+        raise Exception("Error consultando la base de datos")
+    previa = previa[0]
+    if previa['periodo'] != periodo:
+        return {'status': 'error', 'mensaje': f"La Idempotency-Key ya se uso para el periodo {previa['periodo']}"}, 409
+    if previa['respuesta'] is None:
+        return {'status': 'error', 'mensaje': f"La importacion {lote_id} todavia esta en curso"}, 409
+    return previa['respuesta'], previa['codigo_http']
+
+
+@app.route('/api/liquidaciones/lote', methods=['POST'])
+def importar_liquidaciones():
+    """
+    Novedades de una empresa y periodo (?empresa_id=&periodo=) en un CSV (una
+    fila por concepto: empleado_id,codigo,monto[,tipo,nombre], agrupado por
+    empleado) o NDJSON (una linea por empleado: {"empleado_id": ..., "conceptos": [...]}).
+    El archivo se valida entero antes de enviar nada; despues cada
+    IMPORTACION_BLOQUE empleados validos se envia una tarea liquidacion_empresa,
+    y la respuesta trae el lote_id, las tareas enviadas y los rechazos por fila.
+    Con el header Idempotency-Key un reintento devuelve la respuesta original.
+    """
+    # lote_id reservado con Idempotency-Key mientras no tenga respuesta guardada
+    reservado = None
+    try:
+        empresa_id = request.args.get('empresa_id', type=int)
+        periodo = request.args.get('periodo', '')
+        if empresa_id is None or not re.fullmatch(r'\d{4}-\d{2}', periodo):
+            return jsonify({'status': 'error', 'mensaje': 'Se requieren empresa_id y periodo (AAAA-MM)'}), 400
+        
+        registros = FORMATOS_IMPORTACION.get(request.mimetype)
+        if registros is None:
+            return jsonify({
+                'status': 'error',
+                'mensaje': f"Formato no soportado: {request.mimetype} (text/csv o application/x-ndjson)"
+            }), 415
+        
+        clave = request.headers.get('Idempotency-Key')
+        if clave is not None and not re.fullmatch(r'[A-Za-z0-9_.:-]{1,64}', clave):
+            return jsonify({'status': 'error', 'mensaje': 'Idempotency-Key invalida (hasta 64 letras, numeros o _.:-)'}), 400
+        
+        # Solo los ids, por bloques: con 100k empleados el set pesa unos MB
+        empleados = set()
+        for bloque in db.stream_query("SELECT id FROM empleados WHERE empresa_id = %s AND activo = true", (empresa_id,)):
+            empleados.update(fila['id'] for fila in bloque)
+        codigos = db.execute_query("SELECT codigo FROM conceptos")
+        if codigos is None:
+            raise Exception("Error consultando la base de datos")
+        if not empleados:
+            return jsonify({'status': 'error', 'mensaje': f"La empresa {empresa_id} no tiene empleados activos"}), 404
+        
+        if clave is not None:
+            lote_id = f"lote_{empresa_id}_{clave}"
+            previa = reservar_lote(lote_id, empresa_id, periodo)
+            if previa is not None:
+                return jsonify(previa[0]), previa[1]
+            reservado = lote_id
+        else:
+            lote_id = f"lote_{empresa_id}_{uuid.uuid4().hex}"
+        
+        # Un reenvio del mismo archivo no vuelve a liquidar a quien ya tiene liquidacion en el periodo
+        liquidados = set()
+        for bloque in db.stream_query(
+            "SELECT DISTINCT empleado_id FROM liquidaciones WHERE empresa_id = %s AND periodo = %s AND estado <> 'error'",
+            (empresa_id, periodo)
+        ):
+            liquidados.update(fila['empleado_id'] for fila in bloque)
+        
+        importacion = ImportacionNovedades(empleados, {c['codigo'] for c in codigos}, liquidados)
+        procesado_por = request.args.get('procesado_por', 'Importacion Web/Mobile')
+        
+        # Sin request.get_data(): el cuerpo nunca se carga entero en memoria
+        texto = io.TextIOWrapper(io.BufferedReader(request.stream), encoding='utf-8-sig', newline='')
+        tareas = []
+        try:
+            for desde, hasta, novedades in importacion.bloques_validados(registros(texto)):
+                respuesta = enviar_tarea_socket({
+                    'tipo': 'liquidacion_empresa',
+                    'empresa_id': empresa_id,
+                    'periodo': periodo,
+                    'novedades': novedades,
+                    'procesado_por': procesado_por,
+                    'lote_id': lote_id
                 })
-            return jsonify({'liquidaciones': result}), 200
+                tareas.append({
+                    'task_id': respuesta.get('task_id'),
+                    'status': respuesta.get('status'),
+                    'mensaje': respuesta.get('mensaje'),
+                    'empleados': len(novedades),
+                    'filas': [desde, hasta]
+                })
+        except FormatoInvalido as e:
+            # El archivo se valida entero antes del primer envio: no se encolo nada
+            return jsonify(dict(importacion.resumen(), status='error', mensaje=str(e))), 400
+        except (UnicodeDecodeError, csv.Error) as e:
+            return jsonify(dict(
+                importacion.resumen(), status='error',
+                mensaje=f"Archivo ilegible despues de la fila {importacion.filas}: {e}"
+            )), 400
+        
+        enviados = sum(t['empleados'] for t in tareas if t['status'] == 'aceptada')
+        resumen = importacion.resumen()
+        if enviados and enviados == resumen['empleados_aceptados'] and not resumen['empleados_rechazados']:
+            status = 'aceptada'
+        elif enviados:
+            status = 'parcial'
         else:
-            return jsonify({'liquidaciones': []}), 200
-            
+            status = 'error'
+        
+        logger.info(f"Importacion {lote_id}: {enviados} empleados enviados en {len(tareas)} tareas, {resumen['empleados_rechazados']} rechazados")
+        
+        cuerpo = dict(resumen, status=status, lote_id=lote_id, empresa_id=empresa_id, periodo=periodo,
+                      empleados_enviados=enviados, tareas=tareas)
+        # Nada se encolo: por el archivo (400) o por el envio al servidor socket (500)
+        codigo = 200 if status != 'error' else 500 if tareas else 400
+        if reservado is not None and enviados:
+            guardada = db.execute_query(
+                "UPDATE importaciones SET codigo_http = %s, respuesta = %s WHERE lote_id = %s",
+                (codigo, json.dumps(cuerpo), reservado),
+                fetch=False
+            )
+            if guardada is None:
+                # La reserva queda en curso: un reintento recibe 409 en lugar de encolar de nuevo
+                logger.error(f"No se pudo guardar la respuesta de la importacion {reservado}")
+            reservado = None
+        return jsonify(cuerpo), codigo
+        
     except Exception as e:
-        logger.error(f"Error obteniendo liquidaciones: {e}")
+        logger.error(f"Error en importacion de liquidaciones: {e}")
         return jsonify({'status': 'error', 'mensaje': str(e)}), 500
+    finally:
+        if reservado is not None:
+            # No se encolo nada: la misma clave tiene que poder reintentarse con el archivo corregido
+            db.execute_query("DELETE FROM importaciones WHERE lote_id = %s", (reservado,), fetch=False)
+
+
+@app.route('/api/liquidaciones/exportar', methods=['GET'])
+def exportar_liquidaciones():
+    """Todas las liquidaciones que cumplen los filtros, en streaming"""
+    try:
+        where, params = filtros_liquidaciones()
+        return exportar('liquidaciones', QUERY_LIQUIDACIONES.format(where=where), params, liquidacion_json)
+        
+    except ParametroInvalido as e:
+        return jsonify({'status': 'error', 'mensaje': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error exportando liquidaciones: {e}")
+        return jsonify({'status': 'error', 'mensaje': str(e)}), 500
+
+
+def filtros_tareas():
+    estado = request.args.get('estado')
+    if estado is not None and estado not in ESTADOS:
+        raise ParametroInvalido(f"Estado invalido: {estado}")
+    return filtros_keyset([
+        ('estado', estado),
+        ('tipo', request.args.get('tipo'))
+    ])
+
+
+def tarea_json(tarea):
+    return {
+        'id': tarea['id'],
+        'task_id': tarea['task_id'],
+        'tipo': tarea['tipo'],
+        'estado': tarea['estado'],
+        'created_at': tarea['created_at'].isoformat() if tarea['created_at'] else None,
+        'updated_at': tarea['updated_at'].isoformat() if tarea['updated_at'] else None
+    }
 
 
 @app.route('/api/tareas', methods=['GET'])
+@cacheado('tareas')
 def obtener_tareas():
-    """Obtiene el historial de tareas"""
+    """Historial de tareas paginado por cursor, filtrable por estado y tipo"""
     try:
-        from common.database import Database
-        db = Database()
-        
-        query = """
-            SELECT id, tipo, estado, created_at, updated_at
-            FROM tareas
-            ORDER BY created_at DESC
-            LIMIT 100
-        """
+        where, params = filtros_tareas()
+        return pagina('tareas', QUERY_TAREAS.format(where=where), params, tarea_json)
         
-        tareas = db.execute_query(query)
-        db.close()
-        
-        if tareas:
-            result = []
-            for tarea in tareas:
-                result.append({
-                    'id': tarea['id'],
-                    'tipo': tarea['tipo'],
-                    'estado': tarea['estado'],
-                    'created_at': tarea['created_at'].isoformat() if tarea['created_at'] else None,
-                    'updated_at': tarea['updated_at'].isoformat() if tarea['updated_at'] else None
-                })
-            return jsonify({'tareas': result}), 200
-        else:
-            return jsonify({'tareas': []}), 200
-            
+    except ParametroInvalido as e:
+        return jsonify({'status': 'error', 'mensaje': str(e)}), 400
     except Exception as e:
         logger.error(f"Error obteniendo tareas: {e}")
         return jsonify({'status': 'error', 'mensaje': str(e)}), 500
 
 
+@app.route('/api/tareas/exportar', methods=['GET'])
+def exportar_tareas():
+    """Todas las tareas que cumplen los filtros, en streaming"""
+    try:
+        where, params = filtros_tareas()
+        return exportar('tareas', QUERY_TAREAS.format(where=where), params, tarea_json)
+        
+    except ParametroInvalido as e:
+        return jsonify({'status': 'error', 'mensaje': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error exportando tareas: {e}")
+        return jsonify({'status': 'error', 'mensaje': str(e)}), 500
+
+
+def estado_tarea(task_id, tarea):
+    """Fila de tareas como JSON; sin fila la tarea sigue en cola (o el task_id no existe)"""
+    if tarea is None:
+        return {'task_id': task_id, 'estado': 'pendiente'}
+    return {
+        'task_id': tarea['task_id'],
+        'tipo': tarea['tipo'],
+        'estado': tarea['estado'],
+        'resultado': tarea['resultado'],
+        'error_mensaje': tarea['error_mensaje'],
+        'created_at': tarea['created_at'].isoformat() if tarea['created_at'] else None,
+        'updated_at': tarea['updated_at'].isoformat() if tarea['updated_at'] else None
+    }
+
+
+@app.route('/api/tarea/<task_id>', methods=['GET'])
+def obtener_tarea(task_id):
+    """
+    Estado de una tarea. Con ?esperar=N responde apenas la tarea termina (o a
+    los N segundos con el ultimo estado). Con Accept: text/event-stream envia
+    un evento por cada cambio de estado hasta el final.
+    """
+    try:
+        espera = get_espera_tareas()
+        
+        if request.accept_mimetypes.best == 'text/event-stream':
+            timeout = min(request.args.get('esperar', TAREAS_ESPERA_MAX, type=float), TAREAS_ESPERA_MAX)
+            
+            def eventos():
+                for tarea in espera.cambios(task_id, timeout):
+                    yield f"event: estado\ndata: {json.dumps(estado_tarea(task_id, tarea))}\n\n"
+            
+            return Response(eventos(), mimetype='text/event-stream', headers={
+                'Cache-Control': 'no-cache',
+                'X-Accel-Buffering': 'no'
+            })
+        
+        timeout = min(max(request.args.get('esperar', 0, type=float), 0), TAREAS_ESPERA_MAX)
+        if timeout > 0:
+            tarea = espera.esperar(task_id, timeout)
+        else:
+            tarea = espera.leer(task_id)
+        return jsonify(estado_tarea(task_id, tarea)), 200
+        
+    except Exception as e:
+        logger.error(f"Error obteniendo tarea {task_id}: {e}")
+        return jsonify({'status': 'error', 'mensaje': str(e)}), 500
+
+
 @app.route('/api/estadisticas', methods=['GET'])
+@cacheado('liquidaciones', 'referencia')
 def obtener_estadisticas():
     """Obtiene estadísticas generales del sistema"""
     try:
-        from common.database import Database
-        db = Database()
-        
-        # Total de liquidaciones
-        query_liq = "SELECT COUNT(*) as total FROM liquidaciones WHERE estado = 'completada'"
-        result_liq = db.execute_query(query_liq)
-        total_liquidaciones = result_liq[0]['total'] if result_liq else 0
-        
-        # Liquidaciones hoy
-        query_hoy = """
-            SELECT COUNT(*) as total FROM liquidaciones 
-            WHERE DATE(created_at) = CURRENT_DATE AND estado = 'completada'
-        """
-        result_hoy = db.execute_query(query_hoy)
-        liquidaciones_hoy = result_hoy[0]['total'] if result_hoy else 0
-        
-        # Total procesado
-        query_total = """
-            SELECT SUM(sueldo_neto) as total FROM liquidaciones 
-            WHERE estado = 'completada'
-        """
-        result_total = db.execute_query(query_total)
-        total_procesado = float(result_total[0]['total']) if result_total and result_total[0]['total'] else 0
+        # Una sola conexion del pool; los totales salen de liquidaciones_resumen
+        with db.conexion():
+            # Total de liquidaciones y total procesado
+            totales = totales_globales(db)
+            total_liquidaciones = totales['cantidad'] if totales else 0
+            total_procesado = float(totales['total_neto']) if totales else 0
         
-        # Empleados activos
-        query_emp = "SELECT COUNT(*) as total FROM empleados WHERE activo = true"
-        result_emp = db.execute_query(query_emp)
-        empleados_activos = result_emp[0]['total'] if result_emp else 0
+            # Liquidaciones hoy
+            liquidaciones_hoy = cantidad_dia(db)
         
-        db.close()
+            # Empleados activos
+            query_emp = "SELECT COUNT(*) as total FROM empleados WHERE activo = true"
+            result_emp = db.execute_query(query_emp)
+            empleados_activos = result_emp[0]['total'] if result_emp else 0
         
         return jsonify({
             'total_liquidaciones': total_liquidaciones,
@@ -319,7 +703,10 @@ if __name__ == '__main__':
     logger.info("  POST /api/archivo-bancario")
     logger.info("  POST /api/cargas-sociales")
     logger.info("  POST /api/tarea (genérico)")
+    logger.info("  POST /api/lote")
+    logger.info("  POST /api/liquidaciones/lote (CSV o NDJSON)")
+    logger.info("  GET  /api/tarea/<task_id> (?esperar=segundos o text/event-stream)")
     logger.info("")
-    logger.info("Conectando a Socket Server en localhost:9001")
+    logger.info(f"Servidores socket: {', '.join(f'{host}:{port}' for host, port in GATEWAY_SERVIDORES)}")
     
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
@@ -1,11 +1,9 @@
-import socket
-import json
 import logging
 import sys
 import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
-import time
-from config.settings import SOCKET_HOST, SOCKET_PORT_1, SOCKET_BUFFER_SIZE
+from common.protocol import ConexionFramed
+from config.settings import SOCKET_HOST, SOCKET_PORT_1, SOCKET_MAX_BATCH_SIZE
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -15,35 +13,84 @@ class Cliente:
     def __init__(self, host='localhost', port=SOCKET_PORT_1):
         self.host = host
         self.port = port
+        # Conexion persistente: se abre en el primer envio y se reutiliza
+        self.conexion = ConexionFramed(host, port)
     
     def enviar_tarea(self, tarea):
         try:
-            # Crear socket
-            client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            client_socket.connect((self.host, self.port))
-            logger.info(f"Conectado al servidor {self.host}:{self.port}")
-            
-            # Enviar tarea
-            mensaje = json.dumps(tarea)
-            client_socket.send(mensaje.encode('utf-8'))
+            respuesta_json = self.conexion.solicitar(tarea)
             logger.info(f"Tarea enviada: {tarea['tipo']}")
             
-            # Recibir respuesta
-            respuesta = client_socket.recv(SOCKET_BUFFER_SIZE).decode('utf-8')
-            respuesta_json = json.loads(respuesta)
-            
             logger.info(f"Respuesta recibida: {respuesta_json['status']}")
             
             if respuesta_json['status'] == 'aceptada':
                 logger.info(f"Task ID: {respuesta_json['task_id']}")
                 logger.info(f"Cola: {respuesta_json['cola']}")
             
-            client_socket.close()
             return respuesta_json
             
         except Exception as e:
             logger.error(f"Error al enviar tarea: {e}")
             return None
+    
+    def enviar_tareas(self, tareas):
+        """Envia varias tareas en pipeline por la misma conexion"""
+        try:
+            respuestas = self.conexion.solicitar_varios(tareas)
+            aceptadas = sum(1 for r in respuestas if r['status'] == 'aceptada')
+            logger.info(f"Tareas enviadas: {len(tareas)} - Aceptadas: {aceptadas}")
+            return respuestas
+            
+        except Exception as e:
+            logger.error(f"Error al enviar tareas: {e}")
+            return None
+    
+    def enviar_lote(self, tareas, tamano_lote=SOCKET_MAX_BATCH_SIZE):
+        """Envia las tareas como mensajes de tipo 'lote' y devuelve una respuesta consolidada"""
+        try:
+            lotes = [
+                {'tipo': 'lote', 'tareas': tareas[i:i + tamano_lote]}
+                for i in range(0, len(tareas), tamano_lote)
+            ]
+            respuestas = self.conexion.solicitar_varios(lotes)
+            
+            resultados = []
+            for offset, respuesta in zip(range(0, len(tareas), tamano_lote), respuestas):
+                if 'tareas' not in respuesta:
+                    # El lote entero fue rechazado (por ejemplo, formato invalido)
+                    cantidad = min(tamano_lote, len(tareas) - offset)
+                    resultados.extend(
+                        {'indice': offset + i, 'status': 'error', 'mensaje': respuesta.get('mensaje')}
+                        for i in range(cantidad)
+                    )
+                    continue
+                for resultado in respuesta['tareas']:
+                    resultados.append(dict(resultado, indice=offset + resultado['indice']))
+            
+            aceptadas = sum(1 for r in resultados if r['status'] == 'aceptada')
+            if aceptadas == len(tareas):
+                status = 'aceptada'
+            elif aceptadas:
+                status = 'parcial'
+            else:
+                status = 'error'
+            
+            logger.info(f"Lote enviado: {aceptadas}/{len(tareas)} tareas aceptadas")
+            
+            return {
+                'status': status,
+                'total': len(tareas),
+                'aceptadas': aceptadas,
+                'rechazadas': len(tareas) - aceptadas,
+                'tareas': resultados
+            }
+            
+        except Exception as e:
+            logger.error(f"Error al enviar lote: {e}")
+            return None
+    
+    def cerrar(self):
+        self.conexion.cerrar()
 
 
 def ejemplo_liquidacion():
@@ -135,8 +182,9 @@ def enviar_multiples_liquidaciones():
     
     logger.info("Enviando multiples liquidaciones...")
     
+    tareas = []
     for i in range(1, 6):
-        tarea = {
+        tareas.append({
             'tipo': 'liquidacion',
             'empresa_id': 1,
             'empleado_id': i,
@@ -146,10 +194,12 @@ def enviar_multiples_liquidaciones():
                 {'codigo': '00001', 'nombre': 'Sueldo Basico', 'tipo': 'remunerativo', 'monto': 450000 + (i * 10000)},
                 {'codigo': '000100', 'nombre': 'Antiguedad', 'tipo': 'remunerativo', 'monto': 40000 + (i * 5000)}
             ]
-        }
-        
-        cliente.enviar_tarea(tarea)
-        time.sleep(0.5)
+        })
+    
+    # Un solo mensaje de lote en lugar de una conexion por tarea
+    respuesta = cliente.enviar_lote(tareas)
+    cliente.cerrar()
+    return respuesta
 
 
 if __name__ == '__main__':
@@ -0,0 +1,199 @@
+import json
+import hashlib
+import logging
+from config.settings import ARTEFACTOS_CACHE_MAX_BYTES, ARTEFACTOS_CACHE_MAX_ITEMS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class CacheArtefactos:
+    """
+    Cache de archivos generados (archivo bancario, DDJJ, reportes) en la tabla
+    artefactos. La clave es el tipo mas los parametros de la tarea; cada entrada
+    guarda la huella de las liquidaciones de (empresa, periodo) con que se genero
+    (cantidad de filas y max(updated_at)). Si la huella no cambio se devuelve el
+    resultado guardado sin volver a generar. Los triggers de liquidaciones,
+    empleados y empresas marcan vencidas las entradas afectadas (ver init.sql);
+    desalojar() borra esas filas junto con sus archivos, asi ningun archivo
+    queda en el storage sin una fila que lo cuente.
+    """
+
+    def __init__(self, db, storage, max_bytes=ARTEFACTOS_CACHE_MAX_BYTES, max_items=ARTEFACTOS_CACHE_MAX_ITEMS):
+        self.db = db
+        self.storage = storage
+        self.max_bytes = max_bytes
+        self.max_items = max_items
+        self.hits = 0
+        self.misses = 0
+        self.expulsados = 0
+
+    @staticmethod
+    def archivos(resultado):
+        """Archivo principal mas los de resultado['archivos'] (una tarea puede generar varios)"""
+        nombres = [resultado['archivo']]
+        for archivo in resultado.get('archivos', {}).values():
+            if archivo['archivo'] not in nombres:
+                nombres.append(archivo['archivo'])
+        return nombres
+
+    @staticmethod
+    def clave(tipo, parametros):
+        contenido = json.dumps([tipo, parametros], sort_keys=True, default=str)
+        return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+    def huella(self, empresa_id, periodo):
+        resultado = self.db.execute_query(
+            """
+            SELECT COUNT(*) AS filas, MAX(updated_at) AS ultima
+            FROM liquidaciones
+            WHERE empresa_id = %s AND periodo = %s
+            """,
+            (empresa_id, periodo)
+        )
+        if not resultado:
+            return None
+        ultima = resultado[0]['ultima']
+        return f"{resultado[0]['filas']}:{ultima.isoformat() if ultima else '-'}"
+
+    def obtener(self, clave, huella):
+        """Resultado guardado si la huella coincide y todos sus archivos siguen en el storage"""
+        filas = self.db.execute_query(
+            """
+            UPDATE artefactos SET hits = hits + 1, ultimo_uso = CURRENT_TIMESTAMP
+            WHERE clave = %s AND huella = %s AND NOT vencido
+            RETURNING resultado, contenedor, archivos
+            """,
+            (clave, huella)
+        )
+        if not filas:
+            return None
+        artefacto = filas[0]
+        faltantes = [n for n in artefacto['archivos'] if not self.storage.existe(artefacto['contenedor'], n)]
+        if faltantes:
+            logger.warning(f"Artefacto sin archivo en el storage: {artefacto['contenedor']}/{', '.join(faltantes)}")
+            # Los que quedan se borran con la fila
+            self.descartar(clave)
+            return None
+        return artefacto['resultado']
+
+    def guardar(self, clave, tipo, empresa_id, periodo, huella, contenedor, resultado):
+        archivos = self.archivos(resultado)
+        # El CTE ve la fila anterior: los archivos que ya no forman parte de la entrada se borran
+        filas = self.db.execute_query(
+            """
+            WITH anterior AS (
+                SELECT contenedor, archivos FROM artefactos WHERE clave = %s FOR UPDATE
+            )
+            INSERT INTO artefactos (clave, tipo, empresa_id, periodo, huella, contenedor, nombre, archivos, bytes, resultado)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s::jsonb, %s, %s::jsonb)
+            ON CONFLICT (clave) DO UPDATE SET
+                huella = EXCLUDED.huella, contenedor = EXCLUDED.contenedor, nombre = EXCLUDED.nombre,
+                archivos = EXCLUDED.archivos, bytes = EXCLUDED.bytes, resultado = EXCLUDED.resultado, vencido = FALSE,
+                hits = 0, created_at = CURRENT_TIMESTAMP, ultimo_uso = CURRENT_TIMESTAMP
+            RETURNING (SELECT contenedor FROM anterior) AS contenedor, (SELECT archivos FROM anterior) AS archivos
+            """,
+            (clave, clave, tipo, empresa_id, periodo, huella, contenedor, resultado['archivo'], json.dumps(archivos),
+             resultado.get('bytes', 0), json.dumps(resultado, default=str))
+        )
+        if filas is None:
+            return
+        anterior = filas[0]
+        if anterior['archivos']:
+            vigentes = archivos if anterior['contenedor'] == contenedor else []
+            self.eliminar_archivos([{
+                'contenedor': anterior['contenedor'],
+                'archivos': [n for n in anterior['archivos'] if n not in vigentes]
+            }])
+        self.desalojar(clave)
+
+    def eliminar_archivos(self, artefactos):
+        for artefacto in artefactos:
+            for nombre in artefacto['archivos']:
+                try:
+                    self.storage.eliminar(artefacto['contenedor'], nombre)
+                except Exception as e:
+                    logger.warning(f"No se pudo eliminar {artefacto['contenedor']}/{nombre}: {e}")
+
+    def desalojar(self, conservar=None):
+        """
+        Borra las entradas vencidas y expulsa las menos usadas hasta volver a los
+        limites, junto con sus archivos. Las vencidas van al final del orden: no
+        le quitan lugar a las vigentes.
+        """
+        expulsados = self.db.execute_query(
+            """
+            WITH orden AS (
+                SELECT clave, vencido,
+                       SUM(bytes) OVER w AS acumulado,
+                       ROW_NUMBER() OVER w AS posicion
+                FROM artefactos
+                WINDOW w AS (ORDER BY vencido, ultimo_uso DESC, clave)
+            )
+            DELETE FROM artefactos a
+            USING orden o
+            WHERE a.clave = o.clave AND a.clave <> %s AND (o.vencido OR o.acumulado > %s OR o.posicion > %s)
+            RETURNING a.contenedor, a.archivos
+            """,
+            (conservar or '', self.max_bytes, self.max_items)
+        ) or []
+        self.eliminar_archivos(expulsados)
+        if expulsados:
+            self.expulsados += len(expulsados)
+            logger.info(f"Cache de artefactos: {len(expulsados)} entradas expulsadas")
+
+    def descartar(self, clave):
+        """Borra la entrada de una clave y sus archivos"""
+        borrados = self.db.execute_query(
+            "DELETE FROM artefactos WHERE clave = %s RETURNING contenedor, archivos",
+            (clave,)
+        ) or []
+        self.eliminar_archivos(borrados)
+
+    def invalidar(self, empresa_id, periodo=None):
+        """Invalidacion explicita (los triggers ya cubren las escrituras en liquidaciones)"""
+        if periodo is None:
+            self.db.execute_query("UPDATE artefactos SET vencido = TRUE WHERE empresa_id = %s", (empresa_id,), fetch=False)
+        else:
+            self.db.execute_query(
+                "UPDATE artefactos SET vencido = TRUE WHERE empresa_id = %s AND periodo = %s",
+                (empresa_id, periodo),
+                fetch=False
+            )
+        self.desalojar()
+
+    def resolver(self, tipo, parametros, contenedor, generar, regenerar=False):
+        """
+        Devuelve el artefacto guardado para (tipo, parametros) o lo genera con
+        generar() y lo guarda. La huella se toma antes de generar: si las
+        liquidaciones cambian mientras tanto, la entrada nace vencida.
+        """
+        empresa_id = parametros['empresa_id']
+        periodo = parametros['periodo']
+        clave = self.clave(tipo, parametros)
+        huella = self.huella(empresa_id, periodo)
+
+        if huella is not None and not regenerar:
+            resultado = self.obtener(clave, huella)
+            if resultado is not None:
+                self.hits += 1
+                logger.info(f"Artefacto {tipo} desde cache: {resultado.get('archivo')}")
+                return dict(resultado, cache=True)
+        self.misses += 1
+        # La entrada vieja se va antes de generar: si su archivo tiene el mismo nombre,
+        # un desalojar() de otro worker ya no puede borrarlo despues de reescrito
+        self.descartar(clave)
+
+        resultado = generar()
+        if huella is not None and resultado.get('estado') == 'completada':
+            self.guardar(clave, tipo, empresa_id, periodo, huella, contenedor, resultado)
+        return resultado
+
+    def metricas(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0,
+            'expulsados': self.expulsados
+        }
@@ -0,0 +1,270 @@
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from common.database import Database, get_listener
+from config.settings import CACHE_REFERENCIA_MAX_ITEMS, CACHE_REFERENCIA_TTL
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Canal que notifican los triggers de empleados y empresas (ver init.sql)
+CANAL_REFERENCIA = 'cambios_referencia'
+
+
+class CacheLRU:
+    """Diccionario acotado con expulsion LRU y vencimiento por TTL, seguro entre hilos"""
+
+    def __init__(self, max_items, ttl):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.expulsados = 0
+        self.vencidos = 0
+
+    def get(self, clave):
+        with self.lock:
+            item = self.items.get(clave)
+            if item is None:
+                self.misses += 1
+                return None
+            valor, vence = item
+            if time.monotonic() > vence:
+                del self.items[clave]
+                self.vencidos += 1
+                self.misses += 1
+                return None
+            self.items.move_to_end(clave)
+            self.hits += 1
+            return valor
+
+    def put(self, clave, valor):
+        with self.lock:
+            self.items[clave] = (valor, time.monotonic() + self.ttl)
+            self.items.move_to_end(clave)
+            while len(self.items) > self.max_items:
+                self.items.popitem(last=False)
+                self.expulsados += 1
+
+    def pop(self, clave):
+        with self.lock:
+            item = self.items.pop(clave, None)
+        return item[0] if item else None
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+    def __len__(self):
+        return len(self.items)
+
+    def metricas(self):
+        with self.lock:
+            consultas = self.hits + self.misses
+            return {
+                'items': len(self.items),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / consultas if consultas else 0.0,
+                'expulsados': self.expulsados,
+                'vencidos': self.vencidos
+            }
+
+
+class CacheReferencia:
+    """
+    Empleados y empresas en memoria del proceso. Los empleados se cachean por
+    id y por (empresa_id, cuil); ante el primer miss se carga la empresa entera
+    en una sola query, y los ids inexistentes quedan en una cache negativa. Los
+    triggers de init.sql avisan por NOTIFY cada cambio y el listener invalida
+    las entradas afectadas. Sin LISTEN activo no se guarda nada y cada busqueda
+    lee solo las filas pedidas.
+
+    Las filas devueltas se comparten entre hilos: no deben modificarse.
+    """
+
+    def __init__(self, db=None, max_items=CACHE_REFERENCIA_MAX_ITEMS, ttl=CACHE_REFERENCIA_TTL, listener=None):
+        self.db = db or Database()
+        self.empleados = CacheLRU(max_items, ttl)
+        self.por_cuil = CacheLRU(max_items, ttl)
+        self.empresas = CacheLRU(max_items, ttl)
+        # Ids de empleados que no existen (cache negativa)
+        self.ausentes = CacheLRU(max_items, ttl)
+        # empresa_id -> ids de sus empleados, para saber si la empresa ya esta completa
+        self.plantillas = CacheLRU(max_items, ttl)
+        self.invalidaciones = 0
+
+        self.listener = listener or get_listener()
+        self.listener.suscribir(CANAL_REFERENCIA, self.on_notificacion, self.invalidar_todo)
+
+    @property
+    def cacheable(self):
+        # Sin LISTEN activo no se pueden recibir invalidaciones: se lee directo de la base
+        return self.listener.conectado.is_set()
+
+    # Empleados
+
+    def empleado(self, empleado_id):
+        empleado = self.empleados.get(empleado_id)
+        if empleado is not None:
+            return empleado
+        return self.empleados_por_id([empleado_id]).get(empleado_id)
+
+    def empleados_por_id(self, empleado_ids):
+        """Devuelve {id: empleado} con los que existan; los faltantes se buscan en una query"""
+        encontrados = {}
+        faltantes = []
+        for empleado_id in empleado_ids:
+            empleado = self.empleados.get(empleado_id)
+            if empleado is not None:
+                encontrados[empleado_id] = empleado
+            elif self.ausentes.get(empleado_id) is None:
+                faltantes.append(empleado_id)
+
+        if faltantes:
+            generacion = self.invalidaciones
+            cacheable = self.cacheable
+            if cacheable:
+                # Calentar las empresas completas de los empleados que faltan
+                query = """
+                    SELECT * FROM empleados
+                    WHERE empresa_id IN (SELECT empresa_id FROM empleados WHERE id = ANY(%s))
+                """
+            else:
+                # Sin LISTEN no se guarda nada: se leen solo los pedidos
+                query = "SELECT * FROM empleados WHERE id = ANY(%s)"
+            filas = self.db.execute_query(query, (faltantes,))
+            if filas is None:
+                raise Exception("Error consultando empleados")
+            if cacheable:
+                self.guardar_empleados(filas, generacion)
+            pedidos = set(faltantes)
+            for fila in filas:
+                if fila['id'] in pedidos:
+                    encontrados[fila['id']] = fila
+
+            # Ids inexistentes: no se vuelven a consultar hasta que un alta los invalide
+            if cacheable and generacion == self.invalidaciones:
+                for empleado_id in faltantes:
+                    if empleado_id not in encontrados:
+                        self.ausentes.put(empleado_id, True)
+
+        return encontrados
+
+    def empleado_por_cuil(self, empresa_id, cuil):
+        empleado = self.por_cuil.get((empresa_id, cuil))
+        if empleado is not None:
+            return empleado
+        for empleado in self.empleados_empresa(empresa_id, solo_activos=False).values():
+            if empleado['cuil'] == cuil:
+                return empleado
+        return None
+
+    def empleados_empresa(self, empresa_id, solo_activos=True):
+        """Devuelve {id: empleado} de la empresa, cargandola completa si no esta en cache"""
+        ids = self.plantillas.get(empresa_id)
+        if ids is not None:
+            empleados = {}
+            for empleado_id in ids:
+                empleado = self.empleados.get(empleado_id)
+                if empleado is None:
+                    # Alguno fue expulsado o invalidado: se recarga la empresa
+                    empleados = None
+                    break
+                empleados[empleado_id] = empleado
+        else:
+            empleados = None
+
+        if empleados is None:
+            generacion = self.invalidaciones
+            filas = self.db.execute_query("SELECT * FROM empleados WHERE empresa_id = %s", (empresa_id,))
+            if filas is None:
+                raise Exception(f"Error consultando empleados de la empresa {empresa_id}")
+            self.guardar_empleados(filas, generacion, empresa_ids=[empresa_id])
+            empleados = {fila['id']: fila for fila in filas}
+
+        if solo_activos:
+            return {i: e for i, e in empleados.items() if e['activo']}
+        return empleados
+
+    def guardar_empleados(self, filas, generacion, empresa_ids=()):
+        """Guarda empresas completas; se descarta si hubo una invalidacion durante la query"""
+        if not self.cacheable or generacion != self.invalidaciones:
+            return
+        plantillas = {empresa_id: [] for empresa_id in empresa_ids}
+        for fila in filas:
+            self.empleados.put(fila['id'], fila)
+            self.por_cuil.put((fila['empresa_id'], fila['cuil']), fila)
+            plantillas.setdefault(fila['empresa_id'], []).append(fila['id'])
+        for empresa_id, ids in plantillas.items():
+            self.plantillas.put(empresa_id, ids)
+
+    # Empresas
+
+    def empresa(self, empresa_id):
+        empresa = self.empresas.get(empresa_id)
+        if empresa is not None:
+            return empresa
+        generacion = self.invalidaciones
+        filas = self.db.execute_query("SELECT * FROM empresas WHERE id = %s", (empresa_id,))
+        if filas is None:
+            raise Exception(f"Error consultando la empresa {empresa_id}")
+        if not filas:
+            return None
+        if self.cacheable and generacion == self.invalidaciones:
+            self.empresas.put(empresa_id, filas[0])
+        return filas[0]
+
+    # Invalidacion
+
+    def on_notificacion(self, payload):
+        try:
+            cambio = json.loads(payload)
+        except json.JSONDecodeError:
+            logger.warning(f"Notificacion de referencia invalida: {payload}")
+            self.invalidar_todo()
+            return
+
+        self.invalidaciones += 1
+        if cambio.get('tabla') == 'empresas':
+            self.empresas.pop(cambio.get('id'))
+        elif cambio.get('tabla') == 'empleados':
+            self.ausentes.pop(cambio.get('id'))
+            anterior = self.empleados.pop(cambio.get('id'))
+            if anterior is not None:
+                self.por_cuil.pop((anterior['empresa_id'], anterior['cuil']))
+                self.plantillas.pop(anterior['empresa_id'])
+            # Un alta o un cambio de empresa altera la plantilla de la empresa nueva
+            self.plantillas.pop(cambio.get('empresa_id'))
+
+    def invalidar_todo(self):
+        self.invalidaciones += 1
+        for cache in (self.empleados, self.por_cuil, self.empresas, self.plantillas, self.ausentes):
+            cache.clear()
+
+    def metricas(self):
+        return {
+            'empleados': self.empleados.metricas(),
+            'empleados_por_cuil': self.por_cuil.metricas(),
+            'empleados_ausentes': self.ausentes.metricas(),
+            'empresas': self.empresas.metricas(),
+            'invalidaciones': self.invalidaciones,
+            'listener': self.listener.metricas()
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache_referencia():
+    """Cache unica por proceso, compartida por todos los hilos del worker"""
+    global _cache
+    with _cache_lock:
+        if _cache is None or not _cache.listener.activo:
+            _cache = CacheReferencia()
+        return _cache
@@ -0,0 +1,127 @@
+import hashlib
+import functools
+import logging
+import threading
+from concurrent.futures import Future
+from common.database import get_listener
+from common.cache_referencia import CacheLRU, CANAL_REFERENCIA
+from common.espera_tareas import CANAL_TAREAS
+from config.settings import API_CACHE_TTL, API_CACHE_MAX_ITEMS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Canal de NOTIFY -> grupo de respuestas que invalida (ver triggers de init.sql)
+CANAL_LIQUIDACIONES = 'cambios_liquidaciones'
+GRUPOS = {
+    CANAL_LIQUIDACIONES: 'liquidaciones',
+    CANAL_TAREAS: 'tareas',
+    CANAL_REFERENCIA: 'referencia'
+}
+
+
+class CacheRespuestas:
+    """
+    Cuerpos de respuesta ya serializados, por clave (la URL con su query
+    string) y generacion. Cada entrada depende de uno o mas grupos de tablas;
+    un NOTIFY de un grupo sube su generacion y deja viejas todas sus entradas
+    sin recorrerlas. Los misses concurrentes de una misma clave y generacion
+    esperan el resultado de una unica consulta (single-flight).
+    """
+
+    def __init__(self, ttl=API_CACHE_TTL, max_items=API_CACHE_MAX_ITEMS, listener=None):
+        self.items = CacheLRU(max_items, ttl)
+        self.lock = threading.Lock()
+        self.generaciones = {grupo: 0 for grupo in GRUPOS.values()}
+        self.en_vuelo = {}
+        self.coalescidas = 0
+        self.invalidaciones = 0
+
+        self.listener = listener or get_listener()
+        for canal, grupo in GRUPOS.items():
+            # Al reconectar se invalida todo una sola vez: las notificaciones del medio se perdieron
+            reconexion = self.invalidar_todo if canal == CANAL_LIQUIDACIONES else None
+            self.listener.suscribir(canal, functools.partial(self.on_notificacion, grupo), reconexion)
+
+    def on_notificacion(self, grupo, payload):
+        self.invalidar(grupo)
+
+    def invalidar(self, grupo):
+        with self.lock:
+            self.generaciones[grupo] += 1
+            self.invalidaciones += 1
+
+    def invalidar_todo(self):
+        with self.lock:
+            for grupo in self.generaciones:
+                self.generaciones[grupo] += 1
+            self.invalidaciones += 1
+        self.items.clear()
+
+    def _generacion(self, grupos):
+        with self.lock:
+            return tuple(self.generaciones[grupo] for grupo in grupos)
+
+    @staticmethod
+    def etag(cuerpo):
+        return hashlib.blake2b(cuerpo, digest_size=16).hexdigest()
+
+    def obtener(self, grupos, clave, calcular):
+        """
+        (cuerpo, status, etag) de la clave. calcular() devuelve (cuerpo, status)
+        y solo se guardan las respuestas 200. La generacion se lee antes de
+        consultar: un NOTIFY que llega durante la consulta deja la entrada vieja.
+        """
+        # Con la generacion en la clave, las entradas viejas no se vuelven a leer y salen por LRU o TTL
+        vuelo = (clave, self._generacion(grupos))
+        resultado = self.items.get(vuelo)
+        if resultado is not None:
+            return resultado
+
+        with self.lock:
+            future = self.en_vuelo.get(vuelo)
+            lider = future is None
+            if lider:
+                future = self.en_vuelo[vuelo] = Future()
+            else:
+                self.coalescidas += 1
+        if not lider:
+            return future.result()
+
+        try:
+            cuerpo, status = calcular()
+            resultado = (cuerpo, status, self.etag(cuerpo))
+            # Sin LISTEN no llegan invalidaciones: no se guarda nada
+            if status == 200 and self.listener.conectado.is_set():
+                self.items.put(vuelo, resultado)
+            future.set_result(resultado)
+            return resultado
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                self.en_vuelo.pop(vuelo, None)
+
+    def metricas(self):
+        metricas = self.items.metricas()
+        with self.lock:
+            metricas.update({
+                'coalescidas': self.coalescidas,
+                'en_vuelo': len(self.en_vuelo),
+                'invalidaciones': self.invalidaciones
+            })
+        return metricas
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache_respuestas():
+    """Cache unica por proceso, compartida por todos los hilos de la API"""
+    global _cache
+    with _cache_lock:
+        if _cache is None or not _cache.listener.activo:
+            _cache = CacheRespuestas()
+        return _cache
@@ -1,50 +1,506 @@
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
+import time
+import select
+import itertools
 import logging
-from config.settings import DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASS
+import threading
+from contextlib import contextmanager
+from config.settings import (
+    DB_HOST,
+    DB_PORT,
+    DB_NAME,
+    DB_USER,
+    DB_PASS,
+    DB_POOL_MIN,
+    DB_POOL_MAX,
+    DB_POOL_TIMEOUT,
+    DB_POOL_MAX_LIFETIME,
+    DB_POOL_HEALTHCHECK_IDLE,
+    DB_LISTEN_RECONNECT_DELAY,
+    DB_STREAM_CHUNK_SIZE
+)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-class Database:
-    def __init__(self):
-        self.connection = None
-        self.connect()
+class PoolTimeout(Exception):
+    pass
+
+
+def conectar():
+    return psycopg2.connect(
+        host=DB_HOST,
+        port=DB_PORT,
+        database=DB_NAME,
+        user=DB_USER,
+        password=DB_PASS
+    )
+
+
+class ConnectionPool:
+    """
+    Pool acotado de conexiones PostgreSQL compartido por todos los hilos.
+    Recicla conexiones que superan max_lifetime y valida con un SELECT 1 las
+    que estuvieron ociosas mas de healthcheck_idle segundos.
+    """
+    
+    def __init__(self, minconn=DB_POOL_MIN, maxconn=DB_POOL_MAX, timeout=DB_POOL_TIMEOUT,
+                 max_lifetime=DB_POOL_MAX_LIFETIME, healthcheck_idle=DB_POOL_HEALTHCHECK_IDLE):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.healthcheck_idle = healthcheck_idle
+        self.cond = threading.Condition()
+        self.libres = []
+        self.creadas = {}
+        self.total = 0
+        self.cerrado = False
+        
+        # Metricas
+        self.checkouts = 0
+        self.esperas = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+        self.timeouts = 0
+        self.recicladas = 0
+        self.fallidas_healthcheck = 0
+        
+        for _ in range(minconn):
+            try:
+                conn = self._crear()
+            except Exception:
+                break
+            with self.cond:
+                self.total += 1
+                self.libres.append((conn, time.monotonic()))
     
-    def connect(self):
+    def _crear(self):
         try:
-            self.connection = psycopg2.connect(
-                host=DB_HOST,
-                port=DB_PORT,
-                database=DB_NAME,
-                user=DB_USER,
-                password=DB_PASS
-            )
+            conn = conectar()
+            self.creadas[conn] = time.monotonic()
             logger.info(f"Conectado a PostgreSQL: {DB_NAME}")
+            return conn
         except Exception as e:
             logger.error(f"Error conectando a PostgreSQL: {e}")
             raise
     
-    def execute_query(self, query, params=None, fetch=True):
+    def _descartar(self, conn):
+        self.creadas.pop(conn, None)
         try:
-            cursor = self.connection.cursor(cursor_factory=RealDictCursor)
-            cursor.execute(query, params)
+            conn.close()
+        except Exception:
+            pass
+    
+    def _saludable(self, conn, ociosa_desde):
+        if conn.closed:
+            return False
+        if time.monotonic() - self.creadas.get(conn, 0) > self.max_lifetime:
+            self.recicladas += 1
+            return False
+        if time.monotonic() - ociosa_desde > self.healthcheck_idle:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                conn.rollback()
+            except Exception:
+                self.fallidas_healthcheck += 1
+                return False
+        return True
+    
+    def getconn(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        inicio = time.monotonic()
+        limite = inicio + timeout
+        
+        while True:
+            with self.cond:
+                esperando = False
+                while True:
+                    if self.cerrado:
+                        raise PoolTimeout("El pool de conexiones esta cerrado")
+                    if self.libres:
+                        conn, ociosa_desde = self.libres.pop()
+                        break
+                    if self.total < self.maxconn:
+                        self.total += 1
+                        conn = None
+                        break
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        self.timeouts += 1
+                        raise PoolTimeout(f"Sin conexiones libres tras {timeout}s (max: {self.maxconn})")
+                    esperando = True
+                    self.cond.wait(restante)
+                
+                espera = time.monotonic() - inicio
+                self.checkouts += 1
+                self.espera_total += espera
+                self.espera_max = max(self.espera_max, espera)
+                if esperando:
+                    self.esperas += 1
             
-            if fetch:
-                result = cursor.fetchall()
-                cursor.close()
-                return result
+            if conn is not None and self._saludable(conn, ociosa_desde):
+                return conn
+            
+            if conn is not None:
+                self._descartar(conn)
+            try:
+                return self._crear()
+            except Exception:
+                with self.cond:
+                    self.total -= 1
+                    self.cond.notify()
+                raise
+    
+    def putconn(self, conn, descartar=False):
+        if not descartar and not conn.closed:
+            try:
+                # Nunca devolver al pool una transaccion abierta
+                if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                descartar = True
+        
+        with self.cond:
+            if descartar or conn.closed or self.cerrado:
+                self.total -= 1
+                self._descartar(conn)
             else:
-                self.connection.commit()
-                cursor.close()
-                return True
+                self.libres.append((conn, time.monotonic()))
+            self.cond.notify()
+    
+    def metricas(self):
+        with self.cond:
+            return {
+                'total': self.total,
+                'libres': len(self.libres),
+                'ocupadas': self.total - len(self.libres),
+                'max': self.maxconn,
+                'checkouts': self.checkouts,
+                'esperas': self.esperas,
+                'espera_promedio_ms': (self.espera_total / self.checkouts * 1000) if self.checkouts else 0.0,
+                'espera_max_ms': self.espera_max * 1000,
+                'timeouts': self.timeouts,
+                'recicladas': self.recicladas,
+                'fallidas_healthcheck': self.fallidas_healthcheck
+            }
+    
+    def close(self):
+        with self.cond:
+            self.cerrado = True
+            libres = self.libres
+            self.libres = []
+            self.total -= len(libres)
+            self.cond.notify_all()
+        for conn, _ in libres:
+            self._descartar(conn)
+        logger.info("Pool de conexiones a PostgreSQL cerrado")
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Pool unico por proceso, creado en el primer uso"""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.cerrado:
+            _pool = ConnectionPool()
+        return _pool
+
+
+def cerrar_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+class ListenerNotificaciones:
+    """
+    Hilo con una conexion dedicada (fuera del pool) que hace LISTEN sobre uno o
+    mas canales y despacha cada NOTIFY a los handlers registrados. Si la conexion
+    se cae, al reconectar llama a los handlers de reconexion: las notificaciones
+    perdidas en el medio no se pueden recuperar.
+    """
+    
+    def __init__(self, reconnect_delay=DB_LISTEN_RECONNECT_DELAY):
+        self.reconnect_delay = reconnect_delay
+        self.lock = threading.Lock()
+        self.handlers = {}
+        self.on_reconexion = []
+        self.conn = None
+        self.hilo = None
+        self.activo = False
+        self.conectado = threading.Event()
+        self.canales_nuevos = False
+        self.recibidas = 0
+        self.reconexiones = 0
+    
+    def suscribir(self, canal, handler, on_reconexion=None):
+        """handler(payload) se llama desde el hilo del listener por cada NOTIFY del canal"""
+        with self.lock:
+            if canal not in self.handlers:
+                # El LISTEN lo hace el propio hilo en su proxima vuelta (la conexion no se comparte)
+                self.canales_nuevos = True
+            self.handlers.setdefault(canal, []).append(handler)
+            if on_reconexion:
+                self.on_reconexion.append(on_reconexion)
+        self.iniciar()
+    
+    def iniciar(self):
+        with self.lock:
+            if self.activo:
+                return
+            self.activo = True
+            self.hilo = threading.Thread(target=self._run, name='db-listener', daemon=True)
+            self.hilo.start()
+    
+    def _escuchar(self, conn, canales):
+        with conn.cursor() as cursor:
+            for canal in canales:
+                cursor.execute(f'LISTEN "{canal}"')
+    
+    def _run(self):
+        primera = True
+        while self.activo:
+            try:
+                conn = conectar()
+                conn.autocommit = True
+                with self.lock:
+                    canales = list(self.handlers)
+                    self.canales_nuevos = False
+                    self.conn = conn
+                self._escuchar(conn, canales)
+                
+                if not primera:
+                    self.reconexiones += 1
+                    logger.warning("Listener de notificaciones reconectado, invalidando caches")
+                    for handler in list(self.on_reconexion):
+                        self._despachar(handler, None)
+                primera = False
+                self.conectado.set()
+                
+                while self.activo:
+                    if self.canales_nuevos:
+                        with self.lock:
+                            nuevos = [c for c in self.handlers if c not in canales]
+                            self.canales_nuevos = False
+                        self._escuchar(conn, nuevos)
+                        canales.extend(nuevos)
+                    
+                    if select.select([conn], [], [], 1.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notificacion = conn.notifies.pop(0)
+                        self.recibidas += 1
+                        with self.lock:
+                            handlers = list(self.handlers.get(notificacion.channel, []))
+                        for handler in handlers:
+                            self._despachar(handler, notificacion.payload)
+            
+            except Exception as e:
+                if self.activo:
+                    logger.error(f"Error en listener de notificaciones: {e}")
+            finally:
+                self.conectado.clear()
+                with self.lock:
+                    conn, self.conn = self.conn, None
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+            
+            if self.activo:
+                time.sleep(self.reconnect_delay)
+    
+    def _despachar(self, handler, payload):
+        try:
+            if payload is None:
+                handler()
+            else:
+                handler(payload)
+        except Exception as e:
+            logger.error(f"Error en handler de notificacion: {e}")
+    
+    def metricas(self):
+        return {
+            'conectado': self.conectado.is_set(),
+            'canales': list(self.handlers),
+            'recibidas': self.recibidas,
+            'reconexiones': self.reconexiones
+        }
+    
+    def close(self):
+        self.activo = False
+        if self.hilo is not None:
+            self.hilo.join(timeout=2)
+
+
+_listener = None
+_cursores = itertools.count(1)
+
+
+def get_listener():
+    """Listener unico por proceso, compartido por todas las caches que se invalidan por NOTIFY"""
+    global _listener
+    with _pool_lock:
+        if _listener is None:
+            _listener = ListenerNotificaciones()
+        return _listener
+
+
+def cerrar_listener():
+    global _listener
+    with _pool_lock:
+        listener, _listener = _listener, None
+    if listener is not None:
+        listener.close()
+
+
+class Database:
+    """
+    Acceso a PostgreSQL sobre el pool del proceso. Cada hilo toma su propia
+    conexion; dentro de transaccion() todas las queries del hilo usan la misma.
+    """
+    
+    def __init__(self, pool=None):
+        self.pool = pool or get_pool()
+        self.local = threading.local()
+    
+    @contextmanager
+    def conexion(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None:
+            # Uso anidado en el mismo hilo: se reutiliza la conexion tomada
+            yield conn
+            return
+        
+        conn = self.pool.getconn()
+        self.local.conn = conn
+        try:
+            yield conn
+        finally:
+            self.local.conn = None
+            self.pool.putconn(conn)
+    
+    @contextmanager
+    def transaccion(self):
+        if getattr(self.local, 'en_transaccion', False):
+            with self.conexion() as conn:
+                yield conn
+            return
+        
+        with self.conexion() as conn:
+            self.local.en_transaccion = True
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                self.local.en_transaccion = False
+    
+    def execute_query(self, query, params=None, fetch=True):
+        en_transaccion = getattr(self.local, 'en_transaccion', False)
+        try:
+            with self.conexion() as conn:
+                try:
+                    cursor = conn.cursor(cursor_factory=RealDictCursor)
+                    cursor.execute(query, params)
+                    result = cursor.fetchall() if fetch else True
+                    cursor.close()
+                    if not en_transaccion:
+                        conn.commit()
+                    return result
+                except Exception:
+                    if not en_transaccion:
+                        conn.rollback()
+                    raise
         except Exception as e:
             logger.error(f"Error ejecutando query: {e}")
-            self.connection.rollback()
+            if en_transaccion:
+                raise
             return None
     
+    def stream_query(self, query, params=None, chunk_size=DB_STREAM_CHUNK_SIZE, cursor_factory=RealDictCursor):
+        """
+        Generador de bloques de filas leidos con un cursor del servidor (named cursor):
+        la memoria queda acotada a `chunk_size` filas sin importar el tamano del resultado.
+        Fuera de una transaccion el cursor usa una conexion propia del pool, tomada hasta
+        que el generador se agota o se cierra: las queries que el consumidor hace entre
+        bloques (y sus commits) no invalidan el cursor.
+        """
+        if getattr(self.local, 'en_transaccion', False):
+            with self.conexion() as conn:
+                yield from self._stream(conn, query, params, chunk_size, cursor_factory, commit=False)
+            return
+        
+        conn = self.pool.getconn()
+        try:
+            yield from self._stream(conn, query, params, chunk_size, cursor_factory, commit=True)
+        finally:
+            self.pool.putconn(conn)
+    
+    def _stream(self, conn, query, params, chunk_size, cursor_factory, commit):
+        cursor = conn.cursor(name=f"stream_{next(_cursores)}", cursor_factory=cursor_factory)
+        cursor.itersize = chunk_size
+        try:
+            cursor.execute(query, params)
+            while True:
+                filas = cursor.fetchmany(chunk_size)
+                if not filas:
+                    break
+                yield filas
+            cursor.close()
+            if commit:
+                conn.commit()
+        except BaseException as e:
+            # Incluye GeneratorExit: el consumidor dejo de leer antes del final
+            if not isinstance(e, GeneratorExit):
+                logger.error(f"Error leyendo query en streaming: {e}")
+            if not cursor.closed:
+                try:
+                    cursor.close()
+                except Exception:
+                    pass
+            if commit:
+                conn.rollback()
+            raise
+    
+    def execute_values(self, query, rows, template=None, fetch=False, page_size=None):
+        """INSERT multi-fila: por defecto todas las filas en una sola sentencia (query con un unico %s)"""
+        en_transaccion = getattr(self.local, 'en_transaccion', False)
+        with self.conexion() as conn:
+            try:
+                cursor = conn.cursor(cursor_factory=RealDictCursor)
+                result = execute_values(
+                    cursor, query, rows,
+                    template=template,
+                    page_size=page_size or max(len(rows), 1),
+                    fetch=fetch
+                )
+                cursor.close()
+                if not en_transaccion:
+                    conn.commit()
+                return result if fetch else True
+            except Exception as e:
+                logger.error(f"Error ejecutando insert multi-fila: {e}")
+                if not en_transaccion:
+                    conn.rollback()
+                raise
+    
+    def metricas(self):
+        return self.pool.metricas()
+    
     def close(self):
-        if self.connection:
-            self.connection.close()
-            logger.info("Conexion a PostgreSQL cerrada")
\ No newline at end of file
+        # Las conexiones pertenecen al pool del proceso y se liberan con cerrar_pool()
+        pass
@@ -0,0 +1,135 @@
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from common.database import Database, get_listener
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CANAL_TAREAS = 'tareas'
+ESTADOS_FINALES = ('completada', 'error')
+
+QUERY_TAREA = """
+    SELECT task_id, tipo, estado, resultado, error_mensaje, created_at, updated_at
+    FROM tareas
+    WHERE task_id = %s
+"""
+
+
+class _Espera:
+    """Requests esperando un mismo task_id y cuantas notificaciones llegaron"""
+
+    def __init__(self, lock):
+        self.condicion = threading.Condition(lock)
+        self.esperando = 0
+        self.version = 0
+
+
+class EsperaTareas:
+    """
+    Espera del estado de una tarea sin consultar la base en un ciclo. El
+    trigger de tareas avisa cada cambio por NOTIFY con el task_id; el listener
+    del proceso despierta solo a los requests que esperan ese task_id y cada
+    uno relee su fila una vez. Sin LISTEN activo (o al reconectar) se relee
+    cada segundo, porque las notificaciones del medio se pierden.
+    """
+
+    def __init__(self, db=None, listener=None):
+        self.db = db or Database()
+        self.lock = threading.Lock()
+        self.esperas = {}
+        self.listener = listener or get_listener()
+        self.listener.suscribir(CANAL_TAREAS, self.on_notificacion, self.on_reconexion)
+
+    def on_notificacion(self, task_id):
+        with self.lock:
+            espera = self.esperas.get(task_id)
+            if espera is not None:
+                espera.version += 1
+                espera.condicion.notify_all()
+
+    def on_reconexion(self):
+        with self.lock:
+            for espera in self.esperas.values():
+                espera.version += 1
+                espera.condicion.notify_all()
+
+    @contextmanager
+    def _interes(self, task_id):
+        # Se registra antes de leer la fila: un NOTIFY posterior a la lectura no se pierde
+        with self.lock:
+            espera = self.esperas.get(task_id)
+            if espera is None:
+                espera = self.esperas[task_id] = _Espera(self.lock)
+            espera.esperando += 1
+        try:
+            yield espera
+        finally:
+            with self.lock:
+                espera.esperando -= 1
+                if not espera.esperando:
+                    del self.esperas[task_id]
+
+    def leer(self, task_id):
+        filas = self.db.execute_query(QUERY_TAREA, (task_id,))
+        return filas[0] if filas else None
+
+    def cambios(self, task_id, timeout):
+        """
+        Estado actual de la tarea (None si todavia no hay resultados) y despues
+        cada cambio, hasta un estado final o hasta que pasen `timeout` segundos.
+        """
+        limite = time.monotonic() + timeout
+        with self._interes(task_id) as espera:
+            visto = False
+            anterior = None
+            while True:
+                with self.lock:
+                    version = espera.version
+                tarea = self.leer(task_id)
+                clave = (tarea['estado'], tarea['updated_at']) if tarea else None
+                if not visto or clave != anterior:
+                    visto = True
+                    anterior = clave
+                    yield tarea
+                if tarea and tarea['estado'] in ESTADOS_FINALES:
+                    return
+
+                with self.lock:
+                    while espera.version == version:
+                        restante = limite - time.monotonic()
+                        if restante <= 0:
+                            return
+                        if self.listener.conectado.is_set():
+                            espera.condicion.wait(restante)
+                        else:
+                            espera.condicion.wait(min(restante, 1.0))
+                            break
+
+    def esperar(self, task_id, timeout):
+        """Ultimo estado conocido: el final si llega antes del timeout"""
+        tarea = None
+        for tarea in self.cambios(task_id, timeout):
+            pass
+        return tarea
+
+    def metricas(self):
+        with self.lock:
+            return {
+                'tareas_esperadas': len(self.esperas),
+                'requests_esperando': sum(espera.esperando for espera in self.esperas.values())
+            }
+
+
+_espera = None
+_espera_lock = threading.Lock()
+
+
+def get_espera_tareas():
+    """Registro unico por proceso, compartido por todos los hilos de la API"""
+    global _espera
+    with _espera_lock:
+        if _espera is None or not _espera.listener.activo:
+            _espera = EsperaTareas()
+        return _espera
@@ -0,0 +1,225 @@
+import logging
+from decimal import Decimal, ROUND_HALF_UP
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class FormatoError(Exception):
+    pass
+
+
+class Campo:
+    """
+    Campo de ancho fijo. `origen` es la clave de la fila (por defecto el nombre)
+    o una funcion fila -> valor; `valor` es un literal constante (tipo de registro,
+    relleno). Los numericos se alinean a derecha con ceros y se escalan
+    (escala=100 para importes en centavos, redondeando half-up en Decimal); los
+    alfanumericos se truncan y rellenan.
+    """
+
+    def __init__(self, nombre, ancho, tipo='alfa', origen=None, valor=None, defecto=None,
+                 transformar=None, escala=None, relleno=None, alineacion=None):
+        if tipo not in ('alfa', 'num'):
+            raise FormatoError(f"Tipo de campo invalido: {tipo}")
+        self.nombre = nombre
+        self.ancho = ancho
+        self.tipo = tipo
+        self.origen = origen if origen is not None else nombre
+        self.valor = valor
+        self.defecto = defecto
+        self.transformar = transformar
+        self.escala = escala
+        self.relleno = relleno if relleno is not None else ('0' if tipo == 'num' else ' ')
+        self.alineacion = alineacion or ('>' if tipo == 'num' else '<')
+
+    def spec(self):
+        """Conversion printf-style del campo (mas rapida que str.format en lotes grandes)"""
+        izquierda = '-' if self.alineacion == '<' else ''
+        if self.tipo == 'num':
+            if self.relleno == '0' and self.alineacion == '>':
+                return f"%0{self.ancho}d"
+            if self.relleno == ' ':
+                return f"%{izquierda}{self.ancho}d"
+        elif self.relleno == ' ':
+            return f"%{izquierda}{self.ancho}.{self.ancho}s"
+        raise FormatoError(f"Relleno no soportado en el campo {self.nombre}: {self.relleno!r}")
+
+    def literal(self):
+        """Un campo constante se resuelve al compilar: queda embebido en el formato"""
+        return self.spec() % (int(self.valor) if self.tipo == 'num' else str(self.valor))
+
+
+class Layout:
+    """
+    Registro de ancho fijo compilado a un unico formato printf y a funciones generadas
+    que formatean una fila o un bloque entero de filas en una sola pasada.
+    """
+
+    def __init__(self, nombre, campos):
+        self.nombre = nombre
+        self.campos = campos
+        self.ancho = sum(campo.ancho for campo in campos)
+        self.compilar()
+
+    def compilar(self):
+        partes = []
+        argumentos = []
+        namespace = {}
+        for i, campo in enumerate(self.campos):
+            if campo.valor is not None:
+                partes.append(campo.literal().replace('%', '%%'))
+                continue
+
+            if callable(campo.origen):
+                namespace[f"_o{i}"] = campo.origen
+                expresion = f"_o{i}(r)"
+            else:
+                expresion = f"r[{campo.origen!r}]"
+            if campo.defecto is not None:
+                namespace[f"_d{i}"] = campo.defecto
+                expresion = f"({expresion} or _d{i})"
+            if campo.transformar is not None:
+                namespace[f"_t{i}"] = campo.transformar
+                expresion = f"_t{i}({expresion})"
+            if campo.tipo == 'num':
+                if campo.escala:
+                    # int(4.35 * 100) daria 434: se escala en Decimal y se redondea
+                    expresion = f"int((_D(str({expresion})) * {campo.escala!r}).quantize(_UNO, _HALF_UP))"
+                else:
+                    expresion = f"int({expresion})"
+
+            partes.append(campo.spec())
+            argumentos.append(expresion)
+
+        self.formato = "".join(partes)
+        namespace.update(_f=self.formato, _D=Decimal, _UNO=Decimal(1), _HALF_UP=ROUND_HALF_UP)
+        args = "".join(f"{argumento}, " for argumento in argumentos)
+        codigo = (
+            f"def codificar(r):\n"
+            f"    return _f % ({args})\n"
+            f"def codificar_lote(filas, separador):\n"
+            f"    return separador.join([_f % ({args}) for r in filas])\n"
+        )
+        exec(compile(codigo, f"<layout {self.nombre}>", 'exec'), namespace)
+        self._codificar = namespace['codificar']
+        self._codificar_lote = namespace['codificar_lote']
+
+    def codificar(self, fila):
+        linea = self._codificar(fila)
+        if len(linea) != self.ancho:
+            raise FormatoError(f"Registro {self.nombre} de {len(linea)} posiciones (esperado {self.ancho}): {linea!r}")
+        return linea
+
+    def codificar_lote(self, filas, separador="\n"):
+        """Formatea todas las filas en un unico str; valida el ancho de todo el bloque de una vez"""
+        if not filas:
+            return ""
+        bloque = self._codificar_lote(filas, separador)
+        if len(bloque) != len(filas) * (self.ancho + len(separador)) - len(separador):
+            # Algun numerico no entro en su ancho: se busca la fila para el mensaje
+            for fila in filas:
+                self.codificar(fila)
+        return bloque
+
+
+class FormatoBancario:
+    def __init__(self, nombre, header, detalle, footer, separador="\n", extension='txt', encoding='utf-8'):
+        self.nombre = nombre
+        self.header = header
+        self.detalle = detalle
+        self.footer = footer
+        self.separador = separador
+        self.extension = extension
+        self.encoding = encoding
+
+
+_formatos = {}
+
+
+def registrar(formato):
+    _formatos[formato.nombre] = formato
+    return formato
+
+
+def obtener_formato(banco):
+    """Formato del banco; los bancos sin formato propio usan el generico"""
+    formato = _formatos.get(banco)
+    if formato is None:
+        logger.warning(f"Banco sin formato propio: {banco}, se usa el generico")
+        formato = _formatos['generico']
+    return formato
+
+
+def formatos_disponibles():
+    return sorted(_formatos)
+
+
+_SEPARADORES = str.maketrans('', '', '-./ ')
+
+
+def solo_digitos(valor):
+    # translate es mucho mas rapido que una regex por fila
+    return (valor or '').translate(_SEPARADORES)
+
+
+def mayusculas(valor):
+    return (valor or '').upper()
+
+
+# Formatos registrados
+#
+# Filas disponibles para cada registro:
+#   header:  cuit, razon_social, fecha_proceso (AAAAMMDD), periodo (AAAAMM), empresa_id
+#   detalle: cuil, cbu, nombre, apellido, sueldo_neto (una liquidacion)
+#   footer:  total_registros, total_importe
+
+registrar(FormatoBancario(
+    'generico',
+    header=Layout('generico.header', [
+        Campo('tipo_registro', 1, valor='0'),
+        Campo('cuit', 13),
+        Campo('fecha_proceso', 8),
+        Campo('periodo', 6)
+    ]),
+    detalle=Layout('generico.detalle', [
+        Campo('tipo_registro', 1, valor='1'),
+        Campo('cuil', 13),
+        Campo('cbu', 22, defecto='0' * 22),
+        Campo('apellido', 20),
+        Campo('nombre', 20),
+        Campo('importe', 15, 'num', origen='sueldo_neto', escala=100)
+    ]),
+    footer=Layout('generico.footer', [
+        Campo('tipo_registro', 1, valor='9'),
+        Campo('total_registros', 8, 'num'),
+        Campo('total_importe', 18, 'num', escala=100)
+    ])
+))
+
+registrar(FormatoBancario(
+    'nacion',
+    header=Layout('nacion.header', [
+        Campo('tipo_registro', 1, valor='1'),
+        Campo('cuit', 11, transformar=solo_digitos),
+        Campo('razon_social', 30, transformar=mayusculas),
+        Campo('fecha_proceso', 8),
+        Campo('periodo', 6),
+        Campo('filler', 44, valor='')
+    ]),
+    detalle=Layout('nacion.detalle', [
+        Campo('tipo_registro', 1, valor='2'),
+        Campo('cbu', 22, defecto='0' * 22),
+        Campo('cuil', 11, transformar=solo_digitos),
+        Campo('beneficiario', 30, origen=lambda r: f"{r['apellido']} {r['nombre']}", transformar=mayusculas),
+        Campo('importe', 17, 'num', origen='sueldo_neto', escala=100),
+        Campo('filler', 19, valor='')
+    ]),
+    footer=Layout('nacion.footer', [
+        Campo('tipo_registro', 1, valor='3'),
+        Campo('total_registros', 7, 'num'),
+        Campo('total_importe', 17, 'num', escala=100),
+        Campo('filler', 75, valor='')
+    ]),
+    separador="\r\n"
+))
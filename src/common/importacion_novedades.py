@@ -0,0 +1,197 @@
+import csv
+import json
+import math
+import logging
+import tempfile
+from config.settings import IMPORTACION_BLOQUE, IMPORTACION_MAX_RECHAZOS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Columnas del CSV: una fila por concepto; tipo y nombre son opcionales (salen de la tabla conceptos)
+COLUMNAS_CSV = ('empleado_id', 'codigo', 'monto')
+COLUMNAS_CONCEPTO = ('codigo', 'nombre', 'tipo', 'monto')
+TIPOS_CONCEPTO = ('remunerativo', 'no_remunerativo', 'deduccion', 'contribucion')
+
+
+class FormatoInvalido(Exception):
+    pass
+
+
+def registros_csv(texto):
+    """
+    (fila, empleado_id, [(fila, concepto), ...], error) por empleado. Las filas
+    consecutivas con el mismo empleado_id forman su novedad, asi que el archivo
+    tiene que venir agrupado por empleado: si uno reaparece despues de otro se
+    rechaza el archivo entero (su novedad quedaria partida en dos).
+    """
+    lector = csv.DictReader(texto)
+    faltantes = [c for c in COLUMNAS_CSV if c not in (lector.fieldnames or ())]
+    if faltantes:
+        raise FormatoInvalido(f"Faltan columnas en el CSV: {', '.join(faltantes)}")
+
+    actual = None
+    cerrados = set()
+    for registro in lector:
+        empleado_id = (registro.get('empleado_id') or '').strip()
+        if actual is None or empleado_id != actual[1]:
+            if actual is not None:
+                cerrados.add(actual[1])
+                yield actual
+            if empleado_id in cerrados:
+                raise FormatoInvalido(
+                    f"Fila {lector.line_num}: el empleado {empleado_id} ya aparecio antes; "
+                    "las filas de cada empleado tienen que ir juntas"
+                )
+            actual = (lector.line_num, empleado_id, [], None)
+        concepto = {c: registro[c].strip() for c in COLUMNAS_CONCEPTO if registro.get(c)}
+        actual[2].append((lector.line_num, concepto))
+    if actual is not None:
+        yield actual
+
+
+def registros_ndjson(texto):
+    """(fila, empleado_id, [(fila, concepto), ...], error) por linea {"empleado_id": ..., "conceptos": [...]}"""
+    for numero, linea in enumerate(texto, 1):
+        if not linea.strip():
+            continue
+        try:
+            registro = json.loads(linea)
+        except json.JSONDecodeError as e:
+            yield numero, None, [], f"JSON invalido: {e.msg}"
+            continue
+        if not isinstance(registro, dict) or not isinstance(registro.get('conceptos'), list):
+            yield numero, None, [], 'Se esperaba un objeto con empleado_id y una lista de conceptos'
+            continue
+        conceptos = [(numero, c if isinstance(c, dict) else {}) for c in registro['conceptos']]
+        yield numero, registro.get('empleado_id'), conceptos, None
+
+
+class ImportacionNovedades:
+    """
+    Valida las novedades de un archivo a medida que se leen y las junta en
+    bloques de `tamano` empleados. La memoria queda acotada al bloque en curso,
+    los ids ya vistos (a lo sumo los empleados de la empresa) y los primeros
+    `max_rechazos` rechazos; del resto solo se cuentan. `liquidados` son los
+    empleados que ya tienen liquidacion en el periodo: reenviar el mismo
+    archivo no los liquida dos veces.
+    """
+
+    def __init__(self, empleados, codigos, liquidados=frozenset(), tamano=IMPORTACION_BLOQUE,
+                 max_rechazos=IMPORTACION_MAX_RECHAZOS):
+        self.empleados = empleados
+        self.codigos = codigos
+        self.liquidados = liquidados
+        self.tamano = tamano
+        self.max_rechazos = max_rechazos
+        self.vistos = set()
+        self.filas = 0
+        self.aceptados = 0
+        self.rechazados = 0
+        self.rechazos = []
+
+    def rechazar(self, fila, empleado_id, mensaje):
+        self.rechazados += 1
+        if len(self.rechazos) < self.max_rechazos:
+            self.rechazos.append({'fila': fila, 'empleado_id': empleado_id, 'mensaje': mensaje})
+
+    def validar_concepto(self, concepto):
+        """Concepto listo para la tarea, o el motivo del rechazo"""
+        codigo = str(concepto.get('codigo') or '').strip()
+        if not codigo:
+            return None, 'Concepto sin codigo'
+        if codigo not in self.codigos:
+            return None, f"Concepto {codigo} inexistente"
+        tipo = concepto.get('tipo')
+        if tipo is not None and tipo not in TIPOS_CONCEPTO:
+            return None, f"Tipo de concepto invalido: {tipo}"
+        try:
+            monto = float(concepto.get('monto'))
+        except (TypeError, ValueError):
+            return None, f"Monto invalido en el concepto {codigo}: {concepto.get('monto')}"
+        if not math.isfinite(monto) or monto < 0:
+            return None, f"Monto invalido en el concepto {codigo}: {concepto.get('monto')}"
+        valido = {c: concepto[c] for c in COLUMNAS_CONCEPTO if concepto.get(c) is not None}
+        valido.update(codigo=codigo, monto=monto)
+        return valido, None
+
+    def validar(self, fila, empleado_id, conceptos, error):
+        """Novedad {'empleado_id', 'conceptos'} o None si se rechazo el empleado"""
+        self.filas += max(len(conceptos), 1)
+        if error:
+            self.rechazar(fila, empleado_id, error)
+            return None
+
+        try:
+            empleado_id = int(empleado_id)
+        except (TypeError, ValueError):
+            self.rechazar(fila, empleado_id, f"empleado_id invalido: {empleado_id}")
+            return None
+        if empleado_id not in self.empleados:
+            self.rechazar(fila, empleado_id, 'Empleado inexistente, inactivo o de otra empresa')
+            return None
+        if empleado_id in self.liquidados:
+            self.rechazar(fila, empleado_id, 'Empleado ya liquidado en el periodo')
+            return None
+        if empleado_id in self.vistos:
+            # Se liquidaria dos veces en el periodo
+            self.rechazar(fila, empleado_id, 'Empleado repetido en el archivo')
+            return None
+        self.vistos.add(empleado_id)
+        if not conceptos:
+            self.rechazar(fila, empleado_id, 'Empleado sin conceptos')
+            return None
+
+        validos = []
+        for fila_concepto, concepto in conceptos:
+            valido, motivo = self.validar_concepto(concepto)
+            if motivo:
+                # Liquidar sin uno de sus conceptos daria un sueldo incorrecto: se rechaza el empleado
+                self.rechazar(fila_concepto, empleado_id, motivo)
+                return None
+            validos.append(valido)
+
+        self.aceptados += 1
+        return {'empleado_id': empleado_id, 'conceptos': validos}
+
+    def bloques(self, registros):
+        """(fila desde, fila hasta, novedades) cada `tamano` empleados validos"""
+        bloque = []
+        desde = hasta = None
+        for fila, empleado_id, conceptos, error in registros:
+            novedad = self.validar(fila, empleado_id, conceptos, error)
+            if novedad is None:
+                continue
+            if not bloque:
+                desde = fila
+            hasta = conceptos[-1][0]
+            bloque.append(novedad)
+            if len(bloque) >= self.tamano:
+                yield desde, hasta, bloque
+                bloque = []
+        if bloque:
+            yield desde, hasta, bloque
+
+    def bloques_validados(self, registros):
+        """
+        Los mismos bloques que bloques(), pero el primero sale recien cuando se
+        leyo y valido el archivo entero: un FormatoInvalido o un error de lectura
+        cortan la importacion sin ninguna tarea enviada. Mientras tanto los
+        bloques esperan en un archivo temporal, no en memoria.
+        """
+        with tempfile.TemporaryFile('w+', encoding='utf-8') as pendientes:
+            for bloque in self.bloques(registros):
+                pendientes.write(json.dumps(bloque) + '\n')
+            pendientes.seek(0)
+            for linea in pendientes:
+                desde, hasta, novedades = json.loads(linea)
+                yield desde, hasta, novedades
+
+    def resumen(self):
+        return {
+            'filas': self.filas,
+            'empleados_aceptados': self.aceptados,
+            'empleados_rechazados': self.rechazados,
+            'rechazos': self.rechazos,
+            'rechazos_omitidos': self.rechazados - len(self.rechazos)
+        }
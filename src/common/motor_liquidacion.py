@@ -0,0 +1,126 @@
+import logging
+import numpy as np
+from common.reglas import PLAN_POR_DEFECTO
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class ResultadoPeriodo:
+    """Resultado columnar de liquidar un periodo completo: un array por columna"""
+
+    def __init__(self, empleado_ids, sueldo_bruto, deducciones_detalle, deducciones, sueldo_neto, cargas_sociales):
+        self.empleado_ids = empleado_ids
+        self.sueldo_bruto = sueldo_bruto
+        self.deducciones_detalle = deducciones_detalle
+        self.deducciones = deducciones
+        self.sueldo_neto = sueldo_neto
+        self.cargas_sociales = cargas_sociales
+
+    def __len__(self):
+        return len(self.empleado_ids)
+
+    def filas(self):
+        """Itera (empleado_id, bruto, deducciones, neto, cargas) como tipos Python"""
+        return zip(
+            self.empleado_ids.tolist(),
+            self.sueldo_bruto.tolist(),
+            self.deducciones.tolist(),
+            self.sueldo_neto.tolist(),
+            self.cargas_sociales.tolist()
+        )
+
+    def totales(self):
+        return {
+            'total_empleados': len(self),
+            'total_bruto': float(self.sueldo_bruto.sum()),
+            'total_deducciones': float(self.deducciones.sum()),
+            'total_neto': float(self.sueldo_neto.sum()),
+            'total_cargas_sociales': float(self.cargas_sociales.sum()),
+            'deducciones_detalle': {
+                codigo: float(valores.sum()) for codigo, valores in self.deducciones_detalle.items()
+            }
+        }
+
+
+def armar_matrices(novedades, planes):
+    """
+    Convierte [(empleado_id, conceptos), ...] en arrays empleados x conceptos.
+    Las columnas siguen la posicion del concepto en la lista de cada empleado
+    (no el codigo): asi la suma por filas se hace en el mismo orden que
+    PlanLiquidacion.calcular_bruto y el resultado es identico bit a bit.
+    """
+    n = len(novedades)
+    ancho = max((len(conceptos) for _, conceptos in novedades), default=0)
+
+    empleado_ids = np.empty(n, dtype=np.int64)
+    montos = np.zeros((n, ancho), dtype=np.float64)
+    remunerativo = np.zeros((n, ancho), dtype=bool)
+
+    for i, ((empleado_id, conceptos), plan) in enumerate(zip(novedades, planes)):
+        empleado_ids[i] = empleado_id
+        for j, concepto in enumerate(conceptos):
+            montos[i, j] = concepto.get('monto', 0)
+            remunerativo[i, j] = plan.tipo(concepto) == 'remunerativo'
+
+    return empleado_ids, montos, remunerativo
+
+
+def tasas_por_fila(planes, tipo):
+    """
+    Una columna de tasas por concepto (deduccion o contribucion) presente en algun plan.
+    Los empleados cuyo convenio no tiene el concepto llevan tasa 0, y sumar 0.0 no
+    altera el resultado, asi se puede liquidar una empresa con varios convenios a la vez.
+    """
+    distintos = {id(plan): plan for plan in planes}.values()
+    conceptos = {}
+    for plan in distintos:
+        for concepto in (plan.deducciones if tipo == 'deduccion' else plan.contribuciones):
+            conceptos.setdefault(concepto.codigo, concepto)
+
+    tasas = {}
+    for concepto in sorted(conceptos.values(), key=lambda c: (c.orden, c.codigo)):
+        if len(distintos) == 1:
+            tasas[concepto.codigo] = concepto.tasa
+        else:
+            tasas[concepto.codigo] = np.fromiter((plan.tasa(concepto.codigo) for plan in planes), dtype=np.float64, count=len(planes))
+    return tasas
+
+
+def liquidar_periodo(novedades, planes=None):
+    """
+    Liquida todos los empleados de un periodo de una sola vez con operaciones vectorizadas.
+    `planes` es un PlanLiquidacion para todos o una lista con el plan de cada empleado.
+    """
+    if planes is None:
+        planes = PLAN_POR_DEFECTO
+    if not isinstance(planes, list):
+        planes = [planes] * len(novedades)
+
+    empleado_ids, montos, remunerativo = armar_matrices(novedades, planes)
+    return liquidar_matrices(
+        empleado_ids, montos, remunerativo,
+        tasas_por_fila(planes, 'deduccion'),
+        tasas_por_fila(planes, 'contribucion')
+    )
+
+
+def liquidar_matrices(empleado_ids, montos, remunerativo, tasas_deduccion, tasas_contribucion):
+    # Bruto: acumulacion columna a columna (un paso vectorizado por posicion de concepto)
+    sueldo_bruto = np.zeros(len(empleado_ids), dtype=np.float64)
+    remunerativos = np.where(remunerativo, montos, 0.0)
+    for j in range(remunerativos.shape[1]):
+        sueldo_bruto += remunerativos[:, j]
+
+    # Deducciones y contribuciones en el orden del plan, igual que la version por empleado
+    detalle = {codigo: sueldo_bruto * tasa for codigo, tasa in tasas_deduccion.items()}
+    deducciones = np.zeros_like(sueldo_bruto)
+    for valores in detalle.values():
+        deducciones += valores
+    sueldo_neto = sueldo_bruto - deducciones
+
+    cargas_sociales = np.zeros_like(sueldo_bruto)
+    for tasa in tasas_contribucion.values():
+        cargas_sociales += sueldo_bruto * tasa
+
+    return ResultadoPeriodo(empleado_ids, sueldo_bruto, detalle, deducciones, sueldo_neto, cargas_sociales)
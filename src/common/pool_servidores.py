@@ -0,0 +1,252 @@
+import time
+import select
+import socket
+import logging
+import threading
+from common.protocol import ConexionFramed
+from config.settings import (
+    GATEWAY_SERVIDORES,
+    GATEWAY_MAX_EN_CURSO,
+    GATEWAY_ESPERA,
+    GATEWAY_HEALTH_INTERVAL,
+    GATEWAY_HEALTH_TIMEOUT,
+    GATEWAY_FALLOS_EXPULSION,
+    GATEWAY_EXITOS_READMISION,
+    GATEWAY_IDLE_MAX,
+    SOCKET_READ_TIMEOUT
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class SinServidores(Exception):
+    pass
+
+
+def conexion_viva(conexion):
+    """
+    Una conexion ociosa que el servidor cerro (reinicio, timeout de inactividad)
+    ya tiene el EOF en el buffer: se detecta sin bloquear antes de reutilizarla.
+    """
+    try:
+        legibles, _, _ = select.select([conexion.socket], [], [], 0)
+        if not legibles:
+            return True
+        return conexion.socket.recv(1, socket.MSG_PEEK) != b''
+    except (OSError, ValueError):
+        return False
+
+
+class Servidor:
+    """Estado de un servidor socket visto desde el gateway"""
+
+    def __init__(self, host, port, limite):
+        self.host = host
+        self.port = port
+        self.limite = limite
+        self.en_curso = 0
+        # Conexiones persistentes ociosas: (conexion, momento en que se devolvio)
+        self.libres = []
+        self.sano = True
+        self.fallos = 0
+        self.exitos = 0
+        # Conexion propia del health check (no compite con las solicitudes)
+        self.sonda = None
+        self.solicitudes = 0
+        self.errores = 0
+        self.expulsiones = 0
+
+    @property
+    def nombre(self):
+        return f"{self.host}:{self.port}"
+
+    def cerrar_libres(self):
+        for conexion, _ in self.libres:
+            conexion.cerrar()
+        self.libres = []
+
+    def metricas(self):
+        return {
+            'sano': self.sano,
+            'en_curso': self.en_curso,
+            'conexiones_libres': len(self.libres),
+            'solicitudes': self.solicitudes,
+            'errores': self.errores,
+            'expulsiones': self.expulsiones
+        }
+
+
+class PoolServidores:
+    """
+    Conexiones persistentes del gateway a todos los servidores socket. Cada
+    solicitud va al servidor sano con menos solicitudes en curso (los empates
+    se reparten por turno), sin pasar de `limite` en curso por servidor. Un
+    hilo hace ping a cada servidor: tras `fallos` seguidos (o errores de las
+    solicitudes) sale de la rotacion y vuelve despues de `exitos` pings bien.
+    """
+
+    def __init__(self, servidores=GATEWAY_SERVIDORES, limite=GATEWAY_MAX_EN_CURSO, espera=GATEWAY_ESPERA,
+                 intervalo=GATEWAY_HEALTH_INTERVAL, timeout=SOCKET_READ_TIMEOUT):
+        if not servidores:
+            raise ValueError("El gateway necesita al menos un servidor socket")
+        self.servidores = [Servidor(host, port, limite) for host, port in servidores]
+        self.espera = espera
+        self.intervalo = intervalo
+        self.timeout = timeout
+        self.condicion = threading.Condition()
+        self.turno = 0
+        self.detener = threading.Event()
+        self.hilo = threading.Thread(target=self._chequear, name='health-servidores', daemon=True)
+        self.hilo.start()
+        logger.info(f"Gateway con {len(self.servidores)} servidores socket: {', '.join(s.nombre for s in self.servidores)}")
+
+    def _elegir(self, excluidos):
+        candidatos = [s for s in self.servidores if s.sano and s.en_curso < s.limite and s not in excluidos]
+        if not candidatos:
+            return None
+        menor = min(s.en_curso for s in candidatos)
+        empatados = [s for s in candidatos if s.en_curso == menor]
+        self.turno += 1
+        return empatados[self.turno % len(empatados)]
+
+    def adquirir(self, excluidos=()):
+        """Reserva un lugar en el servidor elegido; devuelve (servidor, conexion ociosa o None)"""
+        limite_espera = time.monotonic() + self.espera
+        with self.condicion:
+            while True:
+                servidor = self._elegir(excluidos)
+                if servidor is not None:
+                    break
+                if not any(s.sano for s in self.servidores if s not in excluidos):
+                    raise SinServidores("No hay servidores socket disponibles")
+                restante = limite_espera - time.monotonic()
+                if restante <= 0:
+                    raise SinServidores("Todos los servidores socket estan al limite de solicitudes en curso")
+                self.condicion.wait(restante)
+
+            servidor.en_curso += 1
+            servidor.solicitudes += 1
+            ahora = time.monotonic()
+            while servidor.libres:
+                conexion, devuelta = servidor.libres.pop()
+                if ahora - devuelta < GATEWAY_IDLE_MAX and conexion_viva(conexion):
+                    return servidor, conexion
+                conexion.cerrar()
+            return servidor, None
+
+    def liberar(self, servidor, conexion, ok):
+        with self.condicion:
+            servidor.en_curso -= 1
+            if ok:
+                servidor.fallos = 0
+                if conexion is not None and servidor.sano:
+                    servidor.libres.append((conexion, time.monotonic()))
+                    conexion = None
+            else:
+                servidor.errores += 1
+                servidor.fallos += 1
+                if servidor.sano and servidor.fallos >= GATEWAY_FALLOS_EXPULSION:
+                    self._expulsar(servidor, f"{servidor.fallos} solicitudes fallidas seguidas")
+            self.condicion.notify_all()
+        if conexion is not None:
+            conexion.cerrar()
+
+    def solicitar(self, mensaje):
+        """
+        Envia un mensaje por una conexion persistente y devuelve la respuesta.
+        Solo se reintenta en otro servidor si fallo la conexion (nada se envio):
+        una vez enviada, la tarea pudo haberse encolado.
+        """
+        intentados = []
+        while True:
+            servidor, conexion = self.adquirir(intentados)
+            if conexion is None:
+                conexion = ConexionFramed(servidor.host, servidor.port, timeout=self.timeout)
+                try:
+                    conexion.conectar()
+                except OSError as e:
+                    logger.warning(f"No se pudo conectar con {servidor.nombre}: {e}")
+                    self.liberar(servidor, None, ok=False)
+                    intentados.append(servidor)
+                    continue
+
+            try:
+                respuesta = conexion.solicitar(mensaje)
+            except Exception:
+                conexion.cerrar()
+                self.liberar(servidor, None, ok=False)
+                raise
+            self.liberar(servidor, conexion, ok=True)
+            return respuesta
+
+    def _expulsar(self, servidor, motivo):
+        # Con la condicion tomada
+        servidor.sano = False
+        servidor.exitos = 0
+        servidor.expulsiones += 1
+        servidor.cerrar_libres()
+        logger.warning(f"Servidor {servidor.nombre} fuera de rotacion: {motivo}")
+
+    def _ping(self, servidor):
+        try:
+            if servidor.sonda is None:
+                servidor.sonda = ConexionFramed(servidor.host, servidor.port, timeout=GATEWAY_HEALTH_TIMEOUT)
+            respuesta = servidor.sonda.solicitar({'tipo': 'ping'})
+            return respuesta.get('status') == 'ok'
+        except Exception:
+            # solicitar ya cerro la conexion; el proximo ping reconecta
+            return False
+
+    def _chequear(self):
+        while not self.detener.wait(self.intervalo):
+            for servidor in self.servidores:
+                ok = self._ping(servidor)
+                with self.condicion:
+                    if ok:
+                        servidor.fallos = 0
+                        if not servidor.sano:
+                            servidor.exitos += 1
+                            if servidor.exitos >= GATEWAY_EXITOS_READMISION:
+                                servidor.sano = True
+                                logger.info(f"Servidor {servidor.nombre} de vuelta en rotacion")
+                                self.condicion.notify_all()
+                    else:
+                        servidor.exitos = 0
+                        servidor.fallos += 1
+                        if servidor.sano and servidor.fallos >= GATEWAY_FALLOS_EXPULSION:
+                            self._expulsar(servidor, f"{servidor.fallos} pings fallidos seguidos")
+
+    def metricas(self):
+        with self.condicion:
+            return {s.nombre: s.metricas() for s in self.servidores}
+
+    def close(self):
+        self.detener.set()
+        self.hilo.join(timeout=self.intervalo + GATEWAY_HEALTH_TIMEOUT)
+        with self.condicion:
+            for servidor in self.servidores:
+                servidor.cerrar_libres()
+                if servidor.sonda is not None:
+                    servidor.sonda.cerrar()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool_servidores():
+    """Pool unico por proceso, compartido por todos los hilos del gateway"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = PoolServidores()
+        return _pool
+
+
+def cerrar_pool_servidores():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
@@ -0,0 +1,204 @@
+import json
+import select
+import socket
+import struct
+import threading
+import itertools
+import logging
+from config.settings import (
+    SOCKET_READ_TIMEOUT,
+    SOCKET_MAX_FRAME_SIZE,
+    SOCKET_PIPELINE_WINDOW
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Formato de frame:
+#   magic (2 bytes 'LQ') | version (1) | flags (1) | largo payload (4) | request_id (4) | payload JSON
+# Los mensajes legacy (un JSON suelto por conexion) empiezan con '{', nunca con el magic.
+MAGIC = b'LQ'
+VERSION = 1
+FLAG_REQUEST_ID = 0x01
+HEADER = struct.Struct('!2sBBII')
+HEADER_SIZE = HEADER.size
+MAX_REQUEST_ID = 0xFFFFFFFF
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def es_legacy(data):
+    """Indica si los primeros bytes recibidos corresponden al formato JSON sin framing"""
+    return not data.startswith(MAGIC[:len(data)])
+
+
+def legacy_completo(data):
+    """Indica si el buffer legacy ya contiene un JSON completo (o uno invalido que no va a completarse)"""
+    try:
+        texto = data.decode('utf-8')
+    except UnicodeDecodeError as e:
+        # Un caracter multibyte cortado al final del buffer
+        return e.start < len(data) - 3
+    try:
+        json.loads(texto)
+        return True
+    except json.JSONDecodeError as e:
+        incompleto = e.pos >= len(texto.rstrip()) or e.msg.startswith('Unterminated string')
+        return not incompleto
+
+
+def encode_frame(mensaje, request_id=None):
+    """Serializa un mensaje (dict o bytes JSON) en un frame"""
+    payload = mensaje if isinstance(mensaje, bytes) else json.dumps(mensaje).encode('utf-8')
+    if len(payload) > SOCKET_MAX_FRAME_SIZE:
+        raise ProtocolError(f"Frame de {len(payload)} bytes excede el maximo de {SOCKET_MAX_FRAME_SIZE}")
+    flags = FLAG_REQUEST_ID if request_id is not None else 0
+    header = HEADER.pack(MAGIC, VERSION, flags, len(payload), request_id or 0)
+    return header + payload
+
+
+def decode_header(header):
+    """Devuelve (largo, request_id) a partir de los bytes del header"""
+    magic, version, flags, largo, request_id = HEADER.unpack(header)
+    if magic != MAGIC:
+        raise ProtocolError("Header de frame invalido")
+    if version != VERSION:
+        raise ProtocolError(f"Version de protocolo no soportada: {version}")
+    if largo > SOCKET_MAX_FRAME_SIZE:
+        raise ProtocolError(f"Frame de {largo} bytes excede el maximo de {SOCKET_MAX_FRAME_SIZE}")
+    return largo, (request_id if flags & FLAG_REQUEST_ID else None)
+
+
+class FrameDecoder:
+    """Decodificador incremental: recibe bytes sueltos y entrega frames completos"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        self.buffer.extend(data)
+
+    def frames(self):
+        while len(self.buffer) >= HEADER_SIZE:
+            largo, request_id = decode_header(bytes(self.buffer[:HEADER_SIZE]))
+            fin = HEADER_SIZE + largo
+            if len(self.buffer) < fin:
+                return
+            payload = bytes(self.buffer[HEADER_SIZE:fin])
+            del self.buffer[:fin]
+            yield payload, request_id
+
+
+def recv_exact(sock, n):
+    chunks = []
+    restante = n
+    while restante:
+        chunk = sock.recv(min(restante, 1 << 20))
+        if not chunk:
+            if restante == n:
+                return None
+            raise ConnectionError("Conexion cerrada a mitad de un frame")
+        chunks.append(chunk)
+        restante -= len(chunk)
+    return b''.join(chunks)
+
+
+def recv_frame(sock):
+    """Lee un frame completo de un socket bloqueante. Devuelve (mensaje, request_id) o None si se cerro"""
+    header = recv_exact(sock, HEADER_SIZE)
+    if header is None:
+        return None
+    largo, request_id = decode_header(header)
+    payload = recv_exact(sock, largo) if largo else b''
+    if payload is None:
+        raise ConnectionError("Conexion cerrada a mitad de un frame")
+    return json.loads(payload.decode('utf-8')), request_id
+
+
+class ConexionFramed:
+    """Conexion persistente a un servidor socket que admite pipelining de tareas"""
+
+    def __init__(self, host, port, timeout=SOCKET_READ_TIMEOUT, ventana=SOCKET_PIPELINE_WINDOW):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.ventana = ventana
+        self.socket = None
+        self.lock = threading.Lock()
+        self._ids = itertools.count()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.cerrar()
+
+    def conectar(self):
+        self.socket = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        logger.info(f"Conectado al servidor {self.host}:{self.port}")
+
+    def cerrar(self):
+        if self.socket:
+            try:
+                self.socket.close()
+            finally:
+                self.socket = None
+
+    def _nuevo_id(self):
+        return next(self._ids) % MAX_REQUEST_ID + 1
+
+    def solicitar(self, mensaje):
+        return self.solicitar_varios([mensaje])[0]
+
+    def solicitar_varios(self, mensajes):
+        """Envia los mensajes en pipeline y devuelve las respuestas en el mismo orden"""
+        with self.lock:
+            if self.socket is None:
+                self.conectar()
+            try:
+                return self._pipeline(mensajes)
+            except Exception:
+                # El estado del stream es desconocido: se descarta la conexion
+                self.cerrar()
+                raise
+
+    def _pipeline(self, mensajes):
+        """
+        Envia y lee en el mismo ciclo: mientras quedan bytes por mandar se siguen
+        leyendo respuestas. Con un sendall de toda la ventana, si el servidor deja
+        de leer porque sus respuestas llenaron el buffer del socket, ninguno de los
+        dos avanza.
+        """
+        ids = [self._nuevo_id() for _ in mensajes]
+        respuestas = {}
+        decoder = FrameDecoder()
+        salida = bytearray()
+        enviados = 0
+
+        while len(respuestas) < len(ids):
+            # Mantener hasta `ventana` solicitudes en vuelo para no bloquear al servidor
+            while enviados < len(ids) and enviados - len(respuestas) < self.ventana:
+                salida.extend(encode_frame(mensajes[enviados], ids[enviados]))
+                enviados += 1
+
+            legibles, escribibles, _ = select.select(
+                [self.socket], [self.socket] if salida else [], [], self.timeout
+            )
+            if not legibles and not escribibles:
+                raise socket.timeout("Sin respuesta del servidor")
+
+            if escribibles:
+                del salida[:self.socket.send(salida)]
+
+            if legibles:
+                data = self.socket.recv(1 << 20)
+                if not data:
+                    raise ConnectionError("El servidor cerro la conexion")
+                decoder.feed(data)
+                for payload, request_id in decoder.frames():
+                    respuestas[request_id] = json.loads(payload.decode('utf-8'))
+
+        return [respuestas[request_id] for request_id in ids]
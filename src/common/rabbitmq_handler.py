@@ -1,17 +1,43 @@
 import pika
 import json
+import time
 import logging
+import threading
+from collections import deque, OrderedDict
+from concurrent.futures import Future, wait
 from config.settings import (
     RABBITMQ_HOST, 
     RABBITMQ_PORT, 
     RABBITMQ_USER, 
-    RABBITMQ_PASS
+    RABBITMQ_PASS,
+    RABBITMQ_PUBLISHER_POOL_SIZE,
+    RABBITMQ_CONFIRM_TIMEOUT,
+    RABBITMQ_RECONNECT_DELAY
 )
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+def connection_parameters():
+    credentials = pika.PlainCredentials(RABBITMQ_USER, RABBITMQ_PASS)
+    return pika.ConnectionParameters(
+        host=RABBITMQ_HOST,
+        port=RABBITMQ_PORT,
+        credentials=credentials,
+        heartbeat=600,
+        blocked_connection_timeout=300
+    )
+
+
+def task_properties(**kwargs):
+    return pika.BasicProperties(
+        delivery_mode=2,
+        content_type='application/json',
+        **kwargs
+    )
+
+
 class RabbitMQHandler:
     def __init__(self):
         self.connection = None
@@ -20,15 +46,7 @@ class RabbitMQHandler:
     
     def connect(self):
         try:
-            credentials = pika.PlainCredentials(RABBITMQ_USER, RABBITMQ_PASS)
-            parameters = pika.ConnectionParameters(
-                host=RABBITMQ_HOST,
-                port=RABBITMQ_PORT,
-                credentials=credentials,
-                heartbeat=600,
-                blocked_connection_timeout=300
-            )
-            self.connection = pika.BlockingConnection(parameters)
+            self.connection = pika.BlockingConnection(connection_parameters())
             self.channel = self.connection.channel()
             logger.info(f"Conectado a RabbitMQ en {RABBITMQ_HOST}:{RABBITMQ_PORT}")
         except Exception as e:
@@ -46,10 +64,7 @@ class RabbitMQHandler:
                 exchange='',
                 routing_key=queue_name,
                 body=message,
-                properties=pika.BasicProperties(
-                    delivery_mode=2,
-                    content_type='application/json'
-                )
+                properties=task_properties()
             )
             logger.info(f"Tarea publicada en cola '{queue_name}': {task_data.get('task_id', 'N/A')}")
             return True
@@ -57,18 +72,328 @@ class RabbitMQHandler:
             logger.error(f"Error publicando tarea: {e}")
             return False
     
-    def consume_tasks(self, queue_name, callback):
+    def consume_tasks(self, queue_name, callback, prefetch_count=1):
         self.declare_queue(queue_name)
-        self.channel.basic_qos(prefetch_count=1)
+        self.channel.basic_qos(prefetch_count=prefetch_count)
         self.channel.basic_consume(
             queue=queue_name,
             on_message_callback=callback,
             auto_ack=False
         )
-        logger.info(f"Esperando tareas en cola '{queue_name}'...")
+        logger.info(f"Esperando tareas en cola '{queue_name}' (prefetch: {prefetch_count})...")
         self.channel.start_consuming()
     
+    def call_threadsafe(self, callback):
+        """Programa callback en el hilo de la conexion (unica forma segura de ack desde otro hilo)"""
+        self.connection.add_callback_threadsafe(callback)
+    
     def close(self):
         if self.connection and not self.connection.is_closed:
             self.connection.close()
-            logger.info("Conexion a RabbitMQ cerrada")
\ No newline at end of file
+            logger.info("Conexion a RabbitMQ cerrada")
+
+
+class MetricasPublicacion:
+    """Contadores compartidos por todos los canales del pool"""
+    
+    def __init__(self, ventana=10000):
+        self.lock = threading.Lock()
+        self.publicadas = 0
+        self.confirmadas = 0
+        self.rechazadas = 0
+        self.reconexiones = 0
+        self.latencias = deque(maxlen=ventana)
+    
+    def registrar_confirmacion(self, ok, latencia):
+        with self.lock:
+            if ok:
+                self.confirmadas += 1
+            else:
+                self.rechazadas += 1
+            self.latencias.append(latencia)
+    
+    def registrar_publicacion(self):
+        with self.lock:
+            self.publicadas += 1
+    
+    def registrar_reconexion(self):
+        with self.lock:
+            self.reconexiones += 1
+    
+    def resumen(self):
+        with self.lock:
+            latencias = sorted(self.latencias)
+            resumen = {
+                'publicadas': self.publicadas,
+                'confirmadas': self.confirmadas,
+                'rechazadas': self.rechazadas,
+                'reconexiones': self.reconexiones
+            }
+        if latencias:
+            resumen['latencia_promedio_ms'] = sum(latencias) / len(latencias) * 1000
+            resumen['latencia_p99_ms'] = latencias[min(len(latencias) - 1, int(len(latencias) * 0.99))] * 1000
+        else:
+            resumen['latencia_promedio_ms'] = 0.0
+            resumen['latencia_p99_ms'] = 0.0
+        return resumen
+
+
+class CanalPublicacion:
+    """
+    Conexion propia (SelectConnection) con un canal en modo confirm.
+    El ioloop corre en un hilo dedicado; el resto de los hilos solo encolan
+    mensajes y reciben un Future que se resuelve con el ack/nack del broker.
+    """
+    
+    def __init__(self, nombre, metricas):
+        self.nombre = nombre
+        self.metricas = metricas
+        self.connection = None
+        self.channel = None
+        self.lock = threading.Lock()
+        self.salientes = deque()
+        self.pendientes = OrderedDict()
+        self.devueltos = set()
+        self.delivery_tag = 0
+        self.flush_programado = False
+        self.listo = threading.Event()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name=f"publisher-{nombre}", daemon=True)
+        self.thread.start()
+    
+    def en_vuelo(self):
+        with self.lock:
+            return len(self.salientes) + len(self.pendientes)
+    
+    def publicar(self, queue_name, body):
+        future = Future()
+        with self.lock:
+            self.salientes.append((queue_name, body, future, time.monotonic()))
+            programar = self.listo.is_set() and not self.flush_programado
+            if programar:
+                self.flush_programado = True
+        
+        if programar:
+            self._en_ioloop(self._flush)
+        return future
+    
+    def ejecutar(self, funcion, timeout=RABBITMQ_CONFIRM_TIMEOUT):
+        """Ejecuta funcion(channel, future) en el hilo del ioloop y espera el resultado"""
+        if not self.listo.wait(timeout):
+            raise TimeoutError(f"Canal {self.nombre} no disponible")
+        future = Future()
+        self._en_ioloop(lambda: funcion(self.channel, future))
+        return future.result(timeout)
+    
+    def cerrar(self):
+        self.running = False
+        if self.connection and not (self.connection.is_closing or self.connection.is_closed):
+            self._en_ioloop(self.connection.close)
+        self.thread.join(timeout=5)
+    
+    def _en_ioloop(self, callback):
+        try:
+            self.connection.ioloop.add_callback_threadsafe(callback)
+        except Exception as e:
+            # La conexion se esta cerrando: los mensajes quedan en salientes hasta reconectar
+            logger.warning(f"Canal {self.nombre}: no se pudo programar en el ioloop: {e}")
+    
+    def _run(self):
+        while self.running:
+            try:
+                self.connection = pika.SelectConnection(
+                    connection_parameters(),
+                    on_open_callback=self._on_connection_open,
+                    on_open_error_callback=self._on_connection_error,
+                    on_close_callback=self._on_connection_closed
+                )
+                self.connection.ioloop.start()
+            except Exception as e:
+                logger.error(f"Canal {self.nombre}: error en ioloop: {e}")
+            
+            if self.running:
+                self.metricas.registrar_reconexion()
+                logger.warning(f"Canal {self.nombre}: reconectando en {RABBITMQ_RECONNECT_DELAY}s...")
+                time.sleep(RABBITMQ_RECONNECT_DELAY)
+    
+    def _on_connection_open(self, connection):
+        connection.channel(on_open_callback=self._on_channel_open)
+    
+    def _on_connection_error(self, connection, error):
+        logger.error(f"Canal {self.nombre}: error conectando a RabbitMQ: {error}")
+        connection.ioloop.stop()
+    
+    def _on_connection_closed(self, connection, reason):
+        self.listo.clear()
+        self.channel = None
+        self._fallar_pendientes()
+        if self.running:
+            logger.warning(f"Canal {self.nombre}: conexion cerrada: {reason}")
+        connection.ioloop.stop()
+    
+    def _on_channel_open(self, channel):
+        self.channel = channel
+        channel.add_on_close_callback(self._on_channel_closed)
+        channel.add_on_return_callback(self._on_return)
+        channel.confirm_delivery(ack_nack_callback=self._on_confirm, callback=self._on_confirm_ok)
+    
+    def _on_confirm_ok(self, frame):
+        self.delivery_tag = 0
+        self.listo.set()
+        logger.info(f"Canal de publicacion {self.nombre} listo (modo confirm)")
+        self._flush()
+    
+    def _on_channel_closed(self, channel, reason):
+        self.listo.clear()
+        self.channel = None
+        self._fallar_pendientes()
+        logger.warning(f"Canal {self.nombre}: canal cerrado: {reason}")
+        # Forzar reconexion completa para reabrir el canal
+        if not (self.connection.is_closing or self.connection.is_closed):
+            self.connection.close()
+    
+    def _flush(self):
+        with self.lock:
+            self.flush_programado = False
+            lote = list(self.salientes)
+            self.salientes.clear()
+        
+        for i, (queue_name, body, future, inicio) in enumerate(lote):
+            if future.cancelled():
+                continue
+            if self.channel is None or not self.channel.is_open:
+                # El canal se cayo a mitad del flush: devolver lo que falta a la cola
+                with self.lock:
+                    self.salientes.extendleft(reversed(lote[i:]))
+                return
+            
+            self.delivery_tag += 1
+            self.pendientes[self.delivery_tag] = (future, inicio)
+            self.channel.basic_publish(
+                exchange='',
+                routing_key=queue_name,
+                body=body,
+                properties=task_properties(message_id=str(self.delivery_tag)),
+                mandatory=True
+            )
+            self.metricas.registrar_publicacion()
+    
+    def _on_return(self, channel, method, properties, body):
+        logger.error(f"Mensaje devuelto por el broker ({method.reply_text}) en cola '{method.routing_key}'")
+        if properties.message_id:
+            self.devueltos.add(int(properties.message_id))
+    
+    def _on_confirm(self, frame):
+        method = frame.method
+        ack = isinstance(method, pika.spec.Basic.Ack)
+        ahora = time.monotonic()
+        
+        with self.lock:
+            confirmados = []
+            if method.multiple:
+                while self.pendientes and next(iter(self.pendientes)) <= method.delivery_tag:
+                    confirmados.append(self.pendientes.popitem(last=False))
+            elif method.delivery_tag in self.pendientes:
+                confirmados.append((method.delivery_tag, self.pendientes.pop(method.delivery_tag)))
+        
+        for tag, (future, inicio) in confirmados:
+            ok = ack and tag not in self.devueltos
+            self.devueltos.discard(tag)
+            self.metricas.registrar_confirmacion(ok, ahora - inicio)
+            if not future.done():
+                future.set_result(ok)
+    
+    def _fallar_pendientes(self):
+        # Sin confirmacion no se puede saber si el broker los recibio
+        with self.lock:
+            pendientes = list(self.pendientes.values())
+            self.pendientes.clear()
+            self.devueltos.clear()
+            self.flush_programado = False
+        for future, inicio in pendientes:
+            self.metricas.registrar_confirmacion(False, time.monotonic() - inicio)
+            if not future.done():
+                future.set_result(False)
+
+
+class PublisherPool:
+    """
+    Publicador thread-safe: reparte los mensajes entre varios canales en modo
+    confirm y permite esperar las confirmaciones sin bloquear a otros hilos.
+    Expone la misma interfaz de publicacion que RabbitMQHandler.
+    """
+    
+    def __init__(self, tamano=RABBITMQ_PUBLISHER_POOL_SIZE, timeout=RABBITMQ_CONFIRM_TIMEOUT):
+        self.timeout = timeout
+        self.metricas_publicacion = MetricasPublicacion()
+        self.canales = [CanalPublicacion(i, self.metricas_publicacion) for i in range(tamano)]
+        
+        limite = time.monotonic() + timeout
+        listos = sum(1 for canal in self.canales if canal.listo.wait(max(0, limite - time.monotonic())))
+        if not listos:
+            self.close()
+            raise ConnectionError(f"No se pudo conectar a RabbitMQ en {RABBITMQ_HOST}:{RABBITMQ_PORT}")
+        logger.info(f"Pool de publicacion conectado: {listos}/{tamano} canales")
+    
+    def _elegir_canal(self):
+        # Menor cantidad de mensajes en vuelo entre los canales disponibles
+        disponibles = [canal for canal in self.canales if canal.listo.is_set()] or self.canales
+        return min(disponibles, key=lambda canal: canal.en_vuelo())
+    
+    def declare_queue(self, queue_name):
+        def declarar(channel, future):
+            channel.queue_declare(
+                queue=queue_name,
+                durable=True,
+                callback=lambda frame: future.set_result(True)
+            )
+        
+        self._elegir_canal().ejecutar(declarar, self.timeout)
+        logger.info(f"Cola '{queue_name}' declarada")
+    
+    def publish_async(self, queue_name, task_data):
+        """Publica sin bloquear. Devuelve un Future que se resuelve en True/False con el confirm"""
+        return self._elegir_canal().publicar(queue_name, json.dumps(task_data))
+    
+    def publish_task(self, queue_name, task_data):
+        future = self.publish_async(queue_name, task_data)
+        try:
+            ok = future.result(self.timeout)
+        except Exception as e:
+            future.cancel()
+            logger.error(f"Error publicando tarea: sin confirmacion en {self.timeout}s ({e})")
+            return False
+        
+        if ok:
+            logger.info(f"Tarea publicada en cola '{queue_name}': {task_data.get('task_id', 'N/A')}")
+        else:
+            logger.error(f"Broker rechazo tarea {task_data.get('task_id', 'N/A')}")
+        return ok
+    
+    def publish_batch(self, mensajes):
+        """Publica todos los mensajes en pipeline por un mismo canal y espera todos los confirms"""
+        canal = self._elegir_canal()
+        futures = [canal.publicar(queue_name, json.dumps(task_data)) for queue_name, task_data in mensajes]
+        wait(futures, timeout=self.timeout)
+        
+        resultados = []
+        for future in futures:
+            if future.done() and not future.cancelled():
+                resultados.append(future.result())
+            else:
+                future.cancel()
+                resultados.append(False)
+        
+        logger.info(f"Lote publicado: {sum(resultados)}/{len(mensajes)} tareas confirmadas")
+        return resultados
+    
+    def metricas(self):
+        resumen = self.metricas_publicacion.resumen()
+        resumen['en_vuelo'] = sum(canal.en_vuelo() for canal in self.canales)
+        resumen['canales_listos'] = sum(1 for canal in self.canales if canal.listo.is_set())
+        return resumen
+    
+    def close(self):
+        for canal in self.canales:
+            canal.cerrar()
+        logger.info("Pool de publicacion a RabbitMQ cerrado")
@@ -0,0 +1,386 @@
+import os
+import zlib
+import logging
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from config.settings import RECIBOS_PROCESOS, RECIBOS_BLOQUE, RECIBOS_PDF_COMPRIMIR
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Render de recibos de sueldo a PDF sin dependencias externas: una pagina A4 con
+# las fuentes estandar Helvetica / Helvetica-Bold (no se embeben) y WinAnsiEncoding.
+
+ANCHO_PAGINA = 595
+ALTO_PAGINA = 842
+
+# Anchos de caracteres (1/1000 del tamano de fuente) de las metricas AFM de Adobe, ASCII 32..126
+_ANCHOS_HELVETICA = [
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584
+]
+_ANCHOS_HELVETICA_BOLD = [
+    278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,
+    975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,
+    333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,
+    611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584
+]
+
+# Letras acentuadas: mismo ancho que la letra base
+_BASES = {'á': 'a', 'é': 'e', 'í': 'i', 'ó': 'o', 'ú': 'u', 'ü': 'u', 'ñ': 'n',
+          'Á': 'A', 'É': 'E', 'Í': 'I', 'Ó': 'O', 'Ú': 'U', 'Ü': 'U', 'Ñ': 'N'}
+
+
+def tabla_anchos(anchos):
+    tabla = {chr(32 + i): ancho for i, ancho in enumerate(anchos)}
+    for acentuada, base in _BASES.items():
+        tabla[acentuada] = tabla[base]
+    return tabla
+
+
+FUENTES = {
+    'F1': ('Helvetica', tabla_anchos(_ANCHOS_HELVETICA)),
+    'F2': ('Helvetica-Bold', tabla_anchos(_ANCHOS_HELVETICA_BOLD))
+}
+
+_ESCAPES = str.maketrans({'\\': '\\\\', '(': '\\(', ')': '\\)', '\r': ' ', '\n': ' '})
+_SEPARADORES_MILES = str.maketrans(',.', '.,')
+
+
+def importe(valor):
+    """1234567.8 -> '1.234.567,80'"""
+    return f"{valor:,.2f}".translate(_SEPARADORES_MILES)
+
+
+class Slot:
+    """Posicion de un texto variable, resuelta al compilar la plantilla"""
+
+    def __init__(self, fuente, tamano, x, y, alineacion='izquierda', ancho=None):
+        self.tamano = tamano
+        self.x = x
+        self.y = y
+        self.alineacion = alineacion
+        self.ancho = ancho
+        self.anchos = FUENTES[fuente][1]
+        self.escala = tamano / 1000.0
+        self.prefijo = f"BT /{fuente} {tamano} Tf "
+
+    def medir(self, texto):
+        anchos = self.anchos
+        return sum(anchos.get(c, 556) for c in texto) * self.escala
+
+    def ajustar(self, texto):
+        """Recorta el texto al ancho del slot"""
+        if self.ancho is None or self.medir(texto) <= self.ancho:
+            return texto
+        disponible = self.ancho / self.escala - self.anchos['.'] * 3
+        acumulado = 0
+        for i, c in enumerate(texto):
+            acumulado += self.anchos.get(c, 556)
+            if acumulado > disponible:
+                return texto[:i] + '...'
+        return texto
+
+    def texto(self, texto, dy=0):
+        texto = self.ajustar(texto)
+        x = self.x
+        if self.alineacion == 'derecha':
+            x -= self.medir(texto)
+        elif self.alineacion == 'centro':
+            x -= self.medir(texto) / 2
+        return f"{self.prefijo}{x:.2f} {self.y - dy} Td ({texto.translate(_ESCAPES)}) Tj ET\n"
+
+
+class PlantillaRecibo:
+    """
+    Plantilla del recibo compilada una vez por proceso: el contenido fijo
+    (recuadros, titulos, encabezado de la tabla), los objetos del PDF que no
+    cambian y la tabla xref quedan armados en bytes; por recibo solo se
+    formatean los textos variables y el largo del stream.
+    """
+
+    MAX_FILAS = 22
+    ALTO_FILA = 14
+
+    def __init__(self, comprimir=RECIBOS_PDF_COMPRIMIR):
+        self.comprimir = comprimir
+        self.slots = {
+            'razon_social': Slot('F2', 12, 50, 795, ancho=300),
+            'cuit': Slot('F1', 9, 85, 780),
+            'periodo': Slot('F2', 11, 545, 780, 'derecha'),
+            'empleado': Slot('F2', 10, 50, 735, ancho=300),
+            'cuil': Slot('F1', 9, 420, 735),
+            'legajo': Slot('F1', 9, 85, 719),
+            'liquidacion': Slot('F1', 9, 420, 719),
+            'fecha': Slot('F1', 9, 420, 703),
+            'codigo': Slot('F1', 8, 50, 664),
+            'concepto': Slot('F1', 8, 100, 664, ancho=230),
+            'haber': Slot('F1', 8, 440, 664, 'derecha'),
+            'deduccion': Slot('F1', 8, 540, 664, 'derecha'),
+            'total_haberes': Slot('F2', 9, 440, 337, 'derecha'),
+            'total_deducciones': Slot('F2', 9, 540, 337, 'derecha'),
+            'neto': Slot('F2', 12, 540, 305, 'derecha')
+        }
+        self.fijo = self.compilar_fijo()
+        self.compilar_documento()
+
+    def compilar_fijo(self):
+        etiquetas = [
+            ('F2', 14, 545, 795, 'derecha', 'RECIBO DE HABERES'),
+            ('F1', 9, 50, 780, 'izquierda', 'CUIT:'),
+            ('F1', 9, 380, 735, 'izquierda', 'CUIL:'),
+            ('F1', 9, 50, 719, 'izquierda', 'Legajo:'),
+            ('F1', 9, 380, 719, 'izquierda', 'Liq. N:'),
+            ('F1', 9, 380, 703, 'izquierda', 'Fecha:'),
+            ('F2', 8, 50, 680, 'izquierda', 'Codigo'),
+            ('F2', 8, 100, 680, 'izquierda', 'Concepto'),
+            ('F2', 8, 440, 680, 'derecha', 'Haberes'),
+            ('F2', 8, 540, 680, 'derecha', 'Deducciones'),
+            ('F2', 9, 100, 337, 'izquierda', 'Totales'),
+            ('F2', 12, 100, 305, 'izquierda', 'NETO A COBRAR'),
+            ('F1', 8, 50, 200, 'izquierda', 'Recibi el importe neto de esta liquidacion y copia de este recibo.'),
+            ('F1', 8, 470, 130, 'centro', 'Firma del empleado'),
+            ('F1', 8, 130, 130, 'centro', 'Firma del empleador')
+        ]
+        partes = [
+            "0.5 w\n",
+            # Encabezado, datos del empleado, tabla de conceptos y neto
+            "40 770 515 42 re S\n",
+            "40 695 515 60 re S\n",
+            "40 325 515 365 re S\n",
+            "40 674 m 555 674 l S\n",
+            "40 350 m 555 350 l S\n",
+            "40 295 515 28 re S\n",
+            "90 350 m 90 690 l S\n",
+            "350 325 m 350 690 l S\n",
+            "450 325 m 450 690 l S\n",
+            "60 140 m 200 140 l S\n",
+            "400 140 m 540 140 l S\n"
+        ]
+        for fuente, tamano, x, y, alineacion, texto in etiquetas:
+            partes.append(Slot(fuente, tamano, x, y, alineacion).texto(texto))
+        return "".join(partes)
+
+    def compilar_documento(self):
+        objetos = [
+            "<< /Type /Catalog /Pages 2 0 R >>",
+            "<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {ANCHO_PAGINA} {ALTO_PAGINA}] "
+            f"/Resources << /Font << /F1 4 0 R /F2 5 0 R >> >> /Contents 6 0 R >>"
+        ]
+        for alias in ('F1', 'F2'):
+            objetos.append(f"<< /Type /Font /Subtype /Type1 /BaseFont /{FUENTES[alias][0]} /Encoding /WinAnsiEncoding >>")
+
+        cabecera = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        offsets = []
+        for numero, objeto in enumerate(objetos, start=1):
+            offsets.append(len(cabecera))
+            cabecera.extend(f"{numero} 0 obj\n{objeto}\nendobj\n".encode('ascii'))
+        # El stream es el ultimo objeto: todos los offsets de la xref se conocen de antemano
+        offsets.append(len(cabecera))
+        filtro = " /Filter /FlateDecode" if self.comprimir else ""
+        cabecera.extend(f"6 0 obj\n<<{filtro} /Length ".encode('ascii'))
+
+        self.cabecera = bytes(cabecera)
+        xref = ["xref\n0 7\n0000000000 65535 f \n"]
+        xref.extend(f"{offset:010d} 00000 n \n" for offset in offsets)
+        xref.append("trailer\n<< /Size 7 /Root 1 0 R >>\nstartxref\n")
+        self.xref = "".join(xref).encode('ascii')
+
+    def contenido(self, datos):
+        slots = self.slots
+        partes = [
+            self.fijo,
+            slots['razon_social'].texto(datos['razon_social']),
+            slots['cuit'].texto(datos['cuit']),
+            slots['periodo'].texto(f"Periodo {datos['periodo']}"),
+            slots['empleado'].texto(f"{datos['apellido']}, {datos['nombre']}"),
+            slots['cuil'].texto(datos['cuil']),
+            slots['legajo'].texto(datos.get('legajo') or '-'),
+            slots['liquidacion'].texto(str(datos['liquidacion_id'])),
+            slots['fecha'].texto(datos['fecha'])
+        ]
+
+        conceptos = datos['conceptos']
+        if len(conceptos) > self.MAX_FILAS:
+            # Los que no entran se agrupan en una ultima fila
+            resto = conceptos[self.MAX_FILAS - 1:]
+            conceptos = conceptos[:self.MAX_FILAS - 1] + [(
+                '', f"Otros ({len(resto)} conceptos)",
+                sum(c[2] or 0 for c in resto) or None,
+                sum(c[3] or 0 for c in resto) or None
+            )]
+        for fila, (codigo, descripcion, haber, deduccion) in enumerate(conceptos):
+            dy = fila * self.ALTO_FILA
+            partes.append(slots['codigo'].texto(codigo, dy))
+            partes.append(slots['concepto'].texto(descripcion, dy))
+            if haber is not None:
+                partes.append(slots['haber'].texto(importe(haber), dy))
+            if deduccion is not None:
+                partes.append(slots['deduccion'].texto(importe(deduccion), dy))
+
+        partes.append(slots['total_haberes'].texto(importe(datos['total_haberes'])))
+        partes.append(slots['total_deducciones'].texto(importe(datos['total_deducciones'])))
+        partes.append(slots['neto'].texto(f"$ {importe(datos['neto'])}"))
+        return "".join(partes).encode('cp1252', 'replace')
+
+    def stream(self, datos):
+        """Content stream de la pagina (comprimido si corresponde)"""
+        stream = self.contenido(datos)
+        return zlib.compress(stream, 6) if self.comprimir else stream
+
+    def render(self, datos):
+        """datos del recibo -> bytes del PDF"""
+        stream = self.stream(datos)
+        inicio_xref = len(self.cabecera) + len(str(len(stream))) + len(b" >>\nstream\n") + len(stream) + len(b"\nendstream\nendobj\n")
+        return b"".join([
+            self.cabecera, str(len(stream)).encode('ascii'), b" >>\nstream\n", stream,
+            b"\nendstream\nendobj\n", self.xref, str(inicio_xref).encode('ascii'), b"\n%%EOF\n"
+        ])
+
+
+class DocumentoRecibos:
+    """
+    PDF de varias paginas (un recibo por pagina) escrito en streaming sobre
+    `destino` (cualquier objeto con write). Por pagina solo se guarda su offset;
+    el arbol de paginas y la xref se escriben al cerrar.
+    """
+
+    def __init__(self, destino, comprimir=RECIBOS_PDF_COMPRIMIR):
+        self.destino = destino
+        self.filtro = " /Filter /FlateDecode" if comprimir else ""
+        self.posicion = 0
+        # 1: catalogo, 2: arbol de paginas (se escriben al final), 3 y 4: fuentes
+        self.offsets = {}
+        self.paginas = []
+        self.escribir(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        for numero, alias in ((3, 'F1'), (4, 'F2')):
+            self.objeto(numero, f"<< /Type /Font /Subtype /Type1 /BaseFont /{FUENTES[alias][0]} /Encoding /WinAnsiEncoding >>")
+        self.siguiente = 5
+        self.recursos = (
+            f"/Parent 2 0 R /MediaBox [0 0 {ANCHO_PAGINA} {ALTO_PAGINA}] "
+            f"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >>"
+        )
+
+    def escribir(self, datos):
+        self.destino.write(datos)
+        self.posicion += len(datos)
+
+    def objeto(self, numero, contenido):
+        self.offsets[numero] = self.posicion
+        self.escribir(f"{numero} 0 obj\n{contenido}\nendobj\n".encode('ascii'))
+
+    def agregar(self, stream):
+        """Agrega una pagina con el content stream de PlantillaRecibo.stream()"""
+        pagina, contenido = self.siguiente, self.siguiente + 1
+        self.siguiente += 2
+        self.objeto(pagina, f"<< /Type /Page {self.recursos} /Contents {contenido} 0 R >>")
+        self.offsets[contenido] = self.posicion
+        self.escribir(b"".join([
+            f"{contenido} 0 obj\n<<{self.filtro} /Length {len(stream)} >>\nstream\n".encode('ascii'),
+            stream,
+            b"\nendstream\nendobj\n"
+        ]))
+        self.paginas.append(pagina)
+
+    def cerrar(self):
+        kids = " ".join(f"{pagina} 0 R" for pagina in self.paginas)
+        self.objeto(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.paginas)} >>")
+        self.objeto(1, "<< /Type /Catalog /Pages 2 0 R >>")
+        inicio_xref = self.posicion
+        xref = [f"xref\n0 {self.siguiente}\n0000000000 65535 f \n"]
+        xref.extend(f"{self.offsets[numero]:010d} 00000 n \n" for numero in range(1, self.siguiente))
+        xref.append(f"trailer\n<< /Size {self.siguiente} /Root 1 0 R >>\nstartxref\n{inicio_xref}\n%%EOF\n")
+        self.escribir("".join(xref).encode('ascii'))
+
+
+# Estado de cada proceso del pool: la plantilla se compila en el initializer
+_plantilla = None
+
+
+def inicializar_proceso(comprimir=RECIBOS_PDF_COMPRIMIR):
+    global _plantilla
+    _plantilla = PlantillaRecibo(comprimir)
+
+
+def plantilla():
+    if _plantilla is None:
+        inicializar_proceso()
+    return _plantilla
+
+
+def renderizar(datos):
+    return plantilla().render(datos)
+
+
+def renderizar_bloque(bloque, solo_stream=False):
+    # Un envio por bloque reduce el costo de serializacion entre procesos
+    render = plantilla().stream if solo_stream else plantilla().render
+    return [render(datos) for datos in bloque]
+
+
+class PoolRecibos:
+    """
+    Render en procesos separados (el armado del PDF es CPU puro y en el pool de
+    hilos del worker competiria por el GIL). El executor se crea en el primer uso.
+    """
+
+    def __init__(self, procesos=RECIBOS_PROCESOS, bloque=RECIBOS_BLOQUE, comprimir=RECIBOS_PDF_COMPRIMIR):
+        self.procesos = procesos or os.cpu_count() or 1
+        self.bloque = bloque
+        self.comprimir = comprimir
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def get_executor(self):
+        with self.lock:
+            if self.executor is None:
+                # spawn: el worker tiene hilos (pika, listener) y un fork los copiaria a medio usar
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.procesos,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=inicializar_proceso,
+                    initargs=(self.comprimir,)
+                )
+                logger.info(f"Pool de render de recibos iniciado con {self.procesos} procesos")
+            return self.executor
+
+    def renderizar(self, datos):
+        return self.get_executor().submit(renderizar, datos).result()
+
+    def renderizar_lote(self, datos, solo_stream=False):
+        """
+        Genera (datos, pdf) en el mismo orden que `datos` (puede ser un iterador).
+        Como mucho dos bloques por proceso quedan en vuelo: la memoria no crece con el lote.
+        Con solo_stream se devuelve el content stream de la pagina (para DocumentoRecibos).
+        """
+        executor = self.get_executor()
+        en_vuelo = deque()
+        bloque = []
+        for item in datos:
+            bloque.append(item)
+            if len(bloque) >= self.bloque:
+                en_vuelo.append((bloque, executor.submit(renderizar_bloque, bloque, solo_stream)))
+                bloque = []
+                if len(en_vuelo) >= self.procesos * 2:
+                    pendiente, future = en_vuelo.popleft()
+                    yield from zip(pendiente, future.result())
+        if bloque:
+            en_vuelo.append((bloque, executor.submit(renderizar_bloque, bloque, solo_stream)))
+        while en_vuelo:
+            pendiente, future = en_vuelo.popleft()
+            yield from zip(pendiente, future.result())
+
+    def close(self):
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=True, cancel_futures=True)
+                self.executor = None
@@ -0,0 +1,189 @@
+import time
+import logging
+import threading
+from decimal import Decimal
+from config.settings import REGLAS_CHECK_INTERVAL
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Huella de las filas que definen los planes: cambia ante cualquier INSERT/UPDATE/DELETE
+QUERY_HUELLA = """
+    SELECT md5(
+        COALESCE((SELECT string_agg(concat_ws('|', id, codigo, tipo, es_comun, porcentaje, orden), ',' ORDER BY id)
+                  FROM conceptos), '')
+        || '#' ||
+        COALESCE((SELECT string_agg(convenio_id || ':' || concepto_id, ',' ORDER BY convenio_id, concepto_id)
+                  FROM convenio_conceptos), '')
+    ) AS huella
+"""
+
+QUERY_CONCEPTOS = """
+    SELECT id, codigo, nombre, tipo, es_comun, porcentaje, orden
+    FROM conceptos
+    ORDER BY orden, codigo
+"""
+
+QUERY_CONVENIO_CONCEPTOS = "SELECT convenio_id, concepto_id FROM convenio_conceptos"
+
+
+class Concepto:
+    def __init__(self, codigo, nombre, tipo, tasa=None, orden=100):
+        self.codigo = codigo
+        self.nombre = nombre
+        self.tipo = tipo
+        self.tasa = tasa
+        self.orden = orden
+
+
+# Reglas historicas, usadas si la base todavia no tiene las columnas de porcentaje
+CONCEPTOS_POR_DEFECTO = [
+    Concepto('03000', 'Jubilacion 11%', 'deduccion', 0.11, 10),
+    Concepto('03002', 'Ley 19032 3%', 'deduccion', 0.03, 20),
+    Concepto('03010', 'Obra Social 3%', 'deduccion', 0.03, 30),
+    Concepto('04000', 'Contribuciones Patronales 23%', 'contribucion', 0.23, 100)
+]
+
+
+def tasa_decimal(porcentaje):
+    # 11.000 -> 0.11 exacto como float (igual que el literal 0.11)
+    return float(Decimal(porcentaje) / 100) if porcentaje is not None else None
+
+
+class PlanLiquidacion:
+    """Plan compilado de un convenio: conceptos por codigo y tasas de deducciones y contribuciones ya ordenadas"""
+
+    def __init__(self, convenio_id, conceptos):
+        self.convenio_id = convenio_id
+        self.conceptos = {concepto.codigo: concepto for concepto in conceptos}
+        ordenados = sorted(conceptos, key=lambda c: (c.orden, c.codigo))
+        self.deducciones = [c for c in ordenados if c.tipo == 'deduccion' and c.tasa is not None]
+        self.contribuciones = [c for c in ordenados if c.tipo == 'contribucion' and c.tasa is not None]
+
+    def tipo(self, concepto):
+        """Tipo informado en la novedad o, si falta, el del concepto con ese codigo"""
+        tipo = concepto.get('tipo')
+        if tipo is None:
+            definicion = self.conceptos.get(concepto.get('codigo'))
+            tipo = definicion.tipo if definicion else None
+        return tipo
+
+    def tasa(self, codigo):
+        concepto = self.conceptos.get(codigo)
+        return concepto.tasa if concepto is not None and concepto.tasa is not None else 0.0
+
+    def calcular_bruto(self, conceptos):
+        total = 0
+        for concepto in conceptos:
+            if self.tipo(concepto) == 'remunerativo':
+                total += concepto.get('monto', 0)
+        return total
+
+    def calcular_deducciones(self, sueldo_bruto):
+        total = 0
+        for deduccion in self.deducciones:
+            total += sueldo_bruto * deduccion.tasa
+        return total
+
+    def calcular_cargas_sociales(self, sueldo_bruto):
+        total = 0
+        for contribucion in self.contribuciones:
+            total += sueldo_bruto * contribucion.tasa
+        return total
+
+    def ejecutar(self, conceptos):
+        """Devuelve (bruto, deducciones, neto, cargas) de un empleado"""
+        sueldo_bruto = self.calcular_bruto(conceptos)
+        deducciones = self.calcular_deducciones(sueldo_bruto)
+        sueldo_neto = sueldo_bruto - deducciones
+        cargas_sociales = self.calcular_cargas_sociales(sueldo_bruto)
+        return sueldo_bruto, deducciones, sueldo_neto, cargas_sociales
+
+
+PLAN_POR_DEFECTO = PlanLiquidacion(None, CONCEPTOS_POR_DEFECTO)
+
+
+class CatalogoReglas:
+    """
+    Cache de planes por convenio. Las filas de conceptos se leen una vez por
+    worker y los planes solo se recompilan cuando cambia la huella de las tablas
+    (verificada como mucho cada `intervalo` segundos).
+    """
+
+    def __init__(self, db, intervalo=REGLAS_CHECK_INTERVAL):
+        self.db = db
+        self.intervalo = intervalo
+        self.lock = threading.Lock()
+        self.planes = {}
+        self.conceptos = []
+        self.especificos = {}
+        self.huella = None
+        self.proxima_verificacion = 0
+        self.compilaciones = 0
+
+    def plan(self, convenio_id):
+        self.verificar()
+        plan = self.planes.get(convenio_id)
+        if plan is None:
+            with self.lock:
+                plan = self.planes.get(convenio_id)
+                if plan is None:
+                    plan = self.compilar(convenio_id)
+                    self.planes[convenio_id] = plan
+        return plan
+
+    def verificar(self):
+        if time.monotonic() < self.proxima_verificacion:
+            return
+        with self.lock:
+            if time.monotonic() < self.proxima_verificacion:
+                return
+            self.proxima_verificacion = time.monotonic() + self.intervalo
+            try:
+                resultado = self.db.execute_query(QUERY_HUELLA)
+                if resultado is None:
+                    raise Exception("Error consultando la huella de conceptos")
+                huella = resultado[0]['huella']
+                if huella == self.huella:
+                    return
+                self.cargar()
+                self.huella = huella
+            except Exception as e:
+                if self.huella is not None or self.planes:
+                    logger.error(f"No se pudieron verificar las reglas, se mantienen las compiladas: {e}")
+                    return
+                logger.warning(f"Tablas de reglas no disponibles, se usan las tasas por defecto: {e}")
+                self.conceptos = None
+                self.especificos = {}
+            self.planes = {}
+
+    def cargar(self):
+        filas = self.db.execute_query(QUERY_CONCEPTOS)
+        vinculos = self.db.execute_query(QUERY_CONVENIO_CONCEPTOS)
+        if filas is None or vinculos is None:
+            raise Exception("Error consultando conceptos y convenios")
+
+        por_id = {}
+        self.conceptos = []
+        for fila in filas:
+            concepto = Concepto(fila['codigo'], fila['nombre'], fila['tipo'], tasa_decimal(fila['porcentaje']), fila['orden'])
+            por_id[fila['id']] = concepto
+            if fila['es_comun']:
+                self.conceptos.append(concepto)
+
+        self.especificos = {}
+        for vinculo in vinculos:
+            concepto = por_id.get(vinculo['concepto_id'])
+            if concepto is not None:
+                self.especificos.setdefault(vinculo['convenio_id'], []).append(concepto)
+
+        self.compilaciones += 1
+        logger.info(f"Reglas cargadas: {len(filas)} conceptos, {len(vinculos)} vinculos con convenios")
+
+    def compilar(self, convenio_id):
+        if self.conceptos is None:
+            return PLAN_POR_DEFECTO
+        conceptos = {c.codigo: c for c in self.conceptos}
+        for concepto in self.especificos.get(convenio_id, []):
+            conceptos[concepto.codigo] = concepto
+        return PlanLiquidacion(convenio_id, list(conceptos.values()))
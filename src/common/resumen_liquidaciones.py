@@ -0,0 +1,117 @@
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# Totales calculados desde liquidaciones, con la misma forma que liquidaciones_resumen
+QUERY_RESUMEN_REAL = """
+    SELECT empresa_id, periodo, estado, COUNT(*) AS cantidad,
+           COALESCE(SUM(sueldo_bruto), 0) AS total_bruto,
+           COALESCE(SUM(sueldo_neto), 0) AS total_neto,
+           COALESCE(SUM(cargas_sociales), 0) AS total_cargas
+    FROM liquidaciones
+    GROUP BY empresa_id, periodo, estado
+"""
+
+
+def totales_periodo(db, empresa_id, periodo, estado=None):
+    """
+    Cantidad y sumas de las liquidaciones de (empresa, periodo) leidas de
+    liquidaciones_resumen; sin estado se suman todos los estados.
+    """
+    query = """
+        SELECT COALESCE(SUM(cantidad), 0)::bigint AS cantidad,
+               COALESCE(SUM(total_bruto), 0) AS total_bruto,
+               COALESCE(SUM(total_neto), 0) AS total_neto,
+               COALESCE(SUM(total_cargas), 0) AS total_cargas
+        FROM liquidaciones_resumen
+        WHERE empresa_id = %s AND periodo = %s
+    """
+    params = [empresa_id, periodo]
+    if estado is not None:
+        query += " AND estado = %s"
+        params.append(estado)
+    resultado = db.execute_query(query, tuple(params))
+    return resultado[0] if resultado else None
+
+
+def totales_globales(db, estado='completada'):
+    """Cantidad y neto de todas las empresas y periodos para un estado"""
+    resultado = db.execute_query(
+        """
+        SELECT COALESCE(SUM(cantidad), 0)::bigint AS cantidad, COALESCE(SUM(total_neto), 0) AS total_neto
+        FROM liquidaciones_resumen
+        WHERE estado = %s
+        """,
+        (estado,)
+    )
+    return resultado[0] if resultado else None
+
+
+def cantidad_dia(db, estado='completada'):
+    """
+    Liquidaciones creadas hoy en un estado. Se cuentan sobre liquidaciones con
+    un rango en idx_liquidaciones_estado_recientes: un total diario mantenido por
+    trigger seria una sola fila que todos los workers actualizan a la vez.
+    """
+    resultado = db.execute_query(
+        "SELECT COUNT(*) AS cantidad FROM liquidaciones WHERE created_at >= CURRENT_DATE AND estado = %s",
+        (estado,)
+    )
+    return resultado[0]['cantidad'] if resultado else 0
+
+
+def diferencias(db):
+    """
+    Compara liquidaciones_resumen contra un GROUP BY sobre liquidaciones.
+    Devuelve (clave, guardado, real) por cada fila distinta; las filas del
+    resumen en cero equivalen a una fila ausente.
+    """
+    filas = db.execute_query(
+        f"""
+        WITH real AS ({QUERY_RESUMEN_REAL})
+        SELECT COALESCE(r.empresa_id, x.empresa_id) AS empresa_id,
+               COALESCE(r.periodo, x.periodo) AS periodo,
+               COALESCE(r.estado, x.estado) AS estado,
+               r.cantidad AS cantidad_guardada, x.cantidad AS cantidad_real,
+               r.total_bruto AS bruto_guardado, x.total_bruto AS bruto_real,
+               r.total_neto AS neto_guardado, x.total_neto AS neto_real,
+               r.total_cargas AS cargas_guardadas, x.total_cargas AS cargas_reales
+        FROM liquidaciones_resumen r
+        FULL JOIN real x USING (empresa_id, periodo, estado)
+        WHERE (COALESCE(r.cantidad, 0), COALESCE(r.total_bruto, 0), COALESCE(r.total_neto, 0), COALESCE(r.total_cargas, 0))
+              IS DISTINCT FROM
+              (COALESCE(x.cantidad, 0), COALESCE(x.total_bruto, 0), COALESCE(x.total_neto, 0), COALESCE(x.total_cargas, 0))
+        ORDER BY 1, 2, 3
+        """
+    )
+    if filas is None:
+        raise Exception("No se pudo leer liquidaciones_resumen")
+    return [
+        (
+            (f['empresa_id'], f['periodo'], f['estado']),
+            (f['cantidad_guardada'], f['bruto_guardado'], f['neto_guardado'], f['cargas_guardadas']),
+            (f['cantidad_real'], f['bruto_real'], f['neto_real'], f['cargas_reales'])
+        )
+        for f in filas
+    ]
+
+
+def reconstruir(db):
+    """
+    Recalcula liquidaciones_resumen desde liquidaciones. El lock SHARE frena las
+    escrituras en liquidaciones mientras dura la transaccion, asi ningun trigger
+    aplica un delta sobre totales a medio reconstruir.
+    """
+    with db.transaccion():
+        db.execute_query("LOCK TABLE liquidaciones IN SHARE MODE", fetch=False)
+        db.execute_query("DELETE FROM liquidaciones_resumen", fetch=False)
+        db.execute_query(
+            f"""
+            INSERT INTO liquidaciones_resumen (empresa_id, periodo, estado, cantidad, total_bruto, total_neto, total_cargas)
+            {QUERY_RESUMEN_REAL}
+            """,
+            fetch=False
+        )
+    logger.info("Resumen de liquidaciones reconstruido")
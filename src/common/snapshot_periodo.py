@@ -0,0 +1,312 @@
+import os
+import json
+import mmap
+import struct
+import logging
+import tempfile
+from decimal import Decimal
+from datetime import datetime, timedelta
+import numpy as np
+from common.cache_artefactos import CacheArtefactos
+from common.storage import nombre_con_hash
+from config.settings import SNAPSHOTS_DIR, DB_STREAM_CHUNK_SIZE
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+TIPO = 'snapshot_periodo'
+CONTENEDOR = 'snapshots'
+
+# Cabecera: MAGIC, largo del JSON de metadatos, metadatos (rellenados a 8 bytes)
+MAGIC = b'LQSNAP1\0'
+VERSION = 2
+CABECERA = struct.Struct('<8sQ')
+EPOCH = datetime(1970, 1, 1)
+# NULL en las columnas de ancho fijo
+NULO = np.iinfo(np.int64).min
+
+# Columnas de ancho fijo (int64): importes en centavos, created_at en microsegundos
+COLUMNAS = ('id', 'empleado_id', 'estado', 'sueldo_bruto', 'sueldo_neto', 'cargas_sociales', 'created_at', 'orden_nombre')
+IMPORTES = ('sueldo_bruto', 'sueldo_neto', 'cargas_sociales')
+# Columnas de texto: offsets (int64, filas + 1) sobre un bloque UTF-8 por columna,
+# mas un byte por fila que marca NULL (un texto vacio no es un CBU ausente)
+TEXTOS = ('legajo', 'apellido', 'nombre', 'cuil', 'cbu')
+
+QUERY_SNAPSHOT = """
+    SELECT l.id, l.empleado_id, l.estado, l.sueldo_bruto, l.sueldo_neto, l.cargas_sociales, l.created_at,
+           e.legajo, e.apellido, e.nombre, e.cuil, e.cbu,
+           ROW_NUMBER() OVER (ORDER BY e.apellido, e.nombre, l.id) - 1 AS posicion_nombre
+    FROM liquidaciones l
+    JOIN empleados e ON l.empleado_id = e.id
+    WHERE l.empresa_id = %s AND l.periodo = %s
+    ORDER BY l.id
+"""
+
+
+def _relleno(largo):
+    return (-largo) % 8
+
+
+def _centavos(valor):
+    return NULO if valor is None else int(valor * 100)
+
+
+def escribir_snapshot(db, storage, empresa_id, periodo):
+    """
+    Materializa las liquidaciones de (empresa, periodo) con los datos de sus
+    empleados en un archivo columnar inmutable. Las filas quedan en orden de
+    id; orden_nombre guarda la permutacion por apellido y nombre (la misma
+    collation que usa Postgres en los ORDER BY de los workers).
+    """
+    columnas = {nombre: [] for nombre in COLUMNAS}
+    textos = {nombre: [] for nombre in TEXTOS}
+    estados = {}
+
+    for bloque in db.stream_query(QUERY_SNAPSHOT, (empresa_id, periodo)):
+        for fila in bloque:
+            columnas['id'].append(fila['id'])
+            columnas['empleado_id'].append(fila['empleado_id'])
+            columnas['estado'].append(estados.setdefault(fila['estado'], len(estados)))
+            for importe in IMPORTES:
+                columnas[importe].append(_centavos(fila[importe]))
+            creado = fila['created_at']
+            columnas['created_at'].append((creado - EPOCH) // timedelta(microseconds=1) if creado else NULO)
+            columnas['orden_nombre'].append(fila['posicion_nombre'])
+            for nombre in TEXTOS:
+                textos[nombre].append(None if fila[nombre] is None else fila[nombre].encode('utf-8'))
+
+    filas = len(columnas['id'])
+    if not filas:
+        raise Exception(f"No hay liquidaciones de la empresa {empresa_id} en {periodo}")
+
+    arrays = {nombre: np.asarray(valores, dtype='<i8') for nombre, valores in columnas.items()}
+    # posicion_nombre -> indice de fila
+    orden = np.empty(filas, dtype='<i8')
+    orden[arrays['orden_nombre']] = np.arange(filas, dtype='<i8')
+    arrays['orden_nombre'] = orden
+
+    # Secciones en el orden en que se escriben; offsets relativos al fin de la cabecera
+    secciones = []
+    meta = {
+        'version': VERSION,
+        'empresa_id': empresa_id,
+        'periodo': periodo,
+        'filas': filas,
+        'estados': list(estados),
+        'columnas': {},
+        'textos': {}
+    }
+    posicion = 0
+    for nombre in COLUMNAS:
+        meta['columnas'][nombre] = posicion
+        secciones.append(arrays[nombre].tobytes())
+        posicion += filas * 8
+    for nombre in TEXTOS:
+        valores = textos[nombre]
+        nulos = np.fromiter((v is None for v in valores), dtype=np.uint8, count=filas)
+        valores = [v or b'' for v in valores]
+        offsets = np.zeros(filas + 1, dtype='<i8')
+        np.cumsum([len(v) for v in valores], out=offsets[1:])
+        datos = b''.join(valores)
+        partes = [offsets.tobytes(), datos + b'\0' * _relleno(len(datos)), nulos.tobytes() + b'\0' * _relleno(filas)]
+        meta['textos'][nombre] = []
+        for parte in partes:
+            meta['textos'][nombre].append(posicion)
+            secciones.append(parte)
+            posicion += len(parte)
+
+    meta_bytes = json.dumps(meta).encode('utf-8')
+    meta_bytes += b' ' * _relleno(CABECERA.size + len(meta_bytes))
+
+    nombre_archivo = f"periodo_{empresa_id}_{periodo.replace('-', '')}.lqs"
+    with storage.escritor(CONTENEDOR, nombre_archivo) as escritor:
+        escritor.write(CABECERA.pack(MAGIC, len(meta_bytes)))
+        escritor.write(meta_bytes)
+        for seccion in secciones:
+            escritor.write(seccion)
+
+    logger.info(f"Snapshot del periodo generado: {nombre_archivo} ({filas} liquidaciones)")
+
+    return {
+        'estado': 'completada',
+        'tipo': TIPO,
+        'archivo': nombre_archivo,
+        'ruta': escritor.resultado['url'],
+        'bytes': escritor.resultado['bytes'],
+        'sha256': escritor.resultado['sha256'],
+        'filas': filas,
+        'estados': {estado: int(np.count_nonzero(arrays['estado'] == codigo)) for estado, codigo in estados.items()}
+    }
+
+
+class SnapshotPeriodo:
+    """
+    Lectura de un snapshot por mmap. columna() devuelve vistas numpy sobre el
+    archivo mapeado (sin copia) y texto() decodifica solo las filas pedidas.
+    bloques() en cambio arma un dict por fila, con Decimal y datetime, para que
+    los workers reciban lo mismo que de la base: lo que se ahorra ahi es la
+    consulta (join con empleados y orden), no la conversion por fila.
+    """
+
+    def __init__(self, ruta):
+        with open(ruta, 'rb') as archivo:
+            self.mm = mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, largo_meta = CABECERA.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            self.mm.close()
+            raise ValueError(f"{ruta} no es un snapshot de periodo")
+        inicio = CABECERA.size + largo_meta
+        self.meta = json.loads(self.mm[CABECERA.size:inicio])
+        if self.meta.get('version') != VERSION:
+            self.mm.close()
+            raise ValueError(f"{ruta} tiene la version {self.meta.get('version')} del formato (se espera {VERSION})")
+        self.filas = self.meta['filas']
+        self.estados = self.meta['estados']
+        self.empresa_id = self.meta['empresa_id']
+        self.periodo = self.meta['periodo']
+
+        self.columnas = {
+            nombre: np.frombuffer(self.mm, dtype='<i8', count=self.filas, offset=inicio + offset)
+            for nombre, offset in self.meta['columnas'].items()
+        }
+        self.textos = {
+            nombre: (
+                np.frombuffer(self.mm, dtype='<i8', count=self.filas + 1, offset=inicio + offsets),
+                inicio + datos,
+                np.frombuffer(self.mm, dtype=np.uint8, count=self.filas, offset=inicio + nulos)
+            )
+            for nombre, (offsets, datos, nulos) in self.meta['textos'].items()
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def columna(self, nombre):
+        """Vista int64 sin copia; los NULL valen NULO"""
+        return self.columnas[nombre]
+
+    def indices(self, estado=None, orden=None):
+        """Filas en orden de id, o segun una columna de permutacion, filtradas por estado"""
+        indices = np.arange(self.filas) if orden is None else self.columnas[orden]
+        if estado is not None:
+            if estado not in self.estados:
+                return indices[:0]
+            indices = indices[self.columnas['estado'][indices] == self.estados.index(estado)]
+        return indices
+
+    def cantidad(self, estado=None):
+        return len(self.indices(estado))
+
+    def texto(self, nombre, indices):
+        offsets, base, nulos = self.textos[nombre]
+        inicios = offsets[indices].tolist()
+        fines = offsets[indices + 1].tolist()
+        mm = self.mm
+        return [
+            None if nulo else mm[base + a:base + b].decode('utf-8')
+            for a, b, nulo in zip(inicios, fines, nulos[indices].tolist())
+        ]
+
+    def bloques(self, estado=None, orden=None, tamano=DB_STREAM_CHUNK_SIZE):
+        """
+        Filas como dicts con los mismos nombres y tipos que las columnas de
+        liquidaciones y empleados (NULL vuelve como None)
+        """
+        indices = self.indices(estado, orden)
+        for desde in range(0, len(indices), tamano):
+            parte = indices[desde:desde + tamano]
+            valores = {nombre: self.columnas[nombre][parte].tolist() for nombre in COLUMNAS if nombre != 'orden_nombre'}
+            for importe in IMPORTES:
+                valores[importe] = [None if c == NULO else Decimal(c).scaleb(-2) for c in valores[importe]]
+            valores['estado'] = [self.estados[c] for c in valores['estado']]
+            valores['created_at'] = [None if us == NULO else EPOCH + timedelta(microseconds=us) for us in valores['created_at']]
+            for nombre in TEXTOS:
+                valores[nombre] = self.texto(nombre, parte)
+            valores['periodo'] = [self.periodo] * len(parte)
+            nombres = list(valores)
+            yield [dict(zip(nombres, fila)) for fila in zip(*valores.values())]
+
+    def close(self):
+        # Las vistas numpy retienen el buffer: se sueltan antes de cerrar el mmap
+        self.columnas = {}
+        self.textos = {}
+        try:
+            self.mm.close()
+        except BufferError:
+            # Alguien conserva una columna: el mmap se libera cuando la suelte
+            pass
+
+
+def ruta_local(storage, resultado):
+    """
+    Ruta en disco del snapshot. Con storage local es el archivo mismo; con S3 se
+    baja una vez a SNAPSHOTS_DIR con el hash en el nombre (el contenido no cambia).
+    """
+    if hasattr(storage, 'ruta'):
+        return storage.ruta(CONTENEDOR, resultado['archivo'])
+
+    os.makedirs(SNAPSHOTS_DIR, exist_ok=True)
+    local = nombre_con_hash(resultado['archivo'], resultado['sha256'])
+    ruta = os.path.join(SNAPSHOTS_DIR, local)
+    if os.path.exists(ruta):
+        return ruta
+
+    fd, temporal = tempfile.mkstemp(dir=SNAPSHOTS_DIR, suffix='.tmp')
+    try:
+        with open(fd, 'wb') as destino:
+            origen = storage.abrir(CONTENEDOR, resultado['archivo'])
+            for parte in iter(lambda: origen.read(1 << 20), b''):
+                destino.write(parte)
+        os.replace(temporal, ruta)
+    except Exception:
+        os.remove(temporal)
+        raise
+
+    # Las copias anteriores del mismo periodo ya no se van a usar
+    prefijo = os.path.splitext(resultado['archivo'])[0] + '_'
+    for nombre in os.listdir(SNAPSHOTS_DIR):
+        if nombre.endswith('.lqs') and nombre != local and nombre.startswith(prefijo):
+            os.remove(os.path.join(SNAPSHOTS_DIR, nombre))
+    return ruta
+
+
+def abrir_snapshot(artefactos, storage, empresa_id, periodo):
+    """
+    Snapshot vigente de (empresa, periodo) o None. Vigente quiere decir que la
+    huella de las liquidaciones no cambio desde el cierre y que ningun trigger
+    invalido la entrada (empleados o empresa modificados).
+    """
+    huella = artefactos.huella(empresa_id, periodo)
+    if huella is None:
+        return None
+    clave = CacheArtefactos.clave(TIPO, {'empresa_id': empresa_id, 'periodo': periodo})
+    resultado = artefactos.obtener(clave, huella)
+    if resultado is None:
+        return None
+    try:
+        snapshot = SnapshotPeriodo(ruta_local(storage, resultado))
+    except Exception as e:
+        logger.warning(f"No se pudo abrir el snapshot de {empresa_id}/{periodo}: {e}")
+        return None
+    if snapshot.empresa_id != empresa_id or snapshot.periodo != periodo:
+        snapshot.close()
+        return None
+    return snapshot
+
+
+def bloques_periodo(db, artefactos, storage, empresa_id, periodo, query, params, estado=None, orden=None):
+    """
+    Bloques de filas del periodo desde el snapshot vigente, o desde la base con
+    la query del worker si el periodo no esta cerrado (o cambio desde el cierre).
+    """
+    snapshot = abrir_snapshot(artefactos, storage, empresa_id, periodo)
+    if snapshot is None:
+        yield from db.stream_query(query, params)
+        return
+    logger.info(f"Liquidaciones de {empresa_id}/{periodo} leidas del snapshot")
+    with snapshot:
+        yield from snapshot.bloques(estado, orden)
@@ -0,0 +1,344 @@
+import os
+import uuid
+import hashlib
+import logging
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from config.settings import (
+    STORAGE_BACKEND,
+    ARCHIVOS_DIR,
+    S3_ENDPOINT_URL,
+    S3_ACCESS_KEY,
+    S3_SECRET_KEY,
+    S3_REGION,
+    S3_BUCKET_PREFIX,
+    S3_PART_SIZE,
+    S3_UPLOAD_THREADS,
+    S3_MAX_PARTS_IN_FLIGHT
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Minimo de S3 para todas las partes de un multipart salvo la ultima
+S3_MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+def nombre_con_hash(nombre, sha256):
+    """recibo_X.pdf -> recibo_X_<hash>.pdf: el nombre cambia solo si cambia el contenido"""
+    base, extension = os.path.splitext(nombre)
+    return f"{base}_{sha256[:16]}{extension}"
+
+
+class EscritorArchivo:
+    """
+    Escritura incremental de un archivo. Se usa como context manager: al salir
+    sin error el archivo se publica de forma atomica (nunca queda visible a
+    medias) y `resultado` tiene la ubicacion final; si hubo error se descarta.
+    """
+
+    def __init__(self, storage, contenedor, nombre, hash_en_nombre=False):
+        self.storage = storage
+        self.contenedor = contenedor
+        self.nombre = nombre
+        self.hash_en_nombre = hash_en_nombre
+        self.hash = hashlib.sha256()
+        self.bytes = 0
+        self.resultado = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            try:
+                self.abortar()
+            except Exception as e:
+                logger.error(f"Error descartando {self.contenedor}/{self.nombre}: {e}")
+            return False
+        try:
+            self.cerrar()
+        except Exception:
+            self.abortar()
+            raise
+        return False
+
+    def write(self, datos):
+        if isinstance(datos, str):
+            datos = datos.encode('utf-8')
+        self.hash.update(datos)
+        self.bytes += len(datos)
+        self.escribir(datos)
+        return len(datos)
+
+    # tell/flush permiten usarlo como archivo de solo escritura (por ejemplo, con zipfile)
+    def tell(self):
+        return self.bytes
+
+    def flush(self):
+        pass
+
+    def cerrar(self):
+        sha256 = self.hash.hexdigest()
+        nombre = nombre_con_hash(self.nombre, sha256) if self.hash_en_nombre else self.nombre
+        self.publicar(nombre)
+        self.resultado = {
+            'contenedor': self.contenedor,
+            'nombre': nombre,
+            'url': self.storage.url(self.contenedor, nombre),
+            'bytes': self.bytes,
+            'sha256': sha256
+        }
+        logger.info(f"Archivo guardado: {self.resultado['url']} ({self.bytes} bytes)")
+        return self.resultado
+
+    def escribir(self, datos):
+        raise NotImplementedError
+
+    def publicar(self, nombre):
+        raise NotImplementedError
+
+    def abortar(self):
+        raise NotImplementedError
+
+
+class Storage:
+    def escritor(self, contenedor, nombre, hash_en_nombre=False):
+        raise NotImplementedError
+
+    def guardar(self, contenedor, nombre, datos, hash_en_nombre=False):
+        """Guarda un contenido que ya esta en memoria (bytes o str)"""
+        with self.escritor(contenedor, nombre, hash_en_nombre) as escritor:
+            escritor.write(datos)
+        return escritor.resultado
+
+    def abrir(self, contenedor, nombre):
+        raise NotImplementedError
+
+    def existe(self, contenedor, nombre):
+        raise NotImplementedError
+
+    def eliminar(self, contenedor, nombre):
+        raise NotImplementedError
+
+    def url(self, contenedor, nombre):
+        raise NotImplementedError
+
+
+# Sistema de archivos local
+
+class EscritorLocal(EscritorArchivo):
+    def __init__(self, storage, contenedor, nombre, hash_en_nombre=False):
+        super().__init__(storage, contenedor, nombre, hash_en_nombre)
+        self.directorio = storage.directorio(contenedor)
+        # El temporal va en el mismo directorio: os.replace es atomico dentro del filesystem
+        fd, self.temporal = tempfile.mkstemp(dir=self.directorio, prefix=f".{nombre}.", suffix='.tmp')
+        self.archivo = open(fd, 'wb', buffering=1 << 20)
+
+    def escribir(self, datos):
+        self.archivo.write(datos)
+
+    def publicar(self, nombre):
+        self.archivo.flush()
+        os.fsync(self.archivo.fileno())
+        self.archivo.close()
+        os.replace(self.temporal, os.path.join(self.directorio, nombre))
+
+    def abortar(self):
+        self.archivo.close()
+        if os.path.exists(self.temporal):
+            os.remove(self.temporal)
+
+
+class LocalStorage(Storage):
+    def __init__(self, raiz=ARCHIVOS_DIR):
+        self.raiz = raiz
+
+    def directorio(self, contenedor):
+        directorio = os.path.join(self.raiz, contenedor)
+        os.makedirs(directorio, exist_ok=True)
+        return directorio
+
+    def ruta(self, contenedor, nombre):
+        return os.path.join(self.raiz, contenedor, nombre)
+
+    def escritor(self, contenedor, nombre, hash_en_nombre=False):
+        return EscritorLocal(self, contenedor, nombre, hash_en_nombre)
+
+    def abrir(self, contenedor, nombre):
+        return open(self.ruta(contenedor, nombre), 'rb')
+
+    def existe(self, contenedor, nombre):
+        return os.path.exists(self.ruta(contenedor, nombre))
+
+    def eliminar(self, contenedor, nombre):
+        if self.existe(contenedor, nombre):
+            os.remove(self.ruta(contenedor, nombre))
+
+    def url(self, contenedor, nombre):
+        return f"file://{os.path.abspath(self.ruta(contenedor, nombre))}"
+
+
+# S3 / MinIO
+
+class EscritorS3(EscritorArchivo):
+    """
+    Acumula hasta `part_size` bytes y los sube como partes de un multipart upload
+    en paralelo (pool compartido del storage). Como mucho `max_en_vuelo` partes
+    quedan en memoria a la vez. Un archivo chico se sube con un unico PUT.
+    """
+
+    def __init__(self, storage, contenedor, nombre, hash_en_nombre=False):
+        super().__init__(storage, contenedor, nombre, hash_en_nombre)
+        self.bucket = storage.bucket(contenedor)
+        # Con hash en el nombre la clave final se conoce al terminar: se sube a una temporal
+        self.clave = f".tmp/{uuid.uuid4().hex}-{nombre}" if hash_en_nombre else nombre
+        self.buffer = bytearray()
+        self.upload_id = None
+        self.partes = []
+        self.en_vuelo = threading.Semaphore(storage.max_en_vuelo)
+
+    def escribir(self, datos):
+        self.buffer.extend(datos)
+        while len(self.buffer) >= self.storage.part_size:
+            parte = bytes(self.buffer[:self.storage.part_size])
+            del self.buffer[:self.storage.part_size]
+            self.enviar_parte(parte)
+
+    def enviar_parte(self, datos):
+        client = self.storage.client
+        if self.upload_id is None:
+            self.upload_id = client.create_multipart_upload(Bucket=self.bucket, Key=self.clave)['UploadId']
+        numero = len(self.partes) + 1
+
+        self.en_vuelo.acquire()
+        try:
+            future = self.storage.executor.submit(
+                client.upload_part,
+                Bucket=self.bucket, Key=self.clave, UploadId=self.upload_id,
+                PartNumber=numero, Body=datos
+            )
+        except Exception:
+            self.en_vuelo.release()
+            raise
+        future.add_done_callback(lambda _: self.en_vuelo.release())
+        self.partes.append((numero, future))
+
+        # Cortar temprano si una parte anterior ya fallo
+        for _, anterior in self.partes:
+            if anterior.done() and anterior.exception():
+                raise anterior.exception()
+
+    def publicar(self, nombre):
+        client = self.storage.client
+        if self.upload_id is None:
+            client.put_object(Bucket=self.bucket, Key=self.clave, Body=bytes(self.buffer))
+        else:
+            if self.buffer:
+                self.enviar_parte(bytes(self.buffer))
+            self.buffer = bytearray()
+            # El objeto recien es visible al completar el multipart
+            partes = [{'PartNumber': numero, 'ETag': future.result()['ETag']} for numero, future in self.partes]
+            client.complete_multipart_upload(
+                Bucket=self.bucket, Key=self.clave, UploadId=self.upload_id,
+                MultipartUpload={'Parts': partes}
+            )
+
+        if self.clave != nombre:
+            # Copia del lado del servidor (multipart si hace falta) y borrado de la temporal
+            client.copy({'Bucket': self.bucket, 'Key': self.clave}, self.bucket, nombre)
+            client.delete_object(Bucket=self.bucket, Key=self.clave)
+
+    def abortar(self):
+        self.buffer = bytearray()
+        if self.upload_id is None:
+            return
+        for _, future in self.partes:
+            future.cancel()
+        wait([future for _, future in self.partes])
+        self.storage.client.abort_multipart_upload(Bucket=self.bucket, Key=self.clave, UploadId=self.upload_id)
+        logger.warning(f"Multipart abortado: s3://{self.bucket}/{self.clave}")
+
+
+class S3Storage(Storage):
+    """Backend compatible con S3 (AWS, MinIO). `client` permite inyectar un cliente boto3 ya configurado"""
+
+    def __init__(self, client=None, endpoint_url=S3_ENDPOINT_URL, bucket_prefix=S3_BUCKET_PREFIX,
+                 part_size=S3_PART_SIZE, threads=S3_UPLOAD_THREADS, max_en_vuelo=S3_MAX_PARTS_IN_FLIGHT):
+        if client is None:
+            try:
+                import boto3
+                from botocore.config import Config
+            except ImportError:
+                raise RuntimeError("STORAGE_BACKEND=s3 requiere boto3 (pip install boto3)")
+            client = boto3.client(
+                's3',
+                endpoint_url=endpoint_url or None,
+                aws_access_key_id=S3_ACCESS_KEY,
+                aws_secret_access_key=S3_SECRET_KEY,
+                region_name=S3_REGION,
+                config=Config(max_pool_connections=max(threads * 2, 10))
+            )
+        self.client = client
+        self.bucket_prefix = bucket_prefix
+        self.part_size = max(part_size, S3_MIN_PART_SIZE)
+        self.max_en_vuelo = max(max_en_vuelo, 1)
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='s3-upload')
+        self.buckets = set()
+        self.lock = threading.Lock()
+
+    def bucket(self, contenedor):
+        bucket = f"{self.bucket_prefix}{contenedor}"
+        if bucket in self.buckets:
+            return bucket
+        with self.lock:
+            if bucket not in self.buckets:
+                try:
+                    self.client.head_bucket(Bucket=bucket)
+                except Exception:
+                    self.client.create_bucket(Bucket=bucket)
+                    logger.info(f"Bucket creado: {bucket}")
+                self.buckets.add(bucket)
+        return bucket
+
+    def escritor(self, contenedor, nombre, hash_en_nombre=False):
+        return EscritorS3(self, contenedor, nombre, hash_en_nombre)
+
+    def abrir(self, contenedor, nombre):
+        return self.client.get_object(Bucket=self.bucket(contenedor), Key=nombre)['Body']
+
+    def existe(self, contenedor, nombre):
+        try:
+            self.client.head_object(Bucket=self.bucket(contenedor), Key=nombre)
+            return True
+        except Exception:
+            return False
+
+    def eliminar(self, contenedor, nombre):
+        self.client.delete_object(Bucket=self.bucket(contenedor), Key=nombre)
+
+    def url(self, contenedor, nombre):
+        return f"s3://{self.bucket_prefix}{contenedor}/{nombre}"
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_storage():
+    """Backend unico por proceso segun STORAGE_BACKEND ('local' o 's3')"""
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            if STORAGE_BACKEND == 's3':
+                _storage = S3Storage()
+            elif STORAGE_BACKEND == 'local':
+                _storage = LocalStorage()
+            else:
+                raise ValueError(f"STORAGE_BACKEND no soportado: {STORAGE_BACKEND}")
+            logger.info(f"Storage de archivos: {STORAGE_BACKEND}")
+        return _storage
@@ -0,0 +1,128 @@
+import numpy as np
+
+# Validacion vectorizada de CBU y CUIL/CUIT: se valida un array entero de
+# valores en una llamada (una multiplicacion de matrices por tabla de pesos).
+
+# Pesos de los digitos verificadores del CBU
+PESOS_CBU_BLOQUE1 = np.array([7, 1, 3, 9, 7, 1, 3], dtype=np.int32)
+PESOS_CBU_BLOQUE2 = np.array([3, 9, 7, 1, 3, 9, 7, 1, 3, 9, 7, 1, 3], dtype=np.int32)
+
+# Pesos del modulo 11 de CUIL/CUIT
+PESOS_CUIL = np.array([5, 4, 3, 2, 7, 6, 5, 4, 3, 2], dtype=np.int32)
+
+# Digito verificador esperado indexado por la suma ponderada (tablas precalculadas)
+TABLA_DV_CBU = np.array([(10 - s % 10) % 10 for s in range(9 * 13 * 9 + 1)], dtype=np.int8)
+# 11 -> 0; 10 no tiene digito valido (se marca con -1)
+TABLA_DV_CUIL = np.array([{11: 0, 10: -1}.get(11 - s % 11, 11 - s % 11) for s in range(9 * 7 * 10 + 1)], dtype=np.int8)
+
+PREFIJOS_CUIL = ('20', '23', '24', '27')
+PREFIJOS_CUIT = ('20', '23', '24', '27', '30', '33', '34')
+
+_SEPARADORES = str.maketrans('', '', '-./ ')
+
+# Codigos de error por fila (0 = valido)
+ERRORES = (None, 'vacio', 'longitud', 'caracteres', 'digito_bloque1', 'digito_bloque2', 'prefijo', 'digito_verificador')
+_CODIGO = {error: codigo for codigo, error in enumerate(ERRORES)}
+
+
+class ReporteValidacion:
+    """Resultado por fila: valor normalizado (solo digitos) y codigo de error (None si es valido)"""
+
+    def __init__(self, valores, normalizados, codigos):
+        self.valores = valores
+        self.normalizados = normalizados
+        self.codigos = codigos
+        self.validos = codigos == 0
+
+    def __len__(self):
+        return len(self.valores)
+
+    @property
+    def total_invalidos(self):
+        return int(np.count_nonzero(self.codigos))
+
+    @property
+    def errores(self):
+        return [ERRORES[codigo] for codigo in self.codigos]
+
+    def errores_por_fila(self, limite=None):
+        """[{'indice', 'valor', 'error'}] de las filas invalidas, opcionalmente acotado"""
+        indices = np.flatnonzero(self.codigos)[:limite]
+        return [{'indice': int(i), 'valor': self.valores[i], 'error': ERRORES[self.codigos[i]]} for i in indices]
+
+    def resumen(self):
+        conteo = np.bincount(self.codigos, minlength=len(ERRORES))
+        return {
+            'total': len(self),
+            'validos': int(conteo[0]),
+            'invalidos': len(self) - int(conteo[0]),
+            'por_error': {ERRORES[codigo]: int(n) for codigo, n in enumerate(conteo) if codigo and n}
+        }
+
+
+def normalizar(valores, largo):
+    """
+    Quita separadores y arma la matriz de digitos (filas x largo) de las filas
+    con el largo correcto. Devuelve (normalizados, codigos, indices, digitos).
+    """
+    # Los valores ya limpios (el caso comun) no pasan por translate
+    normalizados = [valor if valor and valor.isdigit() else (valor or '').translate(_SEPARADORES) for valor in valores]
+    largos = np.fromiter(map(len, normalizados), dtype=np.int64, count=len(normalizados))
+
+    codigos = np.zeros(len(normalizados), dtype=np.int8)
+    codigos[largos != largo] = _CODIGO['longitud']
+    codigos[largos == 0] = _CODIGO['vacio']
+
+    indices = np.flatnonzero(largos == largo)
+    if not len(indices):
+        return normalizados, codigos, indices, np.zeros((0, largo), dtype=np.int32)
+
+    # Un caracter no ASCII se reemplaza por '?' (un byte): el largo se conserva y queda fuera de rango
+    buffer = "".join([normalizados[i] for i in indices]).encode('ascii', 'replace')
+    digitos = np.frombuffer(buffer, dtype=np.uint8).reshape(len(indices), largo).astype(np.int32) - 48
+
+    no_numericas = ((digitos < 0) | (digitos > 9)).any(axis=1)
+    codigos[indices[no_numericas]] = _CODIGO['caracteres']
+
+    return normalizados, codigos, indices[~no_numericas], digitos[~no_numericas]
+
+
+def validar_cbus(valores):
+    """Valida los dos digitos verificadores de cada CBU (22 digitos)"""
+    normalizados, codigos, indices, digitos = normalizar(valores, 22)
+
+    if len(indices):
+        malo1 = TABLA_DV_CBU[digitos[:, 0:7] @ PESOS_CBU_BLOQUE1] != digitos[:, 7]
+        malo2 = TABLA_DV_CBU[digitos[:, 8:21] @ PESOS_CBU_BLOQUE2] != digitos[:, 21]
+        codigos[indices[malo2]] = _CODIGO['digito_bloque2']
+        codigos[indices[malo1]] = _CODIGO['digito_bloque1']
+
+    return ReporteValidacion(valores, normalizados, codigos)
+
+
+def validar_cuils(valores, prefijos=PREFIJOS_CUIL):
+    """Valida prefijo y digito verificador modulo 11 de cada CUIL (o CUIT con PREFIJOS_CUIT)"""
+    normalizados, codigos, indices, digitos = normalizar(valores, 11)
+
+    if len(indices):
+        dv = TABLA_DV_CUIL[digitos[:, 0:10] @ PESOS_CUIL]
+        prefijo_valido = np.isin(digitos[:, 0] * 10 + digitos[:, 1], [int(p) for p in prefijos])
+        codigos[indices[dv != digitos[:, 10]]] = _CODIGO['digito_verificador']
+        codigos[indices[~prefijo_valido]] = _CODIGO['prefijo']
+
+    return ReporteValidacion(valores, normalizados, codigos)
+
+
+def validar_cuits(valores):
+    return validar_cuils(valores, PREFIJOS_CUIT)
+
+
+def digito_cbu(digitos):
+    """Digito verificador para un bloque de 7 (banco+sucursal) o 13 (cuenta) digitos"""
+    pesos = PESOS_CBU_BLOQUE1 if len(digitos) == 7 else PESOS_CBU_BLOQUE2
+    return int(TABLA_DV_CBU[int(np.array([int(d) for d in digitos]) @ pesos)])
+
+
+def digito_cuil(digitos):
+    """Digito verificador para los 10 primeros digitos de un CUIL/CUIT (-1 si no existe)"""
+    return int(TABLA_DV_CUIL[int(np.array([int(d) for d in digitos]) @ PESOS_CUIL)])
@@ -0,0 +1,189 @@
+import json
+import logging
+import functools
+import psycopg2
+from concurrent.futures import ThreadPoolExecutor
+from common.rabbitmq_handler import RabbitMQHandler, task_properties
+from common.database import Database, PoolTimeout, cerrar_pool, cerrar_listener
+from common.cache_referencia import get_cache_referencia
+from config.settings import WORKER_PREFETCH_MULTIPLIER, QUEUE_RESULTS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ESTADOS_FINALES = ('completada', 'error')
+
+
+def error_transitorio(error):
+    """
+    Base caida o pool agotado: la misma tarea puede salir en un reintento. Cualquier
+    otro error se repetiria en cada entrega, asi que no se devuelve a la cola.
+    """
+    return isinstance(error, (psycopg2.OperationalError, psycopg2.InterfaceError, PoolTimeout))
+
+
+class WorkerBase:
+    """
+    Consumidor comun a todos los workers. El callback de pika solo entrega la
+    tarea al pool de hilos; el ack/nack se hace cuando el pool termina, pero
+    siempre desde el hilo de la conexion (pika no es thread-safe).
+    """
+    
+    nombre = 'Worker'
+    # El resultado de cada tarea se publica en QUEUE_RESULTS (lo persiste worker_resultados)
+    publica_resultados = True
+    
+    def __init__(self, queue_name, pool_size):
+        self.queue_name = queue_name
+        self.rabbitmq = RabbitMQHandler()
+        self.db = Database()
+        # Empleados y empresas en memoria, invalidados por LISTEN/NOTIFY
+        self.referencia = get_cache_referencia()
+        self.pool_size = pool_size
+        self.prefetch_count = pool_size * WORKER_PREFETCH_MULTIPLIER
+        self.executor = ThreadPoolExecutor(max_workers=self.pool_size)
+        self.cola_resultados_declarada = False
+        logger.info(f"{self.nombre} iniciado con pool de {self.pool_size} hilos")
+    
+    def process_task(self, task_data):
+        raise NotImplementedError
+    
+    def callback(self, ch, method, properties, body):
+        try:
+            task_data = json.loads(body)
+        except json.JSONDecodeError as e:
+            # Un mensaje corrupto nunca va a poder procesarse: se descarta
+            logger.error(f"Mensaje invalido descartado: {e}")
+            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+            return
+        
+        logger.info(f"Tarea recibida: {task_data.get('task_id')}")
+        
+        # Procesar en el pool de hilos sin bloquear el hilo de la conexion
+        future = self.executor.submit(self.process_task, task_data)
+        future.add_done_callback(
+            functools.partial(self.on_task_done, ch, method.delivery_tag, task_data)
+        )
+    
+    def on_task_done(self, ch, delivery_tag, task_data, future):
+        # Corre en un hilo del pool: el ack se devuelve al hilo de la conexion
+        error = future.exception()
+        if error:
+            logger.error(f"Error en tarea {task_data.get('task_id')}: {error}")
+            requeue = error_transitorio(error)
+            # Una tarea descartada no vuelve: su estado final es el error
+            resultados = [] if requeue else [self.mensaje_error(task_data, error)]
+            accion = functools.partial(self.nack, requeue=requeue)
+        else:
+            resultados = [self.mensaje_resultado(task_data, future.result())]
+            accion = self.ack
+        
+        def confirmar():
+            # El resultado sale antes del ack: si el worker se cae en el medio, la tarea se reprocesa
+            self.publicar_resultados(resultados)
+            accion(ch, delivery_tag, task_data)
+        
+        try:
+            self.rabbitmq.call_threadsafe(confirmar)
+        except Exception as e:
+            logger.error(f"No se pudo confirmar la tarea {task_data.get('task_id')}: {e}")
+    
+    def on_batch_done(self, ch, entregas, future):
+        # Igual que on_task_done pero para un lote: (delivery_tag, task_data) por mensaje
+        error = future.exception()
+        if error:
+            logger.error(f"Error en lote de {len(entregas)} tareas: {error}")
+            requeue = error_transitorio(error)
+            accion = functools.partial(self.nack, requeue=requeue)
+            resultados = [] if requeue else [self.mensaje_error(task_data, error) for _, task_data in entregas]
+        else:
+            accion = self.ack
+            resultados = [
+                self.mensaje_resultado(task_data, resultado)
+                for (_, task_data), resultado in zip(entregas, future.result() or [])
+            ]
+        
+        def confirmar():
+            self.publicar_resultados(resultados)
+            for delivery_tag, task_data in entregas:
+                accion(ch, delivery_tag, task_data)
+        
+        try:
+            self.rabbitmq.call_threadsafe(confirmar)
+        except Exception as e:
+            logger.error(f"No se pudo confirmar el lote de {len(entregas)} tareas: {e}")
+    
+    def mensaje_resultado(self, task_data, resultado, estado=None):
+        """Mensaje para la cola de resultados; el payload lleva solo los campos escalares de la tarea"""
+        if estado is None:
+            estado = resultado.get('estado') if isinstance(resultado, dict) else None
+            if estado not in ESTADOS_FINALES:
+                estado = 'completada'
+        return {
+            'task_id': task_data.get('task_id'),
+            'tipo': task_data.get('tipo'),
+            'estado': estado,
+            'resultado': resultado,
+            'payload': {k: v for k, v in task_data.items() if not isinstance(v, (list, dict))}
+        }
+    
+    def mensaje_error(self, task_data, error):
+        return self.mensaje_resultado(task_data, {'estado': 'error', 'mensaje': str(error).strip()})
+    
+    def publicar_resultados(self, mensajes):
+        """Publica en la cola de resultados; solo desde el hilo de la conexion"""
+        if not self.publica_resultados or not mensajes:
+            return
+        try:
+            if not self.cola_resultados_declarada:
+                self.rabbitmq.declare_queue(QUEUE_RESULTS)
+                self.cola_resultados_declarada = True
+            for mensaje in mensajes:
+                self.rabbitmq.channel.basic_publish(
+                    exchange='',
+                    routing_key=QUEUE_RESULTS,
+                    body=json.dumps(mensaje, default=str),
+                    properties=task_properties()
+                )
+        except Exception as e:
+            logger.warning(f"No se pudieron publicar {len(mensajes)} resultados: {e}")
+    
+    def publicar_progreso(self, task_data, procesados, total, **extra):
+        """Avance de una tarea larga en la cola de resultados; se publica desde el hilo de la conexion"""
+        mensaje = self.mensaje_resultado(task_data, dict(extra, procesados=procesados, total=total), estado='procesando')
+        
+        try:
+            self.rabbitmq.call_threadsafe(functools.partial(self.publicar_resultados, [mensaje]))
+        except Exception as e:
+            logger.warning(f"No se pudo publicar el progreso de {mensaje['task_id']}: {e}")
+    
+    def ack(self, ch, delivery_tag, task_data):
+        if ch.is_open:
+            ch.basic_ack(delivery_tag=delivery_tag)
+            logger.info(f"Tarea confirmada: {task_data.get('task_id')}")
+    
+    def nack(self, ch, delivery_tag, task_data, requeue=True):
+        if ch.is_open:
+            ch.basic_nack(delivery_tag=delivery_tag, requeue=requeue)
+            if requeue:
+                logger.warning(f"Tarea devuelta a la cola: {task_data.get('task_id')}")
+            else:
+                logger.error(f"Tarea descartada: {task_data.get('task_id')}")
+    
+    def start(self):
+        logger.info(f"Iniciando consumo de cola '{self.queue_name}'...")
+        self.rabbitmq.consume_tasks(self.queue_name, self.callback, self.prefetch_count)
+    
+    def stop(self):
+        self.executor.shutdown(wait=True)
+        # Despachar los acks que quedaron programados antes de cerrar
+        try:
+            if self.rabbitmq.connection and self.rabbitmq.connection.is_open:
+                self.rabbitmq.connection.process_data_events(time_limit=0)
+        except Exception as e:
+            logger.warning(f"No se pudieron despachar los ultimos acks: {e}")
+        self.rabbitmq.close()
+        logger.info(f"Cache de referencia: {self.referencia.metricas()}")
+        cerrar_listener()
+        cerrar_pool()
+        logger.info(f"{self.nombre} detenido")
@@ -9,6 +9,11 @@ RABBITMQ_PORT = int(os.getenv('RABBITMQ_PORT', 5672))
 RABBITMQ_USER = os.getenv('RABBITMQ_USER', 'admin')
 RABBITMQ_PASS = os.getenv('RABBITMQ_PASS', 'admin123')
 
+# Pool de publicadores (conexiones en modo confirm con reconexion automatica)
+RABBITMQ_PUBLISHER_POOL_SIZE = int(os.getenv('RABBITMQ_PUBLISHER_POOL_SIZE', 4))
+RABBITMQ_CONFIRM_TIMEOUT = int(os.getenv('RABBITMQ_CONFIRM_TIMEOUT', 30))
+RABBITMQ_RECONNECT_DELAY = int(os.getenv('RABBITMQ_RECONNECT_DELAY', 2))
+
 # Colas de RabbitMQ
 QUEUE_LIQUIDACION = 'liquidacion'
 QUEUE_REPORTES = 'reportes'
@@ -23,6 +28,23 @@ DB_NAME = os.getenv('DB_NAME', 'liquidacion_db')
 DB_USER = os.getenv('DB_USER', 'postgres')
 DB_PASS = os.getenv('DB_PASS', 'postgres123')
 
+# Pool de conexiones PostgreSQL
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', 1))
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', 10))
+DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', 30))
+DB_POOL_MAX_LIFETIME = int(os.getenv('DB_POOL_MAX_LIFETIME', 1800))
+DB_POOL_HEALTHCHECK_IDLE = int(os.getenv('DB_POOL_HEALTHCHECK_IDLE', 30))
+
+# Filas por bloque al leer resultados grandes con cursores del servidor
+DB_STREAM_CHUNK_SIZE = int(os.getenv('DB_STREAM_CHUNK_SIZE', 5000))
+
+# Conexion dedicada para LISTEN/NOTIFY
+DB_LISTEN_RECONNECT_DELAY = int(os.getenv('DB_LISTEN_RECONNECT_DELAY', 2))
+
+# Cache de empleados/empresas en cada proceso
+CACHE_REFERENCIA_MAX_ITEMS = int(os.getenv('CACHE_REFERENCIA_MAX_ITEMS', 100000))
+CACHE_REFERENCIA_TTL = int(os.getenv('CACHE_REFERENCIA_TTL', 600))
+
 # Configuracion Servidores Socket
 SOCKET_HOST = os.getenv('SOCKET_HOST', '0.0.0.0')
 SOCKET_PORT_1 = int(os.getenv('SOCKET_PORT_1', 9001))
@@ -31,13 +53,124 @@ SOCKET_PORT_3 = int(os.getenv('SOCKET_PORT_3', 9003))
 SOCKET_BUFFER_SIZE = 4096
 SOCKET_MAX_CONNECTIONS = 10
 
+# Modo del servidor socket: 'threads' (un hilo por conexion) o 'asyncio' (event loop)
+SOCKET_SERVER_MODE = os.getenv('SOCKET_SERVER_MODE', 'threads')
+SOCKET_MAX_CONCURRENT_HANDLERS = int(os.getenv('SOCKET_MAX_CONCURRENT_HANDLERS', 2000))
+SOCKET_ACCEPT_BACKLOG = int(os.getenv('SOCKET_ACCEPT_BACKLOG', 1024))
+SOCKET_READ_TIMEOUT = int(os.getenv('SOCKET_READ_TIMEOUT', 30))
+SOCKET_PUBLISH_THREADS = int(os.getenv('SOCKET_PUBLISH_THREADS', 64))
+
+# Protocolo con framing (largo + request id) sobre conexiones persistentes
+SOCKET_MAX_FRAME_SIZE = int(os.getenv('SOCKET_MAX_FRAME_SIZE', 64 * 1024 * 1024))
+SOCKET_IDLE_TIMEOUT = int(os.getenv('SOCKET_IDLE_TIMEOUT', 300))
+# Frames sin responder por conexion: tope del cliente y del servidor
+SOCKET_PIPELINE_WINDOW = int(os.getenv('SOCKET_PIPELINE_WINDOW', 256))
+
+# Envio de tareas en lote (un frame, N tareas)
+SOCKET_MAX_BATCH_SIZE = int(os.getenv('SOCKET_MAX_BATCH_SIZE', 10000))
+
+# Gateway (API REST): servidores socket entre los que reparte las tareas (host:puerto separados por coma)
+GATEWAY_SERVIDORES = [
+    (s.rsplit(':', 1)[0], int(s.rsplit(':', 1)[1]))
+    for s in os.getenv(
+        'GATEWAY_SERVIDORES',
+        f"localhost:{SOCKET_PORT_1},localhost:{SOCKET_PORT_2},localhost:{SOCKET_PORT_3}"
+    ).replace(' ', '').split(',')
+    if s
+]
+
+# Solicitudes en curso por servidor y segundos que se espera un lugar cuando todos estan al limite
+GATEWAY_MAX_EN_CURSO = int(os.getenv('GATEWAY_MAX_EN_CURSO', 32))
+GATEWAY_ESPERA = float(os.getenv('GATEWAY_ESPERA', 5))
+
+# Health check (ping) de cada servidor: intervalo y timeout en segundos, fallos seguidos para
+# sacarlo de la rotacion y pings exitosos seguidos para volver a admitirlo
+GATEWAY_HEALTH_INTERVAL = float(os.getenv('GATEWAY_HEALTH_INTERVAL', 5))
+GATEWAY_HEALTH_TIMEOUT = float(os.getenv('GATEWAY_HEALTH_TIMEOUT', 2))
+GATEWAY_FALLOS_EXPULSION = int(os.getenv('GATEWAY_FALLOS_EXPULSION', 3))
+GATEWAY_EXITOS_READMISION = int(os.getenv('GATEWAY_EXITOS_READMISION', 2))
+
+# Segundos que se reutiliza una conexion ociosa (menos que SOCKET_IDLE_TIMEOUT del servidor)
+GATEWAY_IDLE_MAX = float(os.getenv('GATEWAY_IDLE_MAX', 60))
+
 # Pool de hilos por Worker
 WORKER_THREAD_POOL_SIZE = {
     'liquidacion': 5,
     'reportes': 5,
     'archivos': 3,
-    'cargas': 3
+    'cargas': 3,
+    # Un solo hilo: los lotes de resultados se escriben en el orden en que llegan
+    'resultados': 1
 }
 
+# Mensajes sin confirmar por worker = pool * multiplicador (mantiene el pool ocupado)
+WORKER_PREFETCH_MULTIPLIER = int(os.getenv('WORKER_PREFETCH_MULTIPLIER', 2))
+
+# Micro-batching de liquidaciones: hasta N mensajes o T milisegundos por lote
+LIQUIDACION_BATCH_SIZE = int(os.getenv('LIQUIDACION_BATCH_SIZE', 500))
+LIQUIDACION_BATCH_MS = int(os.getenv('LIQUIDACION_BATCH_MS', 50))
+
+# Resultados de tareas: hasta N mensajes o T milisegundos por escritura en la tabla tareas
+RESULTADOS_BATCH_SIZE = int(os.getenv('RESULTADOS_BATCH_SIZE', 500))
+RESULTADOS_BATCH_MS = int(os.getenv('RESULTADOS_BATCH_MS', 50))
+
+# Maximo de segundos que GET /api/tarea/<task_id> espera un cambio de estado (long-poll / SSE)
+TAREAS_ESPERA_MAX = float(os.getenv('TAREAS_ESPERA_MAX', 30))
+
+# Paginas de GET /api/liquidaciones y /api/tareas (keyset): filas por defecto y maximo por pagina
+API_PAGINA_DEFAULT = int(os.getenv('API_PAGINA_DEFAULT', 50))
+API_PAGINA_MAX = int(os.getenv('API_PAGINA_MAX', 1000))
+
+# Cache de respuestas de los GET de la API: segundos de vida (ademas de la invalidacion por NOTIFY) y entradas
+API_CACHE_TTL = int(os.getenv('API_CACHE_TTL', 60))
+API_CACHE_MAX_ITEMS = int(os.getenv('API_CACHE_MAX_ITEMS', 1000))
+
+# Cada cuantos segundos se verifica si cambiaron las tablas conceptos/convenio_conceptos
+REGLAS_CHECK_INTERVAL = int(os.getenv('REGLAS_CHECK_INTERVAL', 30))
+
+# Filas por sentencia INSERT al liquidar una empresa completa (tarea liquidacion_empresa)
+LIQUIDACION_EMPRESA_PAGE_SIZE = int(os.getenv('LIQUIDACION_EMPRESA_PAGE_SIZE', 5000))
+
+# Storage de archivos generados por los workers: 'local' o 's3' (AWS / MinIO)
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'local')
+
+# Raiz del storage local (un subdirectorio por contenedor)
+ARCHIVOS_DIR = os.getenv('ARCHIVOS_DIR', '/tmp/liquidacion/archivos')
+
+# Storage S3 compatible: un bucket por contenedor (archivos-bancarios, recibos, ...)
+S3_ENDPOINT_URL = os.getenv('S3_ENDPOINT_URL', 'http://localhost:9100')
+S3_ACCESS_KEY = os.getenv('S3_ACCESS_KEY', 'minioadmin')
+S3_SECRET_KEY = os.getenv('S3_SECRET_KEY', 'minioadmin123')
+S3_REGION = os.getenv('S3_REGION', 'us-east-1')
+S3_BUCKET_PREFIX = os.getenv('S3_BUCKET_PREFIX', '')
+S3_PART_SIZE = int(os.getenv('S3_PART_SIZE', 8 * 1024 * 1024))
+S3_UPLOAD_THREADS = int(os.getenv('S3_UPLOAD_THREADS', 4))
+S3_MAX_PARTS_IN_FLIGHT = int(os.getenv('S3_MAX_PARTS_IN_FLIGHT', 8))
+
+# Cache de archivos generados (archivo bancario, DDJJ, reporte sindical): limite de
+# bytes en el storage y de entradas; se expulsan las menos usadas
+ARTEFACTOS_CACHE_MAX_BYTES = int(os.getenv('ARTEFACTOS_CACHE_MAX_BYTES', 1024 * 1024 * 1024))
+ARTEFACTOS_CACHE_MAX_ITEMS = int(os.getenv('ARTEFACTOS_CACHE_MAX_ITEMS', 1000))
+
+# Render de recibos PDF en un pool de procesos (0 = un proceso por core); los lotes
+# se envian a los procesos en bloques de RECIBOS_BLOQUE recibos
+RECIBOS_PROCESOS = int(os.getenv('RECIBOS_PROCESOS', 0))
+RECIBOS_BLOQUE = int(os.getenv('RECIBOS_BLOQUE', 64))
+RECIBOS_PDF_COMPRIMIR = os.getenv('RECIBOS_PDF_COMPRIMIR', 'true').lower() == 'true'
+
+# Cada cuantos segundos se publica el avance de recibos_periodo en la cola de resultados
+RECIBOS_PROGRESO_INTERVALO = float(os.getenv('RECIBOS_PROGRESO_INTERVALO', 2))
+
+# Copias locales de los snapshots de periodo cuando el storage es S3 (se leen por mmap)
+SNAPSHOTS_DIR = os.getenv('SNAPSHOTS_DIR', '/tmp/liquidacion/snapshots')
+
+# Maximo de filas con CBU/CUIL invalido detalladas en el resultado del archivo bancario
+ARCHIVOS_MAX_ERRORES_REPORTE = int(os.getenv('ARCHIVOS_MAX_ERRORES_REPORTE', 100))
+
+# Importacion de novedades (POST /api/liquidaciones/lote): empleados por tarea
+# liquidacion_empresa y maximo de rechazos detallados en la respuesta
+IMPORTACION_BLOQUE = int(os.getenv('IMPORTACION_BLOQUE', 2000))
+IMPORTACION_MAX_RECHAZOS = int(os.getenv('IMPORTACION_MAX_RECHAZOS', 100))
+
 # Timeout de tareas (segundos)
 TASK_TIMEOUT = 300
\ No newline at end of file
@@ -1,17 +1,30 @@
 import socket
 import threading
+import asyncio
 import json
 import logging
 import sys
 import os
+import uuid
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from common.rabbitmq_handler import RabbitMQHandler
+from common.rabbitmq_handler import PublisherPool
+from common import protocol
 from config.settings import (
     SOCKET_HOST,
     SOCKET_PORT_1,
     SOCKET_BUFFER_SIZE,
     SOCKET_MAX_CONNECTIONS,
+    SOCKET_SERVER_MODE,
+    SOCKET_MAX_CONCURRENT_HANDLERS,
+    SOCKET_ACCEPT_BACKLOG,
+    SOCKET_READ_TIMEOUT,
+    SOCKET_PUBLISH_THREADS,
+    SOCKET_IDLE_TIMEOUT,
+    SOCKET_PIPELINE_WINDOW,
+    SOCKET_MAX_FRAME_SIZE,
+    SOCKET_MAX_BATCH_SIZE,
     QUEUE_LIQUIDACION,
     QUEUE_REPORTES,
     QUEUE_ARCHIVOS,
@@ -23,22 +36,46 @@ logger = logging.getLogger(__name__)
 
 
 class SocketServer:
-    def __init__(self, port):
+    def __init__(self, port, modo=SOCKET_SERVER_MODE):
         self.host = SOCKET_HOST
         self.port = port
+        self.modo = modo
         self.socket = None
-        self.rabbitmq = RabbitMQHandler()
+        # Publicador thread-safe compartido por todos los handlers
+        self.rabbitmq = PublisherPool()
         self.running = False
         
+        # Solo para modo asyncio: limite de handlers y hilos que esperan confirms
+        self.handler_slots = None
+        self.publish_executor = None
+        
         # Mapeo de tipo de tarea a cola
         self.queue_mapping = {
             'liquidacion': QUEUE_LIQUIDACION,
+            'liquidacion_empresa': QUEUE_LIQUIDACION,
+            'cierre_periodo': QUEUE_LIQUIDACION,
             'reporte': QUEUE_REPORTES,
             'archivo_bancario': QUEUE_ARCHIVOS,
             'carga_social': QUEUE_CARGAS
         }
+        
+        # Campos minimos que debe traer cada tipo de tarea
+        self.campos_requeridos = {
+            'liquidacion': ('empresa_id', 'empleado_id', 'periodo'),
+            'liquidacion_empresa': ('empresa_id', 'periodo'),
+            'cierre_periodo': ('empresa_id', 'periodo'),
+            'reporte': ('tipo_reporte',),
+            'archivo_bancario': ('empresa_id', 'periodo'),
+            'carga_social': ('empresa_id', 'periodo')
+        }
     
     def start(self):
+        if self.modo == 'asyncio':
+            self.start_async()
+        else:
+            self.start_threads()
+    
+    def start_threads(self):
         try:
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
@@ -75,63 +112,334 @@ class SocketServer:
     
     def handle_client(self, client_socket, address):
         try:
+            client_socket.settimeout(SOCKET_READ_TIMEOUT)
+            
             # Recibir datos del cliente
-            data = client_socket.recv(SOCKET_BUFFER_SIZE).decode('utf-8')
+            data = client_socket.recv(SOCKET_BUFFER_SIZE)
             
             if not data:
                 logger.warning(f"Cliente {address} envio datos vacios")
                 return
             
-            # Parsear JSON
-            task_request = json.loads(data)
-            logger.info(f"Tarea recibida de {address}: {task_request.get('tipo', 'desconocido')}")
+            # Detectar formato: JSON suelto (legacy) o frames con largo + request id
+            if protocol.es_legacy(data):
+                self.handle_legacy(client_socket, address, data)
+            else:
+                self.handle_framed(client_socket, address, data)
+        
+        except protocol.ProtocolError as e:
+            logger.error(f"Error de protocolo desde {address}: {e}")
+        
+        except socket.timeout:
+            logger.warning(f"Timeout esperando datos de {address}")
+        
+        except Exception as e:
+            logger.error(f"Error manejando cliente {address}: {e}")
+        
+        finally:
+            client_socket.close()
+    
+    def handle_legacy(self, client_socket, address, data):
+        # Acumular hasta tener el JSON completo (antes se truncaba a SOCKET_BUFFER_SIZE)
+        while not protocol.legacy_completo(data) and len(data) < SOCKET_MAX_FRAME_SIZE:
+            chunk = client_socket.recv(SOCKET_BUFFER_SIZE)
+            if not chunk:
+                break
+            data += chunk
+        
+        response = self.procesar_mensaje(data.decode('utf-8', errors='replace'), address)
+        
+        # Enviar respuesta al cliente
+        client_socket.sendall(json.dumps(response).encode('utf-8'))
+        logger.info(f"Respuesta enviada a {address}: {response['status']}")
+    
+    def handle_framed(self, client_socket, address, data):
+        # Conexion persistente: se atienden frames hasta que el cliente cierre
+        client_socket.settimeout(SOCKET_IDLE_TIMEOUT)
+        decoder = protocol.FrameDecoder()
+        decoder.feed(data)
+        
+        while self.running:
+            for payload, request_id in decoder.frames():
+                response = self.procesar_mensaje(payload.decode('utf-8', errors='replace'), address)
+                client_socket.sendall(protocol.encode_frame(response, request_id))
             
-            # Validar y enriquecer tarea
-            task = self.prepare_task(task_request, address)
+            chunk = client_socket.recv(SOCKET_BUFFER_SIZE)
+            if not chunk:
+                break
+            decoder.feed(chunk)
+        
+        logger.info(f"Cliente {address} cerro la conexion persistente")
+    
+    def procesar_mensaje(self, data, address):
+        """Parsea el JSON recibido, publica la tarea y arma la respuesta"""
+        try:
+            task_request = json.loads(data)
+        except json.JSONDecodeError:
+            logger.error(f"Error: datos no son JSON valido desde {address}")
+            return {'status': 'error', 'mensaje': 'Formato JSON invalido'}
+        
+        if not isinstance(task_request, dict):
+            return {'status': 'error', 'mensaje': 'La tarea debe ser un objeto JSON'}
+        
+        if task_request.get('tipo') == 'ping':
+            # Health check del gateway: no publica nada
+            return {'status': 'ok', 'puerto': self.port, 'running': self.running}
+        
+        logger.info(f"Tarea recibida de {address}: {task_request.get('tipo', 'desconocido')}")
+        
+        if task_request.get('tipo') == 'lote':
+            return self.procesar_lote(task_request, address)
+        
+        error = self.validar_tarea(task_request)
+        if error:
+            return {'status': 'error', 'mensaje': error}
+        
+        # Enriquecer tarea
+        task = self.prepare_task(task_request, address)
+        queue_name = self.queue_mapping[task['tipo']]
+        
+        # Publicar en RabbitMQ
+        success = self.rabbitmq.publish_task(queue_name, task)
+        
+        if success:
+            return {
+                'status': 'aceptada',
+                'task_id': task['task_id'],
+                'cola': queue_name,
+                'mensaje': 'Tarea encolada correctamente'
+            }
+        return {
+            'status': 'error',
+            'mensaje': 'Error al encolar tarea'
+        }
+    
+    def procesar_lote(self, lote_request, address):
+        """Valida todas las tareas del lote en una pasada y las publica juntas con confirms"""
+        tareas = lote_request.get('tareas')
+        
+        if not isinstance(tareas, list) or not tareas:
+            return {'status': 'error', 'mensaje': 'El lote debe incluir una lista de tareas'}
+        
+        if len(tareas) > SOCKET_MAX_BATCH_SIZE:
+            return {
+                'status': 'error',
+                'mensaje': f"El lote excede el maximo de {SOCKET_MAX_BATCH_SIZE} tareas"
+            }
+        
+        resultados = [None] * len(tareas)
+        a_publicar = []
+        indices = []
+        timestamp = datetime.now()
+        
+        for indice, task_request in enumerate(tareas):
+            error = self.validar_tarea(task_request)
+            if error:
+                resultados[indice] = {'indice': indice, 'status': 'error', 'mensaje': error}
+                continue
             
-            # Publicar en RabbitMQ
-            queue_name = self.queue_mapping.get(task['tipo'])
+            task = self.prepare_task(task_request, address, timestamp)
+            a_publicar.append((self.queue_mapping[task['tipo']], task))
+            indices.append(indice)
+        
+        if a_publicar:
+            try:
+                confirmadas = self.rabbitmq.publish_batch(a_publicar)
+            except Exception as e:
+                logger.error(f"Error publicando lote de {address}: {e}")
+                confirmadas = [False] * len(a_publicar)
             
-            if queue_name:
-                success = self.rabbitmq.publish_task(queue_name, task)
-                
-                if success:
-                    response = {
+            for indice, (queue_name, task), ok in zip(indices, a_publicar, confirmadas):
+                if ok:
+                    resultados[indice] = {
+                        'indice': indice,
                         'status': 'aceptada',
                         'task_id': task['task_id'],
-                        'cola': queue_name,
-                        'mensaje': 'Tarea encolada correctamente'
+                        'cola': queue_name
                     }
                 else:
-                    response = {
+                    resultados[indice] = {
+                        'indice': indice,
                         'status': 'error',
                         'mensaje': 'Error al encolar tarea'
                     }
-            else:
-                response = {
-                    'status': 'error',
-                    'mensaje': f"Tipo de tarea no valido: {task['tipo']}"
-                }
+        
+        aceptadas = sum(1 for r in resultados if r['status'] == 'aceptada')
+        if aceptadas == len(tareas):
+            status = 'aceptada'
+        elif aceptadas:
+            status = 'parcial'
+        else:
+            status = 'error'
+        
+        logger.info(f"Lote de {address}: {aceptadas}/{len(tareas)} tareas encoladas")
+        
+        return {
+            'status': status,
+            'total': len(tareas),
+            'aceptadas': aceptadas,
+            'rechazadas': len(tareas) - aceptadas,
+            'tareas': resultados
+        }
+    
+    def validar_tarea(self, task_request):
+        """Devuelve un mensaje de error o None si la tarea es valida"""
+        if not isinstance(task_request, dict):
+            return 'La tarea debe ser un objeto JSON'
+        
+        tipo = task_request.get('tipo')
+        if tipo not in self.queue_mapping:
+            return f"Tipo de tarea no valido: {tipo}"
+        
+        faltantes = [c for c in self.campos_requeridos.get(tipo, ()) if task_request.get(c) is None]
+        if faltantes:
+            return f"Faltan campos requeridos: {', '.join(faltantes)}"
+        
+        return None
+    
+    def start_async(self):
+        try:
+            asyncio.run(self.serve_async())
+        except Exception as e:
+            logger.error(f"Error iniciando servidor: {e}")
+        finally:
+            self.stop()
+    
+    async def serve_async(self):
+        """Atiende todas las conexiones desde un unico hilo con asyncio"""
+        self.handler_slots = asyncio.Semaphore(SOCKET_MAX_CONCURRENT_HANDLERS)
+        # El event loop no se bloquea esperando confirms: eso ocurre en estos hilos
+        self.publish_executor = ThreadPoolExecutor(max_workers=SOCKET_PUBLISH_THREADS)
+        
+        for queue in self.queue_mapping.values():
+            self.rabbitmq.declare_queue(queue)
+        
+        server = await asyncio.start_server(
+            self.handle_client_async,
+            self.host,
+            self.port,
+            backlog=SOCKET_ACCEPT_BACKLOG,
+            reuse_address=True
+        )
+        self.running = True
+        
+        logger.info(f"Servidor Socket (asyncio) iniciado en {self.host}:{self.port}")
+        logger.info(f"Handlers concurrentes max: {SOCKET_MAX_CONCURRENT_HANDLERS}, backlog: {SOCKET_ACCEPT_BACKLOG}")
+        
+        async with server:
+            await server.serve_forever()
+    
+    async def handle_client_async(self, reader, writer):
+        address = writer.get_extra_info('peername')
+        
+        # Si se alcanza el limite, la conexion espera aca sin consumir un hilo
+        async with self.handler_slots:
+            try:
+                primer_byte = await asyncio.wait_for(reader.read(1), timeout=SOCKET_READ_TIMEOUT)
+                
+                if not primer_byte:
+                    logger.warning(f"Cliente {address} envio datos vacios")
+                    return
+                
+                if protocol.es_legacy(primer_byte):
+                    await self.handle_legacy_async(reader, writer, address, primer_byte)
+                else:
+                    await self.handle_framed_async(reader, writer, address, primer_byte)
             
-            # Enviar respuesta al cliente
-            client_socket.send(json.dumps(response).encode('utf-8'))
-            logger.info(f"Respuesta enviada a {address}: {response['status']}")
+            except protocol.ProtocolError as e:
+                logger.error(f"Error de protocolo desde {address}: {e}")
             
-        except json.JSONDecodeError:
-            logger.error(f"Error: datos no son JSON valido desde {address}")
-            error_response = {'status': 'error', 'mensaje': 'Formato JSON invalido'}
-            client_socket.send(json.dumps(error_response).encode('utf-8'))
+            except asyncio.TimeoutError:
+                logger.warning(f"Timeout esperando datos de {address}")
+            
+            except Exception as e:
+                logger.error(f"Error manejando cliente {address}: {e}")
+            
+            finally:
+                writer.close()
+                try:
+                    await writer.wait_closed()
+                except Exception:
+                    pass
+    
+    async def handle_legacy_async(self, reader, writer, address, data):
+        while not protocol.legacy_completo(data) and len(data) < SOCKET_MAX_FRAME_SIZE:
+            chunk = await asyncio.wait_for(reader.read(SOCKET_BUFFER_SIZE), timeout=SOCKET_READ_TIMEOUT)
+            if not chunk:
+                break
+            data += chunk
         
-        except Exception as e:
-            logger.error(f"Error manejando cliente {address}: {e}")
+        loop = asyncio.get_running_loop()
+        response = await loop.run_in_executor(
+            self.publish_executor,
+            self.procesar_mensaje,
+            data.decode('utf-8', errors='replace'),
+            address
+        )
         
-        finally:
-            client_socket.close()
+        writer.write(json.dumps(response).encode('utf-8'))
+        await writer.drain()
+        logger.info(f"Respuesta enviada a {address}: {response['status']}")
+    
+    async def handle_framed_async(self, reader, writer, address, primer_byte):
+        # Cada frame se procesa en su propia tarea: las respuestas pueden salir en otro orden.
+        # Con SOCKET_PIPELINE_WINDOW frames sin responder no se lee el siguiente: un cliente
+        # que no respeta la ventana queda frenado por TCP en lugar de llenar el executor
+        write_lock = asyncio.Lock()
+        ventana = asyncio.Semaphore(SOCKET_PIPELINE_WINDOW)
+        en_curso = set()
+        
+        header = primer_byte + await asyncio.wait_for(
+            reader.readexactly(protocol.HEADER_SIZE - 1),
+            timeout=SOCKET_READ_TIMEOUT
+        )
+        
+        while True:
+            largo, request_id = protocol.decode_header(header)
+            payload = await asyncio.wait_for(reader.readexactly(largo), timeout=SOCKET_READ_TIMEOUT)
+            
+            await ventana.acquire()
+            tarea = asyncio.create_task(
+                self.responder_frame(writer, write_lock, payload, request_id, address)
+            )
+            en_curso.add(tarea)
+            tarea.add_done_callback(en_curso.discard)
+            # Se libera cuando la respuesta quedo escrita (o la tarea fallo)
+            tarea.add_done_callback(lambda _: ventana.release())
+            
+            try:
+                header = await asyncio.wait_for(
+                    reader.readexactly(protocol.HEADER_SIZE),
+                    timeout=SOCKET_IDLE_TIMEOUT
+                )
+            except asyncio.IncompleteReadError as e:
+                if e.partial:
+                    logger.warning(f"Cliente {address} cerro la conexion a mitad de un frame")
+                break
+        
+        if en_curso:
+            await asyncio.gather(*en_curso, return_exceptions=True)
+        logger.info(f"Cliente {address} cerro la conexion persistente")
+    
+    async def responder_frame(self, writer, write_lock, payload, request_id, address):
+        loop = asyncio.get_running_loop()
+        response = await loop.run_in_executor(
+            self.publish_executor,
+            self.procesar_mensaje,
+            payload.decode('utf-8', errors='replace'),
+            address
+        )
+        
+        async with write_lock:
+            writer.write(protocol.encode_frame(response, request_id))
+            await writer.drain()
     
-    def prepare_task(self, task_request, address):
+    def prepare_task(self, task_request, address, timestamp=None):
         task = task_request.copy()
-        task['task_id'] = f"{task['tipo']}_{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
-        task['timestamp'] = datetime.now().isoformat()
+        timestamp = timestamp or datetime.now()
+        # Aleatorio: con un timestamp dos servidores (o dos lotes) pueden generar el mismo id
+        task['task_id'] = uuid.uuid4().hex
+        task['timestamp'] = timestamp.isoformat()
         task['client_address'] = str(address)
         return task
     
@@ -139,6 +447,10 @@ class SocketServer:
         self.running = False
         if self.socket:
             self.socket.close()
+        if self.publish_executor:
+            self.publish_executor.shutdown(wait=True)
+            self.publish_executor = None
+        logger.info(f"Metricas de publicacion: {self.rabbitmq.metricas()}")
         self.rabbitmq.close()
         logger.info(f"Servidor en puerto {self.port} detenido")
 
@@ -147,7 +459,8 @@ if __name__ == '__main__':
     import sys
     
     port = int(sys.argv[1]) if len(sys.argv) > 1 else SOCKET_PORT_1
-    server = SocketServer(port)
+    modo = sys.argv[2] if len(sys.argv) > 2 else SOCKET_SERVER_MODE
+    server = SocketServer(port, modo)
     
     try:
         server.start()
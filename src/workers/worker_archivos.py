@@ -1,25 +1,30 @@
-import json
 import logging
 import sys
 import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
-from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from common.rabbitmq_handler import RabbitMQHandler
-from common.database import Database
-from config.settings import QUEUE_ARCHIVOS, WORKER_THREAD_POOL_SIZE
+from decimal import Decimal, ROUND_HALF_UP
+from common.worker_base import WorkerBase
+from common.storage import get_storage
+from common.cache_artefactos import CacheArtefactos
+from common.snapshot_periodo import bloques_periodo
+from common.formatos_bancarios import obtener_formato
+from common.validaciones import validar_cbus, validar_cuils
+from config.settings import QUEUE_ARCHIVOS, WORKER_THREAD_POOL_SIZE, ARCHIVOS_MAX_ERRORES_REPORTE
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+CENTAVO = Decimal('0.01')
 
-class WorkerArchivos:
+
+class WorkerArchivos(WorkerBase):
+    nombre = 'Worker Archivos'
+    
     def __init__(self):
-        self.rabbitmq = RabbitMQHandler()
-        self.db = Database()
-        self.pool_size = WORKER_THREAD_POOL_SIZE['archivos']
-        self.executor = ThreadPoolExecutor(max_workers=self.pool_size)
-        logger.info(f"Worker Archivos iniciado con pool de {self.pool_size} hilos")
+        super().__init__(QUEUE_ARCHIVOS, WORKER_THREAD_POOL_SIZE['archivos'])
+        self.storage = get_storage()
+        self.artefactos = CacheArtefactos(self.db, self.storage)
     
     def process_task(self, task_data):
         try:
@@ -30,7 +35,15 @@ class WorkerArchivos:
             
             logger.info(f"Generando archivo bancario {task_id} - Empresa: {empresa_id}, Banco: {banco}")
             
-            resultado = self.generar_archivo_bancario(empresa_id, periodo, banco)
+            # El header lleva la fecha de proceso: un archivo guardado sirve solo durante el dia
+            fecha_proceso = datetime.now().strftime('%Y%m%d')
+            resultado = self.artefactos.resolver(
+                'archivo_bancario',
+                {'empresa_id': empresa_id, 'periodo': periodo, 'banco': banco, 'fecha_proceso': fecha_proceso},
+                'archivos-bancarios',
+                lambda: self.generar_archivo_bancario(empresa_id, periodo, banco, fecha_proceso),
+                regenerar=task_data.get('regenerar', False)
+            )
             
             logger.info(f"Archivo bancario {task_id} generado exitosamente")
             return resultado
@@ -39,97 +52,143 @@ class WorkerArchivos:
             logger.error(f"Error procesando tarea {task_data.get('task_id')}: {e}")
             return {'estado': 'error', 'mensaje': str(e)}
     
-    def generar_archivo_bancario(self, empresa_id, periodo, banco):
-        # Obtener liquidaciones del periodo
-        query = """
-            SELECT l.id, e.cuil, e.cbu, e.nombre, e.apellido, l.sueldo_neto, emp.cuit
-            FROM liquidaciones l
-            JOIN empleados e ON l.empleado_id = e.id
-            JOIN empresas emp ON l.empresa_id = emp.id
-            WHERE l.empresa_id = %s AND l.periodo = %s AND l.estado = 'completada'
-            ORDER BY e.apellido, e.nombre
-        """
-        liquidaciones = self.db.execute_query(query, (empresa_id, periodo))
+    def generar_archivo_bancario(self, empresa_id, periodo, banco, fecha_proceso=None):
+        empresa = self.referencia.empresa(empresa_id)
+        if not empresa:
+            raise Exception(f"Empresa {empresa_id} no encontrada")
         
-        if not liquidaciones:
-            raise Exception(f"No hay liquidaciones para generar archivo")
+        formato = obtener_formato(banco)
+        fecha_proceso = fecha_proceso or datetime.now().strftime('%Y%m%d')
         
-        # Generar contenido del archivo
-        lineas = []
-        total_registros = 0
-        total_importe = 0
+        # El nombre lleva todo lo que forma la clave de la cache de artefactos: cada entrada
+        # tiene su propio archivo y expulsar la de ayer no borra el archivo de hoy
+        filename = f"pago_{banco}_{empresa_id}_{periodo.replace('-', '')}_{fecha_proceso}.{formato.extension}"
         
-        # Header del archivo
-        empresa_cuit = liquidaciones[0]['cuit']
-        fecha_proceso = datetime.now().strftime('%Y%m%d')
-        
-        header = f"0{empresa_cuit}{fecha_proceso}{periodo.replace('-', '')}"
-        lineas.append(header)
+        # Totales que se acumulan mientras se escriben los registros (para el footer)
+        resumen = {'total_registros': 0, 'total_importe': Decimal(0), 'rechazados': [], 'observaciones': [],
+                   'total_rechazados': 0, 'total_observaciones': 0}
+        preview = []
         
-        # Registros de empleados
-        for liq in liquidaciones:
-            total_registros += 1
-            total_importe += float(liq['sueldo_neto'])
-            
-            # Formato: CUIL|CBU|APELLIDO|NOMBRE|IMPORTE
-            cbu = liq['cbu'] or '0' * 22
-            linea = f"1{liq['cuil']}{cbu}{liq['apellido'][:20]:20}{liq['nombre'][:20]:20}{int(liq['sueldo_neto'] * 100):015d}"
-            lineas.append(linea)
-        
-        # Footer del archivo
-        footer = f"9{total_registros:08d}{int(total_importe * 100):018d}"
-        lineas.append(footer)
+        # Escritura incremental al storage; el archivo se publica recien al terminar
+        with self.storage.escritor('archivos-bancarios', filename) as sink:
+            for bloque in self.bloques_archivo(formato, empresa, periodo, fecha_proceso, resumen):
+                faltan = 5 - len(preview)
+                if faltan > 0:
+                    preview.extend(bloque.removeprefix(formato.separador).split(formato.separador, faltan)[:faltan])
+                sink.write(bloque.encode(formato.encoding))
+        archivo = sink.resultado
         
-        # Generar nombre de archivo
-        filename = f"pago_{banco}_{empresa_id}_{periodo.replace('-', '')}.txt"
-        s3_path = f"s3://archivos-bancarios/{filename}"
-        
-        # Simular guardado del archivo
-        contenido = "\n".join(lineas)
+        total_registros = resumen['total_registros']
+        total_importe = resumen['total_importe']
         
         logger.info(f"Archivo generado: {filename} - {total_registros} registros, Total: ${total_importe:.2f}")
+        if resumen['total_rechazados'] or resumen['total_observaciones']:
+            logger.warning(
+                f"Archivo {filename}: {resumen['total_rechazados']} liquidaciones rechazadas por CBU invalido, "
+                f"{resumen['total_observaciones']} con CUIL invalido"
+            )
         
         return {
             'estado': 'completada',
             'tipo': 'archivo_bancario',
             'archivo': filename,
-            's3_path': s3_path,
+            'ruta': archivo['url'],
+            'sha256': archivo['sha256'],
+            'bytes': archivo['bytes'],
             'banco': banco,
+            'formato': formato.nombre,
             'resumen': {
                 'total_registros': total_registros,
                 'total_importe': float(total_importe),
                 'periodo': periodo
             },
-            'contenido_preview': lineas[:5]
+            'validacion': {
+                'total_rechazados': resumen['total_rechazados'],
+                'total_observaciones': resumen['total_observaciones'],
+                'rechazados': resumen['rechazados'],
+                'observaciones': resumen['observaciones']
+            },
+            'contenido_preview': preview
         }
     
-    def callback(self, ch, method, properties, body):
-        try:
-            task_data = json.loads(body)
-            logger.info(f"Tarea recibida: {task_data.get('task_id')}")
-            
-            # Procesar en el pool de hilos
-            future = self.executor.submit(self.process_task, task_data)
-            resultado = future.result()
-            
-            # Confirmar procesamiento
-            ch.basic_ack(delivery_tag=method.delivery_tag)
-            logger.info(f"Tarea confirmada: {task_data.get('task_id')}")
-            
-        except Exception as e:
-            logger.error(f"Error en callback: {e}")
-            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+    def bloques_archivo(self, formato, empresa, periodo, fecha_proceso, resumen):
+        """Genera el archivo por bloques ya formateados (header, un bloque por chunk del cursor, footer)"""
+        # Header del archivo
+        yield formato.header.codificar({
+            'empresa_id': empresa['id'],
+            'cuit': empresa['cuit'],
+            'razon_social': empresa['razon_social'],
+            'fecha_proceso': fecha_proceso,
+            'periodo': periodo.replace('-', '')
+        })
+        
+        # Obtener liquidaciones del periodo por bloques (cursor del servidor)
+        query = """
+            SELECT l.id, e.cuil, e.cbu, e.nombre, e.apellido, l.sueldo_neto
+            FROM liquidaciones l
+            JOIN empleados e ON l.empleado_id = e.id
+            WHERE l.empresa_id = %s AND l.periodo = %s AND l.estado = 'completada'
+            ORDER BY e.apellido, e.nombre
+        """
+        liquidaciones = 0
+        # Con el periodo cerrado las filas salen del snapshot, en el mismo orden
+        filas = bloques_periodo(
+            self.db, self.artefactos, self.storage, empresa['id'], periodo,
+            query, (empresa['id'], periodo), estado='completada', orden='orden_nombre'
+        )
+        for bloque in filas:
+            liquidaciones += len(bloque)
+            validas = self.validar_bloque(bloque, resumen)
+            if not validas:
+                continue
+            resumen['total_registros'] += len(validas)
+            # En Decimal y por centavos: el total de control tiene que coincidir con la suma del detalle
+            for liq in validas:
+                resumen['total_importe'] += Decimal(str(liq['sueldo_neto'])).quantize(CENTAVO, ROUND_HALF_UP)
+            yield formato.separador + formato.detalle.codificar_lote(validas, formato.separador)
+        
+        if not liquidaciones:
+            raise Exception(f"No hay liquidaciones para generar archivo")
+        if not resumen['total_registros']:
+            raise Exception(f"Ninguna de las {liquidaciones} liquidaciones tiene CBU valido")
+        
+        # Footer del archivo
+        yield formato.separador + formato.footer.codificar(resumen)
     
-    def start(self):
-        logger.info(f"Iniciando consumo de cola '{QUEUE_ARCHIVOS}'...")
-        self.rabbitmq.consume_tasks(QUEUE_ARCHIVOS, self.callback)
+    def validar_bloque(self, bloque, resumen):
+        """Valida CBU y CUIL del bloque entero; un CBU invalido excluye la fila, un CUIL invalido se informa"""
+        cbus = validar_cbus([liq['cbu'] for liq in bloque])
+        cuils = validar_cuils([liq['cuil'] for liq in bloque])
+        
+        if not cbus.total_invalidos and not cuils.total_invalidos:
+            for liq, cbu in zip(bloque, cbus.normalizados):
+                liq['cbu'] = cbu
+            return bloque
+        
+        validas = []
+        for liq, cbu, error_cbu, error_cuil in zip(bloque, cbus.normalizados, cbus.errores, cuils.errores):
+            if error_cuil is not None:
+                self.registrar_error(resumen, 'observaciones', liq, 'cuil', error_cuil)
+            if error_cbu is not None:
+                self.registrar_error(resumen, 'rechazados', liq, 'cbu', error_cbu)
+                continue
+            liq['cbu'] = cbu
+            validas.append(liq)
+        return validas
     
-    def stop(self):
-        self.executor.shutdown(wait=True)
-        self.rabbitmq.close()
-        self.db.close()
-        logger.info("Worker Archivos detenido")
-
+    def registrar_error(self, resumen, tipo, liq, campo, error):
+        resumen[f"total_{tipo}"] += 1
+        # El detalle se acota para que el resultado no crezca con archivos enormes
+        if len(resumen[tipo]) < ARCHIVOS_MAX_ERRORES_REPORTE:
+            resumen[tipo].append({
+                'liquidacion_id': liq['id'],
+                'cuil': liq['cuil'],
+                'apellido': liq['apellido'],
+                'nombre': liq['nombre'],
+                'campo': campo,
+                'valor': liq[campo],
+                'error': error
+            })
 
 if __name__ == '__main__':
     worker = WorkerArchivos()
@@ -1,25 +1,128 @@
-import json
 import logging
 import sys
 import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
-from concurrent.futures import ThreadPoolExecutor
-from datetime import datetime
-from common.rabbitmq_handler import RabbitMQHandler
-from common.database import Database
+from decimal import Decimal
+import json
+from common.worker_base import WorkerBase
+from common.storage import get_storage
+from common.cache_artefactos import CacheArtefactos
+from common.resumen_liquidaciones import totales_periodo
+from common.snapshot_periodo import bloques_periodo
 from config.settings import QUEUE_CARGAS, WORKER_THREAD_POOL_SIZE
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Contribuciones patronales de la DDJJ AFIP sobre el total remunerativo
+ALICUOTAS_AFIP = {
+    'jubilacion': 0.1062,
+    'obra_social': 0.06,
+    'pami': 0.02,
+    'asignaciones_familiares': 0.0449,
+    'fondo_nacional_empleo': 0.0089,
+    'art': 0.03
+}
+
+# Aportes a la obra social (empleado y empleador)
+APORTE_OS_EMPLEADO = 0.03
+APORTE_OS_EMPLEADOR = 0.06
+
+
+def archivo_ddjj_afip(empresa_id, periodo, total_empleados, total_remunerativo, total_cargas):
+    """Desglose de cargas patronales y contenido del archivo de la DDJJ"""
+    cargas_detalle = {concepto: total_remunerativo * alicuota for concepto, alicuota in ALICUOTAS_AFIP.items()}
+    # Formato: una linea de cabecera y una por concepto (CONCEPTO|IMPORTE)
+    lineas = [f"DDJJ|{empresa_id}|{periodo}|{total_empleados}|{total_remunerativo:.2f}|{total_cargas:.2f}"]
+    lineas.extend(f"{concepto}|{importe:.2f}" for concepto, importe in cargas_detalle.items())
+    return cargas_detalle, "\n".join(lineas)
 
-class WorkerCargas:
+
+class AcumuladorAfip:
+    """Totales de las liquidaciones completadas para la DDJJ"""
+    
     def __init__(self):
-        self.rabbitmq = RabbitMQHandler()
-        self.db = Database()
-        self.pool_size = WORKER_THREAD_POOL_SIZE['cargas']
-        self.executor = ThreadPoolExecutor(max_workers=self.pool_size)
-        logger.info(f"Worker Cargas iniciado con pool de {self.pool_size} hilos")
+        self.total_empleados = 0
+        self.total_remunerativo = Decimal(0)
+        self.total_cargas = Decimal(0)
+    
+    def agregar(self, fila):
+        if fila['estado'] != 'completada':
+            return
+        self.total_empleados += 1
+        self.total_remunerativo += fila['sueldo_bruto'] or 0
+        self.total_cargas += fila['cargas_sociales'] or 0
+
+
+class EscritorObraSocial:
+    """Una linea por empleado con liquidacion completada, escrita por bloques"""
+    
+    def __init__(self, escritor):
+        self.escritor = escritor
+        self.lineas = []
+        self.registros = []
+        self.total_empleados = 0
+        self.total_aporte_empleado = 0
+        self.total_aporte_empleador = 0
+    
+    def agregar(self, fila):
+        if fila['estado'] != 'completada':
+            return
+        bruto = float(fila['sueldo_bruto'])
+        aporte_empleado = bruto * APORTE_OS_EMPLEADO
+        aporte_empleador = bruto * APORTE_OS_EMPLEADOR
+        
+        self.total_empleados += 1
+        self.total_aporte_empleado += aporte_empleado
+        self.total_aporte_empleador += aporte_empleador
+        
+        # Formato: CUIL|APELLIDO, NOMBRE|REMUNERACION|APORTE EMPLEADO|APORTE EMPLEADOR
+        self.lineas.append(
+            f"{fila['cuil']}|{fila['apellido']}, {fila['nombre']}|{bruto:.2f}|{aporte_empleado:.2f}|{aporte_empleador:.2f}\n"
+        )
+        if len(self.registros) < 5:
+            self.registros.append({
+                'cuil': fila['cuil'],
+                'nombre_completo': f"{fila['apellido']}, {fila['nombre']}",
+                'remuneracion': bruto,
+                'aporte_empleado': aporte_empleado,
+                'aporte_empleador': aporte_empleador
+            })
+    
+    def fin_bloque(self):
+        self.escritor.write("".join(self.lineas))
+        self.lineas = []
+    
+    def resumen(self):
+        return {
+            'total_empleados': self.total_empleados,
+            'total_aporte_empleado': self.total_aporte_empleado,
+            'total_aporte_empleador': self.total_aporte_empleador,
+            'total_general': self.total_aporte_empleado + self.total_aporte_empleador
+        }
+
+
+class AcumuladorSindical:
+    """Totales del reporte sindical: todas las liquidaciones del periodo, sin filtrar estado"""
+    
+    def __init__(self):
+        self.total_empleados = 0
+        self.total_bruto = Decimal(0)
+        self.total_cargas = Decimal(0)
+    
+    def agregar(self, fila):
+        self.total_empleados += 1
+        self.total_bruto += fila['sueldo_bruto'] or 0
+        self.total_cargas += fila['cargas_sociales'] or 0
+
+
+class WorkerCargas(WorkerBase):
+    nombre = 'Worker Cargas'
+    
+    def __init__(self):
+        super().__init__(QUEUE_CARGAS, WORKER_THREAD_POOL_SIZE['cargas'])
+        self.storage = get_storage()
+        self.artefactos = CacheArtefactos(self.db, self.storage)
     
     def process_task(self, task_data):
         try:
@@ -31,12 +134,22 @@ class WorkerCargas:
             logger.info(f"Calculando cargas sociales {task_id} - Empresa: {empresa_id}, Tipo: {tipo_carga}")
             
             if tipo_carga == 'afip':
-                resultado = self.calcular_cargas_afip(empresa_id, periodo)
+                generar = lambda: self.calcular_cargas_afip(empresa_id, periodo)
             elif tipo_carga == 'obra_social':
-                resultado = self.calcular_obra_social(empresa_id, periodo)
+                generar = lambda: self.calcular_obra_social(empresa_id, periodo)
+            elif tipo_carga == 'periodo':
+                generar = lambda: self.cargas_periodo(empresa_id, periodo)
             else:
                 raise Exception(f"Tipo de carga no valido: {tipo_carga}")
             
+            resultado = self.artefactos.resolver(
+                'carga_social',
+                {'empresa_id': empresa_id, 'periodo': periodo, 'tipo_carga': tipo_carga},
+                'cargas-sociales',
+                generar,
+                regenerar=task_data.get('regenerar', False)
+            )
+            
             logger.info(f"Cargas sociales {task_id} calculadas exitosamente")
             return resultado
             
@@ -45,35 +158,20 @@ class WorkerCargas:
             return {'estado': 'error', 'mensaje': str(e)}
     
     def calcular_cargas_afip(self, empresa_id, periodo):
-        # Obtener liquidaciones del periodo
-        query = """
-            SELECT COUNT(*) as total_empleados,
-                   SUM(sueldo_bruto) as total_remunerativo,
-                   SUM(cargas_sociales) as total_cargas
-            FROM liquidaciones
-            WHERE empresa_id = %s AND periodo = %s AND estado = 'completada'
-        """
-        resultado = self.db.execute_query(query, (empresa_id, periodo))
+        # Totales del periodo desde el resumen mantenido por triggers
+        data = totales_periodo(self.db, empresa_id, periodo, estado='completada')
         
-        if not resultado or not resultado[0]['total_empleados']:
+        if not data or not data['cantidad']:
             raise Exception("No hay liquidaciones para calcular cargas")
         
-        data = resultado[0]
-        total_remunerativo = float(data['total_remunerativo'] or 0)
-        total_cargas = float(data['total_cargas'] or 0)
+        total_remunerativo = float(data['total_bruto'])
+        total_cargas = float(data['total_cargas'])
         
         # Desglose de cargas patronales
-        cargas_detalle = {
-            'jubilacion': total_remunerativo * 0.1062,
-            'obra_social': total_remunerativo * 0.06,
-            'pami': total_remunerativo * 0.02,
-            'asignaciones_familiares': total_remunerativo * 0.0449,
-            'fondo_nacional_empleo': total_remunerativo * 0.0089,
-            'art': total_remunerativo * 0.03
-        }
+        cargas_detalle, contenido = archivo_ddjj_afip(empresa_id, periodo, data['cantidad'], total_remunerativo, total_cargas)
         
         filename = f"ddjj_afip_{empresa_id}_{periodo.replace('-', '')}.txt"
-        s3_path = f"s3://cargas-sociales/{filename}"
+        archivo = self.storage.guardar('cargas-sociales', filename, contenido)
         
         logger.info(f"Declaracion jurada AFIP generada: {filename}")
         
@@ -81,10 +179,11 @@ class WorkerCargas:
             'estado': 'completada',
             'tipo': 'cargas_afip',
             'archivo': filename,
-            's3_path': s3_path,
+            'ruta': archivo['url'],
+            'bytes': archivo['bytes'],
             'periodo': periodo,
             'resumen': {
-                'total_empleados': data['total_empleados'],
+                'total_empleados': data['cantidad'],
                 'total_remunerativo': total_remunerativo,
                 'total_cargas_patronales': total_cargas,
                 'desglose': cargas_detalle
@@ -92,40 +191,27 @@ class WorkerCargas:
         }
     
     def calcular_obra_social(self, empresa_id, periodo):
-        # Obtener detalle por empleado
+        # Detalle por empleado leido por bloques y escrito a medida que se calcula
         query = """
-            SELECT e.cuil, e.nombre, e.apellido, l.sueldo_bruto
+            SELECT l.estado, e.cuil, e.nombre, e.apellido, l.sueldo_bruto
             FROM liquidaciones l
             JOIN empleados e ON l.empleado_id = e.id
             WHERE l.empresa_id = %s AND l.periodo = %s AND l.estado = 'completada'
         """
-        empleados = self.db.execute_query(query, (empresa_id, periodo))
         
-        if not empleados:
-            raise Exception("No hay datos para calcular obra social")
-        
-        registros = []
-        total_aporte_empleado = 0
-        total_aporte_empleador = 0
+        filename = f"obra_social_{empresa_id}_{periodo.replace('-', '')}.txt"
         
-        for emp in empleados:
-            bruto = float(emp['sueldo_bruto'])
-            aporte_empleado = bruto * 0.03
-            aporte_empleador = bruto * 0.06
+        with self.storage.escritor('cargas-sociales', filename) as escritor:
+            obra_social = EscritorObraSocial(escritor)
+            filas = bloques_periodo(self.db, self.artefactos, self.storage, empresa_id, periodo,
+                                    query, (empresa_id, periodo), estado='completada')
+            for bloque in filas:
+                for emp in bloque:
+                    obra_social.agregar(emp)
+                obra_social.fin_bloque()
             
-            total_aporte_empleado += aporte_empleado
-            total_aporte_empleador += aporte_empleador
-            
-            registros.append({
-                'cuil': emp['cuil'],
-                'nombre_completo': f"{emp['apellido']}, {emp['nombre']}",
-                'remuneracion': bruto,
-                'aporte_empleado': aporte_empleado,
-                'aporte_empleador': aporte_empleador
-            })
-        
-        filename = f"obra_social_{empresa_id}_{periodo.replace('-', '')}.txt"
-        s3_path = f"s3://cargas-sociales/{filename}"
+            if not obra_social.total_empleados:
+                raise Exception("No hay datos para calcular obra social")
         
         logger.info(f"Archivo obra social generado: {filename}")
         
@@ -133,43 +219,89 @@ class WorkerCargas:
             'estado': 'completada',
             'tipo': 'obra_social',
             'archivo': filename,
-            's3_path': s3_path,
+            'ruta': escritor.resultado['url'],
+            'bytes': escritor.resultado['bytes'],
             'periodo': periodo,
-            'resumen': {
-                'total_empleados': len(registros),
-                'total_aporte_empleado': total_aporte_empleado,
-                'total_aporte_empleador': total_aporte_empleador,
-                'total_general': total_aporte_empleado + total_aporte_empleador
-            },
-            'registros_preview': registros[:5]
+            'resumen': obra_social.resumen(),
+            'registros_preview': obra_social.registros
         }
     
-    def callback(self, ch, method, properties, body):
-        try:
-            task_data = json.loads(body)
-            logger.info(f"Tarea recibida: {task_data.get('task_id')}")
-            
-            # Procesar en el pool de hilos
-            future = self.executor.submit(self.process_task, task_data)
-            resultado = future.result()
-            
-            # Confirmar procesamiento
-            ch.basic_ack(delivery_tag=method.delivery_tag)
-            logger.info(f"Tarea confirmada: {task_data.get('task_id')}")
+    def cargas_periodo(self, empresa_id, periodo):
+        """
+        DDJJ AFIP, archivo de obra social y totales sindicales en una sola
+        lectura de las liquidaciones del periodo. Cada fila pasa por los tres
+        acumuladores; los tres salen de la misma consulta, asi que son
+        consistentes entre si aunque haya escrituras concurrentes.
+        """
+        query = """
+            SELECT l.estado, l.sueldo_bruto, l.cargas_sociales, e.cuil, e.nombre, e.apellido
+            FROM liquidaciones l
+            JOIN empleados e ON l.empleado_id = e.id
+            WHERE l.empresa_id = %s AND l.periodo = %s
+        """
+        
+        # Prefijo propio: los archivos de 'afip' y 'obra_social' son otras entradas de la cache
+        # y expulsar una no puede borrar un archivo que la otra sigue usando
+        sufijo = f"{empresa_id}_{periodo.replace('-', '')}"
+        archivo_os = f"cargas_periodo_obra_social_{sufijo}.txt"
+        archivo_afip = f"cargas_periodo_ddjj_afip_{sufijo}.txt"
+        archivo_sindical = f"cargas_periodo_sindical_{sufijo}.json"
+        
+        afip = AcumuladorAfip()
+        sindical = AcumuladorSindical()
+        
+        with self.storage.escritor('cargas-sociales', archivo_os) as escritor:
+            obra_social = EscritorObraSocial(escritor)
+            filas = bloques_periodo(self.db, self.artefactos, self.storage, empresa_id, periodo, query, (empresa_id, periodo))
+            for bloque in filas:
+                for fila in bloque:
+                    afip.agregar(fila)
+                    obra_social.agregar(fila)
+                    sindical.agregar(fila)
+                obra_social.fin_bloque()
             
-        except Exception as e:
-            logger.error(f"Error en callback: {e}")
-            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
-    
-    def start(self):
-        logger.info(f"Iniciando consumo de cola '{QUEUE_CARGAS}'...")
-        self.rabbitmq.consume_tasks(QUEUE_CARGAS, self.callback)
-    
-    def stop(self):
-        self.executor.shutdown(wait=True)
-        self.rabbitmq.close()
-        self.db.close()
-        logger.info("Worker Cargas detenido")
+            if not afip.total_empleados:
+                raise Exception("No hay liquidaciones para calcular cargas")
+        
+        total_remunerativo = float(afip.total_remunerativo)
+        total_cargas = float(afip.total_cargas)
+        cargas_detalle, contenido = archivo_ddjj_afip(empresa_id, periodo, afip.total_empleados, total_remunerativo, total_cargas)
+        ddjj = self.storage.guardar('cargas-sociales', archivo_afip, contenido)
+        
+        resumen_sindical = {
+            'total_empleados': sindical.total_empleados,
+            'total_bruto': float(sindical.total_bruto),
+            'total_cargas': float(sindical.total_cargas),
+            'periodo': periodo
+        }
+        reporte = self.storage.guardar('cargas-sociales', archivo_sindical, json.dumps(dict(resumen_sindical, empresa_id=empresa_id)))
+        
+        logger.info(f"Cargas del periodo generadas: {archivo_afip}, {archivo_os}, {archivo_sindical}")
+        
+        return {
+            'estado': 'completada',
+            'tipo': 'cargas_periodo',
+            'archivo': archivo_afip,
+            'ruta': ddjj['url'],
+            'bytes': ddjj['bytes'] + escritor.resultado['bytes'] + reporte['bytes'],
+            'periodo': periodo,
+            'archivos': {
+                'afip': {'archivo': archivo_afip, 'ruta': ddjj['url'], 'bytes': ddjj['bytes']},
+                'obra_social': {'archivo': archivo_os, 'ruta': escritor.resultado['url'], 'bytes': escritor.resultado['bytes']},
+                'sindical': {'archivo': archivo_sindical, 'ruta': reporte['url'], 'bytes': reporte['bytes']}
+            },
+            'resumen': {
+                'afip': {
+                    'total_empleados': afip.total_empleados,
+                    'total_remunerativo': total_remunerativo,
+                    'total_cargas_patronales': total_cargas,
+                    'desglose': cargas_detalle
+                },
+                'obra_social': obra_social.resumen(),
+                'sindical': resumen_sindical
+            },
+            'registros_preview': obra_social.registros
+        }
 
 
 if __name__ == '__main__':
@@ -1,26 +1,161 @@
 import json
 import logging
+import functools
 import sys
 import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
-from concurrent.futures import ThreadPoolExecutor
-from common.rabbitmq_handler import RabbitMQHandler
-from common.database import Database
-from config.settings import QUEUE_LIQUIDACION, WORKER_THREAD_POOL_SIZE
+import psycopg2
+from common.worker_base import WorkerBase, error_transitorio
+from common import motor_liquidacion
+from common import snapshot_periodo
+from common.storage import get_storage
+from common.cache_artefactos import CacheArtefactos
+from common.reglas import CatalogoReglas
+from config.settings import (
+    QUEUE_LIQUIDACION,
+    WORKER_THREAD_POOL_SIZE,
+    LIQUIDACION_BATCH_SIZE,
+    LIQUIDACION_BATCH_MS,
+    LIQUIDACION_EMPRESA_PAGE_SIZE
+)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-class WorkerLiquidacion:
+class WorkerLiquidacion(WorkerBase):
+    nombre = 'Worker Liquidacion'
+    
     def __init__(self):
-        self.rabbitmq = RabbitMQHandler()
-        self.db = Database()
-        self.pool_size = WORKER_THREAD_POOL_SIZE['liquidacion']
-        self.executor = ThreadPoolExecutor(max_workers=self.pool_size)
-        logger.info(f"Worker Liquidacion iniciado con pool de {self.pool_size} hilos")
+        super().__init__(QUEUE_LIQUIDACION, WORKER_THREAD_POOL_SIZE['liquidacion'])
+        
+        # Planes de calculo por convenio, compilados una vez por worker
+        self.reglas = CatalogoReglas(self.db)
+        
+        # Snapshots de periodos cerrados (tarea cierre_periodo)
+        self.storage = get_storage()
+        self.artefactos = CacheArtefactos(self.db, self.storage)
+        
+        # Micro-batching: los mensajes se juntan en el hilo de la conexion
+        self.batch_size = LIQUIDACION_BATCH_SIZE
+        self.batch_ms = LIQUIDACION_BATCH_MS
+        self.pendientes = []
+        self.timer = None
+        self.canal = None
+        if self.batch_size > 1:
+            # Suficientes mensajes sin confirmar para llenar un lote por hilo
+            self.prefetch_count = min(65535, self.batch_size * self.pool_size)
+    
+    def callback(self, ch, method, properties, body):
+        if self.batch_size <= 1:
+            return super().callback(ch, method, properties, body)
+        
+        try:
+            task_data = json.loads(body)
+        except json.JSONDecodeError as e:
+            logger.error(f"Mensaje invalido descartado: {e}")
+            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+            return
+        
+        if task_data.get('tipo') in ('liquidacion_empresa', 'cierre_periodo'):
+            # Ya es un lote en si mismo: va directo al pool
+            return super().callback(ch, method, properties, body)
+        
+        self.canal = ch
+        self.pendientes.append((method.delivery_tag, task_data))
+        
+        if len(self.pendientes) >= self.batch_size:
+            self.flush_lote()
+        elif self.timer is None:
+            self.timer = self.rabbitmq.connection.call_later(self.batch_ms / 1000, self.on_timer)
+    
+    def on_timer(self):
+        self.timer = None
+        self.flush_lote()
+    
+    def flush_lote(self):
+        # Corre en el hilo de la conexion: entrega el lote acumulado al pool
+        if self.timer is not None:
+            self.rabbitmq.connection.remove_timeout(self.timer)
+            self.timer = None
+        if not self.pendientes:
+            return
+        
+        entregas, self.pendientes = self.pendientes, []
+        future = self.executor.submit(self.process_batch, [task for _, task in entregas])
+        future.add_done_callback(functools.partial(self.on_batch_done, self.canal, entregas))
+    
+    def process_batch(self, tareas):
+        """Liquida un lote completo: una query de empleados y un INSERT multi-fila en una transaccion"""
+        logger.info(f"Procesando lote de {len(tareas)} liquidaciones")
+        
+        empleados = self.get_empleados([task.get('empleado_id') for task in tareas])
+        
+        resultados = [None] * len(tareas)
+        filas = []
+        posiciones = []
+        
+        for i, task_data in enumerate(tareas):
+            empleado = empleados.get(self.normalizar_id(task_data.get('empleado_id')))
+            if not empleado:
+                logger.error(f"Error procesando tarea {task_data.get('task_id')}: Empleado {task_data.get('empleado_id')} no encontrado")
+                resultados[i] = {'estado': 'error', 'mensaje': f"Empleado {task_data.get('empleado_id')} no encontrado"}
+                continue
+            
+            try:
+                sueldo_bruto, deducciones, sueldo_neto, cargas_sociales = self.calcular(
+                    task_data.get('conceptos', []), empleado.get('convenio_id')
+                )
+            except Exception as e:
+                # Conceptos mal formados (monto no numerico...): falla solo esta tarea
+                logger.error(f"Error procesando tarea {task_data.get('task_id')}: {e}")
+                resultados[i] = {'estado': 'error', 'mensaje': str(e)}
+                continue
+            
+            filas.append((
+                task_data.get('empresa_id'), empleado['id'], task_data.get('periodo'), 'completada',
+                sueldo_bruto, sueldo_neto, cargas_sociales,
+                task_data.get('procesado_por', 'sistema')
+            ))
+            posiciones.append(i)
+            resultados[i] = {
+                'empleado': f"{empleado['nombre']} {empleado['apellido']}",
+                'sueldo_bruto': float(sueldo_bruto),
+                'deducciones': float(deducciones),
+                'sueldo_neto': float(sueldo_neto),
+                'cargas_sociales': float(cargas_sociales),
+                'estado': 'completada'
+            }
+        
+        guardadas = 0
+        if filas:
+            try:
+                with self.db.transaccion():
+                    insertadas = [(fila['id'], None) for fila in self.guardar_liquidaciones(filas)]
+            except psycopg2.Error as e:
+                # Con la base caida se propaga y el lote vuelve a la cola; si no, alguna fila es invalida
+                if error_transitorio(e):
+                    raise
+                logger.warning(f"Lote rechazado por la base ({str(e).strip()}), reintentando fila por fila")
+                insertadas = self.guardar_por_fila(filas)
+            
+            for i, (liquidacion_id, error) in zip(posiciones, insertadas):
+                if error:
+                    logger.error(f"Error procesando tarea {tareas[i].get('task_id')}: {error}")
+                    resultados[i] = {'estado': 'error', 'mensaje': error}
+                else:
+                    resultados[i]['liquidacion_id'] = liquidacion_id
+                    guardadas += 1
+        
+        logger.info(f"Lote procesado: {guardadas}/{len(tareas)} liquidaciones guardadas")
+        return resultados
     
     def process_task(self, task_data):
+        if task_data.get('tipo') == 'liquidacion_empresa':
+            return self.liquidar_empresa(task_data)
+        if task_data.get('tipo') == 'cierre_periodo':
+            return self.cerrar_periodo(task_data)
+        
         try:
             task_id = task_data.get('task_id')
             empresa_id = task_data.get('empresa_id')
@@ -36,10 +171,7 @@ class WorkerLiquidacion:
                 raise Exception(f"Empleado {empleado_id} no encontrado")
             
             # Calcular liquidacion
-            sueldo_bruto = self.calcular_bruto(conceptos)
-            deducciones = self.calcular_deducciones(sueldo_bruto)
-            sueldo_neto = sueldo_bruto - deducciones
-            cargas_sociales = self.calcular_cargas_sociales(sueldo_bruto)
+            sueldo_bruto, deducciones, sueldo_neto, cargas_sociales = self.calcular(conceptos, empleado.get('convenio_id'))
             
             # Guardar en BD
             liquidacion_id = self.guardar_liquidacion(
@@ -65,27 +197,125 @@ class WorkerLiquidacion:
             logger.error(f"Error procesando tarea {task_data.get('task_id')}: {e}")
             return {'estado': 'error', 'mensaje': str(e)}
     
+    def liquidar_empresa(self, task_data):
+        """Liquida un periodo completo de una empresa con el motor vectorizado"""
+        try:
+            task_id = task_data.get('task_id')
+            empresa_id = task_data.get('empresa_id')
+            periodo = task_data.get('periodo')
+            procesado_por = task_data.get('procesado_por', 'sistema')
+            
+            logger.info(f"Procesando liquidacion de empresa {task_id} - Empresa: {empresa_id}, Periodo: {periodo}")
+            
+            empleados = self.get_empleados_empresa(empresa_id)
+            
+            # Novedades por empleado, o los mismos conceptos para todos los activos
+            if task_data.get('novedades') is not None:
+                novedades_tarea = [
+                    (self.normalizar_id(n.get('empleado_id')), n.get('conceptos', []))
+                    for n in task_data['novedades']
+                ]
+            else:
+                conceptos = task_data.get('conceptos', [])
+                novedades_tarea = [(empleado_id, conceptos) for empleado_id in empleados]
+            
+            novedades = []
+            rechazados = []
+            for empleado_id, conceptos in novedades_tarea:
+                if empleado_id in empleados:
+                    novedades.append((empleado_id, conceptos))
+                else:
+                    rechazados.append({'empleado_id': empleado_id, 'mensaje': 'Empleado no encontrado en la empresa'})
+            
+            if not novedades:
+                raise Exception(f"No hay empleados para liquidar en la empresa {empresa_id}")
+            
+            planes = [self.reglas.plan(empleados[empleado_id]['convenio_id']) for empleado_id, _ in novedades]
+            resultado_periodo = motor_liquidacion.liquidar_periodo(novedades, planes)
+            
+            filas = [
+                (empresa_id, empleado_id, periodo, 'completada', bruto, neto, cargas, procesado_por)
+                for empleado_id, bruto, _, neto, cargas in resultado_periodo.filas()
+            ]
+            with self.db.transaccion():
+                self.guardar_liquidaciones(filas, page_size=LIQUIDACION_EMPRESA_PAGE_SIZE)
+            
+            resumen = resultado_periodo.totales()
+            resumen['periodo'] = periodo
+            
+            logger.info(f"Liquidacion de empresa {task_id} procesada - {len(filas)} empleados, Neto total: ${resumen['total_neto']:.2f}")
+            
+            resultado = {
+                'estado': 'completada',
+                'tipo': 'liquidacion_empresa',
+                'resumen': resumen,
+                'rechazados': rechazados
+            }
+            if task_data.get('cerrar_periodo'):
+                resultado['cierre'] = self.cerrar_periodo(task_data)
+            return resultado
+            
+        except Exception as e:
+            logger.error(f"Error procesando tarea {task_data.get('task_id')}: {e}")
+            return {'estado': 'error', 'mensaje': str(e)}
+    
+    def cerrar_periodo(self, task_data):
+        """
+        Cierre del periodo: materializa las liquidaciones de la empresa en un
+        snapshot columnar que archivos, cargas y reportes leen por mmap en lugar
+        de volver a consultar la base. Se registra en la cache de artefactos, asi
+        que cualquier escritura posterior en el periodo lo deja sin efecto.
+        """
+        try:
+            empresa_id = task_data.get('empresa_id')
+            periodo = task_data.get('periodo')
+            
+            logger.info(f"Cerrando periodo {periodo} de la empresa {empresa_id}")
+            
+            return self.artefactos.resolver(
+                snapshot_periodo.TIPO,
+                {'empresa_id': empresa_id, 'periodo': periodo},
+                snapshot_periodo.CONTENEDOR,
+                lambda: snapshot_periodo.escribir_snapshot(self.db, self.storage, empresa_id, periodo),
+                regenerar=task_data.get('regenerar', False)
+            )
+            
+        except Exception as e:
+            logger.error(f"Error cerrando periodo {task_data.get('task_id')}: {e}")
+            return {'estado': 'error', 'mensaje': str(e)}
+    
+    def get_empleados_empresa(self, empresa_id):
+        return self.referencia.empleados_empresa(empresa_id)
+    
     def get_empleado(self, empleado_id):
-        query = "SELECT * FROM empleados WHERE id = %s"
-        result = self.db.execute_query(query, (empleado_id,))
-        return result[0] if result else None
-    
-    def calcular_bruto(self, conceptos):
-        total = 0
-        for concepto in conceptos:
-            if concepto.get('tipo') == 'remunerativo':
-                total += concepto.get('monto', 0)
-        return total
-    
-    def calcular_deducciones(self, sueldo_bruto):
-        jubilacion = sueldo_bruto * 0.11
-        ley19032 = sueldo_bruto * 0.03
-        obra_social = sueldo_bruto * 0.03
-        return jubilacion + ley19032 + obra_social
-    
-    def calcular_cargas_sociales(self, sueldo_bruto):
-        # Simplificado: 23% aproximado de cargas patronales
-        return sueldo_bruto * 0.23
+        empleado_id = self.normalizar_id(empleado_id)
+        return self.referencia.empleado(empleado_id) if empleado_id is not None else None
+    
+    @staticmethod
+    def normalizar_id(valor):
+        try:
+            return int(valor)
+        except (TypeError, ValueError):
+            return None
+    
+    def get_empleados(self, empleado_ids):
+        ids = sorted({i for i in map(self.normalizar_id, empleado_ids) if i is not None})
+        if not ids:
+            return {}
+        return self.referencia.empleados_por_id(ids)
+    
+    def calcular(self, conceptos, convenio_id=None):
+        # Ejecuta el plan compilado del convenio (tasas y orden salen de la tabla conceptos)
+        return self.reglas.plan(convenio_id).ejecutar(conceptos)
+    
+    def calcular_bruto(self, conceptos, convenio_id=None):
+        return self.reglas.plan(convenio_id).calcular_bruto(conceptos)
+    
+    def calcular_deducciones(self, sueldo_bruto, convenio_id=None):
+        return self.reglas.plan(convenio_id).calcular_deducciones(sueldo_bruto)
+    
+    def calcular_cargas_sociales(self, sueldo_bruto, convenio_id=None):
+        return self.reglas.plan(convenio_id).calcular_cargas_sociales(sueldo_bruto)
     
     def guardar_liquidacion(self, empresa_id, empleado_id, periodo, bruto, neto, cargas, procesado_por):
         query = """
@@ -96,37 +326,40 @@ class WorkerLiquidacion:
         """
         result = self.db.execute_query(
             query,
-            (empresa_id, empleado_id, periodo, 'completada', bruto, neto, cargas, procesado_por),
-            fetch=False
+            (empresa_id, empleado_id, periodo, 'completada', bruto, neto, cargas, procesado_por)
         )
-        return result
+        return result[0]['id'] if result else None
     
-    def callback(self, ch, method, properties, body):
-        try:
-            task_data = json.loads(body)
-            logger.info(f"Tarea recibida: {task_data.get('task_id')}")
-            
-            # Procesar en el pool de hilos
-            future = self.executor.submit(self.process_task, task_data)
-            resultado = future.result()
-            
-            # Confirmar procesamiento
-            ch.basic_ack(delivery_tag=method.delivery_tag)
-            logger.info(f"Tarea confirmada: {task_data.get('task_id')}")
-            
-        except Exception as e:
-            logger.error(f"Error en callback: {e}")
-            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
-    
-    def start(self):
-        logger.info(f"Iniciando consumo de cola '{QUEUE_LIQUIDACION}'...")
-        self.rabbitmq.consume_tasks(QUEUE_LIQUIDACION, self.callback)
-    
-    def stop(self):
-        self.executor.shutdown(wait=True)
-        self.rabbitmq.close()
-        self.db.close()
-        logger.info("Worker Liquidacion detenido")
+    def guardar_por_fila(self, filas):
+        """
+        (liquidacion_id, error) por fila. Una transaccion con un savepoint por fila:
+        solo las filas que la base rechaza (periodo invalido, empresa inexistente...)
+        quedan en error y el resto se guarda igual.
+        """
+        insertadas = []
+        with self.db.transaccion():
+            for fila in filas:
+                self.db.execute_query("SAVEPOINT fila", fetch=False)
+                try:
+                    liquidacion_id = self.guardar_liquidaciones([fila])[0]['id']
+                except psycopg2.Error as e:
+                    if error_transitorio(e):
+                        raise
+                    self.db.execute_query("ROLLBACK TO SAVEPOINT fila", fetch=False)
+                    insertadas.append((None, str(e).strip()))
+                    continue
+                self.db.execute_query("RELEASE SAVEPOINT fila", fetch=False)
+                insertadas.append((liquidacion_id, None))
+        return insertadas
+    
+    def guardar_liquidaciones(self, filas, page_size=None):
+        query = """
+            INSERT INTO liquidaciones 
+            (empresa_id, empleado_id, periodo, estado, sueldo_bruto, sueldo_neto, cargas_sociales, procesado_por)
+            VALUES %s
+            RETURNING id
+        """
+        return self.db.execute_values(query, filas, fetch=True, page_size=page_size)
 
 
 if __name__ == '__main__':
@@ -1,25 +1,34 @@
-import json
 import logging
 import sys
 import os
+import json
+import time
+import zipfile
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
-from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from common.rabbitmq_handler import RabbitMQHandler
-from common.database import Database
-from config.settings import QUEUE_REPORTES, WORKER_THREAD_POOL_SIZE
+from common.worker_base import WorkerBase
+from common.storage import get_storage
+from common.cache_artefactos import CacheArtefactos
+from common.resumen_liquidaciones import totales_periodo
+from common.snapshot_periodo import bloques_periodo
+from common.reglas import CatalogoReglas
+from common.recibos_pdf import PoolRecibos, DocumentoRecibos
+from config.settings import QUEUE_REPORTES, WORKER_THREAD_POOL_SIZE, RECIBOS_PROGRESO_INTERVALO
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-class WorkerReportes:
+class WorkerReportes(WorkerBase):
+    nombre = 'Worker Reportes'
+    
     def __init__(self):
-        self.rabbitmq = RabbitMQHandler()
-        self.db = Database()
-        self.pool_size = WORKER_THREAD_POOL_SIZE['reportes']
-        self.executor = ThreadPoolExecutor(max_workers=self.pool_size)
-        logger.info(f"Worker Reportes iniciado con pool de {self.pool_size} hilos")
+        super().__init__(QUEUE_REPORTES, WORKER_THREAD_POOL_SIZE['reportes'])
+        self.storage = get_storage()
+        self.artefactos = CacheArtefactos(self.db, self.storage)
+        self.reglas = CatalogoReglas(self.db)
+        # El render de PDF es CPU puro: corre en procesos, no en el pool de hilos
+        self.recibos = PoolRecibos()
     
     def process_task(self, task_data):
         try:
@@ -31,8 +40,25 @@ class WorkerReportes:
             
             if tipo_reporte == 'recibo_sueldo':
                 resultado = self.generar_recibo(liquidacion_id)
+            elif tipo_reporte == 'recibos_empresa':
+                resultado = self.generar_recibos_empresa(task_data.get('empresa_id'), task_data.get('periodo'))
+            elif tipo_reporte == 'recibos_periodo':
+                formato = task_data.get('formato') or 'zip'
+                resultado = self.artefactos.resolver(
+                    'recibos_periodo',
+                    {'empresa_id': task_data.get('empresa_id'), 'periodo': task_data.get('periodo'), 'formato': formato},
+                    'recibos',
+                    lambda: self.generar_recibos_periodo(task_data, formato),
+                    regenerar=task_data.get('regenerar', False)
+                )
             elif tipo_reporte == 'reporte_sindical':
-                resultado = self.generar_reporte_sindical(task_data)
+                resultado = self.artefactos.resolver(
+                    'reporte_sindical',
+                    {'empresa_id': task_data.get('empresa_id'), 'periodo': task_data.get('periodo')},
+                    'reportes',
+                    lambda: self.generar_reporte_sindical(task_data),
+                    regenerar=task_data.get('regenerar', False)
+                )
             else:
                 raise Exception(f"Tipo de reporte no valido: {tipo_reporte}")
             
@@ -44,67 +70,234 @@ class WorkerReportes:
             return {'estado': 'error', 'mensaje': str(e)}
     
     def generar_recibo(self, liquidacion_id):
-        # Obtener datos de liquidacion
-        query = """
-            SELECT l.*, e.nombre, e.apellido, e.cuil, emp.razon_social
-            FROM liquidaciones l
-            JOIN empleados e ON l.empleado_id = e.id
-            JOIN empresas emp ON l.empresa_id = emp.id
-            WHERE l.id = %s
-        """
+        # Obtener datos de liquidacion (empleado y empresa salen de la cache de referencia)
+        query = "SELECT * FROM liquidaciones WHERE id = %s"
         liquidacion = self.db.execute_query(query, (liquidacion_id,))
         
         if not liquidacion:
             raise Exception(f"Liquidacion {liquidacion_id} no encontrada")
         
-        data = liquidacion[0]
-        
-        # Simular generacion de PDF
-        filename = f"recibo_{data['cuil']}_{data['periodo']}.pdf"
-        s3_path = f"s3://recibos/{filename}"
-        
-        # Simular contenido del PDF
-        contenido = {
-            'empleado': f"{data['nombre']} {data['apellido']}",
-            'cuil': data['cuil'],
-            'empresa': data['razon_social'],
-            'periodo': data['periodo'],
-            'bruto': float(data['sueldo_bruto']),
-            'neto': float(data['sueldo_neto']),
-            'fecha_generacion': datetime.now().isoformat()
-        }
+        empleado = self.referencia.empleado(liquidacion[0]['empleado_id'])
+        empresa = self.referencia.empresa(liquidacion[0]['empresa_id'])
+        if not empleado or not empresa:
+            raise Exception(f"Liquidacion {liquidacion_id} sin empleado o empresa asociados")
         
-        logger.info(f"PDF generado: {filename}")
+        datos = self.datos_recibo(liquidacion[0], empleado, empresa)
+        pdf = self.recibos.renderizar(datos)
+        
+        # Nombre por hash de contenido: regenerar un recibo identico no pisa ni duplica
+        archivo = self.storage.guardar(
+            'recibos',
+            f"recibo_{empleado['cuil']}_{datos['periodo']}.pdf",
+            pdf,
+            hash_en_nombre=True
+        )
+        
+        logger.info(f"Recibo generado: {archivo['nombre']}")
         
         return {
             'estado': 'completada',
             'tipo': 'recibo_sueldo',
-            'archivo': filename,
-            's3_path': s3_path,
-            'datos': contenido
+            'archivo': archivo['nombre'],
+            'ruta': archivo['url'],
+            'sha256': archivo['sha256'],
+            'bytes': archivo['bytes'],
+            'datos': {
+                'empleado': f"{empleado['nombre']} {empleado['apellido']}",
+                'cuil': empleado['cuil'],
+                'empresa': empresa['razon_social'],
+                'periodo': datos['periodo'],
+                'bruto': datos['total_haberes'],
+                'neto': datos['neto'],
+                'fecha_generacion': datetime.now().isoformat()
+            }
         }
     
-    def generar_reporte_sindical(self, task_data):
+    def generar_recibos_empresa(self, empresa_id, periodo):
+        """Renderiza los recibos de todas las liquidaciones de la empresa en el periodo repartidos entre los procesos"""
+        empresa = self.referencia.empresa(empresa_id)
+        if not empresa:
+            raise Exception(f"Empresa {empresa_id} no encontrada")
+        
+        inicio = time.monotonic()
+        total = 0
+        total_bytes = 0
+        archivos = []
+        for datos, pdf in self.recibos.renderizar_lote(self.datos_recibos_periodo(empresa, periodo)):
+            archivo = self.storage.guardar(
+                'recibos',
+                f"recibo_{datos['cuil']}_{datos['periodo']}.pdf",
+                pdf,
+                hash_en_nombre=True
+            )
+            total += 1
+            total_bytes += archivo['bytes']
+            if len(archivos) < 5:
+                archivos.append(archivo['url'])
+        segundos = time.monotonic() - inicio
+        
+        if not total:
+            raise Exception("No hay liquidaciones para generar recibos")
+        
+        logger.info(f"Recibos generados: {total} en {segundos:.2f}s ({total / segundos:.0f} recibos/s)")
+        
+        return {
+            'estado': 'completada',
+            'tipo': 'recibos_empresa',
+            'periodo': periodo,
+            'total_recibos': total,
+            'bytes': total_bytes,
+            'segundos': segundos,
+            'recibos_por_segundo': total / segundos if segundos else None,
+            'archivos_preview': archivos
+        }
+    
+    def generar_recibos_periodo(self, task_data, formato):
+        """Todos los recibos del periodo en un unico ZIP o PDF, escritos al storage a medida que se renderizan"""
         empresa_id = task_data.get('empresa_id')
         periodo = task_data.get('periodo')
+        if formato not in ('zip', 'pdf'):
+            raise Exception(f"Formato de recibos no valido: {formato}")
+        empresa = self.referencia.empresa(empresa_id)
+        if not empresa:
+            raise Exception(f"Empresa {empresa_id} no encontrada")
+        
+        filename = f"recibos_{empresa_id}_{periodo.replace('-', '')}.{formato}"
+        avance = {'total': 0}
+        procesados = 0
+        inicio = time.monotonic()
+        proximo_aviso = inicio + RECIBOS_PROGRESO_INTERVALO
+        
+        with self.storage.escritor('recibos', filename) as sink:
+            if formato == 'zip':
+                # Los PDF ya vienen comprimidos: se guardan sin recomprimir
+                contenedor = zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED)
+            else:
+                contenedor = DocumentoRecibos(sink, self.recibos.comprimir)
+            
+            try:
+                pendientes = self.datos_recibos_periodo(empresa, periodo, avance)
+                for datos, pdf in self.recibos.renderizar_lote(pendientes, solo_stream=(formato == 'pdf')):
+                    if formato == 'zip':
+                        contenedor.writestr(f"recibo_{datos['cuil']}_{datos['periodo']}_{datos['liquidacion_id']}.pdf", pdf)
+                    else:
+                        contenedor.agregar(pdf)
+                    procesados += 1
+                    if time.monotonic() >= proximo_aviso:
+                        self.publicar_progreso(task_data, procesados, avance['total'], tipo='recibos_periodo')
+                        proximo_aviso = time.monotonic() + RECIBOS_PROGRESO_INTERVALO
+                
+                if not procesados:
+                    raise Exception("No hay liquidaciones para generar recibos")
+            except Exception:
+                if formato == 'zip':
+                    # Que ZipFile no escriba el directorio central sobre un archivo descartado
+                    contenedor.fp = None
+                raise
+            
+            if formato == 'zip':
+                contenedor.close()
+            else:
+                contenedor.cerrar()
+        
+        archivo = sink.resultado
+        segundos = time.monotonic() - inicio
+        self.publicar_progreso(task_data, procesados, avance['total'], tipo='recibos_periodo')
+        logger.info(f"Recibos del periodo: {filename} - {procesados} recibos en {segundos:.2f}s")
+        
+        return {
+            'estado': 'completada',
+            'tipo': 'recibos_periodo',
+            'archivo': filename,
+            'ruta': archivo['url'],
+            'sha256': archivo['sha256'],
+            'bytes': archivo['bytes'],
+            'formato': formato,
+            'periodo': periodo,
+            'total_recibos': procesados,
+            'segundos': segundos
+        }
+    
+    def datos_recibos_periodo(self, empresa, periodo, avance=None):
+        """Datos de los recibos de la empresa en el periodo, del snapshot si el periodo esta cerrado o de la base por bloques"""
+        empleados = self.referencia.empleados_empresa(empresa['id'], solo_activos=False)
+        
+        # El total para informar el avance sale del resumen mantenido por triggers
+        if avance is not None:
+            totales = totales_periodo(self.db, empresa['id'], periodo, estado='completada')
+            avance['total'] = totales['cantidad'] if totales else 0
         
-        # Obtener liquidaciones del periodo
         query = """
-            SELECT COUNT(*) as total_empleados, 
-                   SUM(sueldo_bruto) as total_bruto,
-                   SUM(cargas_sociales) as total_cargas
-            FROM liquidaciones
-            WHERE empresa_id = %s AND periodo = %s
+            SELECT l.*
+            FROM liquidaciones l
+            WHERE l.empresa_id = %s AND l.periodo = %s AND l.estado = 'completada'
+            ORDER BY l.id
         """
-        resultado = self.db.execute_query(query, (empresa_id, periodo))
+        filas = bloques_periodo(self.db, self.artefactos, self.storage, empresa['id'], periodo,
+                                query, (empresa['id'], periodo), estado='completada')
+        for bloque in filas:
+            for liquidacion in bloque:
+                empleado = empleados.get(liquidacion['empleado_id'])
+                if empleado is None:
+                    logger.warning(f"Liquidacion {liquidacion['id']} sin empleado en la empresa {empresa['id']}")
+                    continue
+                yield self.datos_recibo(liquidacion, empleado, empresa)
+    
+    def datos_recibo(self, liquidacion, empleado, empresa):
+        """Arma los datos que consume la plantilla PDF (liviano de serializar hacia los procesos)"""
+        bruto = float(liquidacion['sueldo_bruto'])
+        neto = float(liquidacion['sueldo_neto'])
+        total_deducciones = round(bruto - neto, 2)
+        
+        # El detalle de deducciones sale del plan del convenio; la ultima absorbe el redondeo
+        conceptos = [('', 'Remuneracion bruta', bruto, None)]
+        plan = self.reglas.plan(empleado.get('convenio_id'))
+        acumulado = 0.0
+        for i, deduccion in enumerate(plan.deducciones):
+            if i == len(plan.deducciones) - 1:
+                monto = round(total_deducciones - acumulado, 2)
+            else:
+                monto = round(bruto * deduccion.tasa, 2)
+            acumulado += monto
+            conceptos.append((deduccion.codigo, deduccion.nombre, None, monto))
         
-        if not resultado:
+        fecha = liquidacion.get('created_at')
+        return {
+            'razon_social': empresa['razon_social'],
+            'cuit': empresa['cuit'],
+            'apellido': empleado['apellido'],
+            'nombre': empleado['nombre'],
+            'cuil': empleado['cuil'],
+            'legajo': empleado.get('legajo'),
+            'liquidacion_id': liquidacion['id'],
+            'periodo': liquidacion['periodo'],
+            # Fecha de la liquidacion (no la de generacion): el mismo recibo produce el mismo PDF
+            'fecha': fecha.strftime('%d/%m/%Y') if fecha else '',
+            'conceptos': conceptos,
+            'total_haberes': bruto,
+            'total_deducciones': total_deducciones,
+            'neto': neto
+        }
+    
+    def generar_reporte_sindical(self, task_data):
+        empresa_id = task_data.get('empresa_id')
+        periodo = task_data.get('periodo')
+        
+        # Totales del periodo desde el resumen mantenido por triggers
+        data = totales_periodo(self.db, empresa_id, periodo)
+        
+        if not data:
             raise Exception("No hay datos para el periodo")
         
-        data = resultado[0]
+        resumen = {
+            'total_empleados': data['cantidad'],
+            'total_bruto': float(data['total_bruto']),
+            'total_cargas': float(data['total_cargas']),
+            'periodo': periodo
+        }
         
-        filename = f"reporte_sindical_{empresa_id}_{periodo}.pdf"
-        s3_path = f"s3://reportes/{filename}"
+        filename = f"reporte_sindical_{empresa_id}_{periodo}.json"
+        archivo = self.storage.guardar('reportes', filename, json.dumps(dict(resumen, empresa_id=empresa_id)))
         
         logger.info(f"Reporte sindical generado: {filename}")
         
@@ -112,41 +305,14 @@ class WorkerReportes:
             'estado': 'completada',
             'tipo': 'reporte_sindical',
             'archivo': filename,
-            's3_path': s3_path,
-            'resumen': {
-                'total_empleados': data['total_empleados'],
-                'total_bruto': float(data['total_bruto'] or 0),
-                'total_cargas': float(data['total_cargas'] or 0),
-                'periodo': periodo
-            }
+            'ruta': archivo['url'],
+            'bytes': archivo['bytes'],
+            'resumen': resumen
         }
     
-    def callback(self, ch, method, properties, body):
-        try:
-            task_data = json.loads(body)
-            logger.info(f"Tarea recibida: {task_data.get('task_id')}")
-            
-            # Procesar en el pool de hilos
-            future = self.executor.submit(self.process_task, task_data)
-            resultado = future.result()
-            
-            # Confirmar procesamiento
-            ch.basic_ack(delivery_tag=method.delivery_tag)
-            logger.info(f"Tarea confirmada: {task_data.get('task_id')}")
-            
-        except Exception as e:
-            logger.error(f"Error en callback: {e}")
-            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
-    
-    def start(self):
-        logger.info(f"Iniciando consumo de cola '{QUEUE_REPORTES}'...")
-        self.rabbitmq.consume_tasks(QUEUE_REPORTES, self.callback)
-    
     def stop(self):
-        self.executor.shutdown(wait=True)
-        self.rabbitmq.close()
-        self.db.close()
-        logger.info("Worker Reportes detenido")
+        super().stop()
+        self.recibos.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,142 @@
+import json
+import logging
+import functools
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from psycopg2.extras import Json
+from common.worker_base import WorkerBase, ESTADOS_FINALES
+from config.settings import (
+    QUEUE_RESULTS,
+    WORKER_THREAD_POOL_SIZE,
+    RESULTADOS_BATCH_SIZE,
+    RESULTADOS_BATCH_MS
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ESTADOS = ('pendiente', 'procesando', 'completada', 'error')
+
+# Un avance que llega tarde nunca pisa un estado final
+QUERY_GUARDAR = """
+    INSERT INTO tareas (task_id, tipo, payload, estado, resultado, error_mensaje)
+    VALUES %s
+    ON CONFLICT (task_id) DO UPDATE SET
+        estado = EXCLUDED.estado,
+        resultado = EXCLUDED.resultado,
+        error_mensaje = EXCLUDED.error_mensaje,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE tareas.estado NOT IN ('completada', 'error')
+       OR EXCLUDED.estado IN ('completada', 'error')
+"""
+
+
+class WorkerResultados(WorkerBase):
+    """
+    Consume la cola de resultados y persiste el estado de cada tarea en la
+    tabla tareas. Los mensajes se juntan en lotes (como las liquidaciones):
+    un INSERT ... ON CONFLICT por lote y el ack cuando el lote quedo escrito.
+    El trigger de tareas avisa cada cambio por NOTIFY a la API.
+    """
+    
+    nombre = 'Worker Resultados'
+    publica_resultados = False
+    
+    def __init__(self):
+        super().__init__(QUEUE_RESULTS, WORKER_THREAD_POOL_SIZE['resultados'])
+        
+        self.batch_size = max(1, RESULTADOS_BATCH_SIZE)
+        self.batch_ms = RESULTADOS_BATCH_MS
+        self.pendientes = []
+        self.timer = None
+        self.canal = None
+        self.prefetch_count = min(65535, self.batch_size * 2)
+    
+    def callback(self, ch, method, properties, body):
+        try:
+            mensaje = json.loads(body)
+        except json.JSONDecodeError as e:
+            logger.error(f"Resultado invalido descartado: {e}")
+            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+            return
+        
+        self.canal = ch
+        self.pendientes.append((method.delivery_tag, mensaje))
+        
+        if len(self.pendientes) >= self.batch_size:
+            self.flush_lote()
+        elif self.timer is None:
+            self.timer = self.rabbitmq.connection.call_later(self.batch_ms / 1000, self.on_timer)
+    
+    def on_timer(self):
+        self.timer = None
+        self.flush_lote()
+    
+    def flush_lote(self):
+        # Corre en el hilo de la conexion: entrega el lote acumulado al pool
+        if self.timer is not None:
+            self.rabbitmq.connection.remove_timeout(self.timer)
+            self.timer = None
+        if not self.pendientes:
+            return
+        
+        entregas, self.pendientes = self.pendientes, []
+        future = self.executor.submit(self.process_batch, [mensaje for _, mensaje in entregas])
+        future.add_done_callback(functools.partial(self.on_batch_done, self.canal, entregas))
+    
+    @staticmethod
+    def ultimo_por_tarea(mensajes):
+        """
+        Un mismo lote puede traer avances y el resultado final de una tarea: queda
+        el ultimo mensaje, salvo que un avance llegue despues del estado final.
+        """
+        ultimos = {}
+        for mensaje in mensajes:
+            task_id = mensaje.get('task_id')
+            if not task_id or mensaje.get('estado') not in ESTADOS:
+                logger.warning(f"Resultado sin task_id o con estado invalido descartado: {str(mensaje)[:200]}")
+                continue
+            anterior = ultimos.get(task_id)
+            if anterior and anterior['estado'] in ESTADOS_FINALES and mensaje['estado'] not in ESTADOS_FINALES:
+                continue
+            ultimos[task_id] = mensaje
+        return ultimos
+    
+    def process_batch(self, mensajes):
+        ultimos = self.ultimo_por_tarea(mensajes)
+        if not ultimos:
+            return []
+        
+        filas = []
+        # Orden fijo de claves: dos lotes concurrentes no se bloquean en orden cruzado
+        for task_id in sorted(ultimos):
+            mensaje = ultimos[task_id]
+            resultado = mensaje.get('resultado')
+            error_mensaje = None
+            if mensaje['estado'] == 'error' and isinstance(resultado, dict):
+                error_mensaje = resultado.get('mensaje')
+            filas.append((
+                task_id,
+                (mensaje.get('tipo') or 'desconocido')[:50],
+                Json(mensaje.get('payload') or {}),
+                mensaje['estado'],
+                Json(resultado) if resultado is not None else None,
+                error_mensaje
+            ))
+        
+        # Con la base caida el lote vuelve a la cola y se reintenta (el upsert es idempotente)
+        with self.db.transaccion():
+            self.db.execute_values(QUERY_GUARDAR, filas)
+        
+        logger.info(f"Lote de resultados guardado: {len(filas)} tareas ({len(mensajes)} mensajes)")
+        return []
+
+if __name__ == '__main__':
+    worker = WorkerResultados()
+    
+    try:
+        worker.start()
+    except KeyboardInterrupt:
+        logger.info("Worker detenido por usuario")
+        worker.stop()
@@ -0,0 +1,209 @@
+import sys
+import os
+import json
+import itertools
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from common.cache_artefactos import CacheArtefactos
+from common.storage import LocalStorage
+
+
+class BaseArtefactos:
+    """Tabla artefactos en memoria: interpreta las consultas que hace CacheArtefactos"""
+
+    def __init__(self):
+        self.filas_liquidaciones = 3
+        self.artefactos = {}
+        self.reloj = itertools.count()
+
+    def execute_query(self, query, params=None, fetch=True):
+        if 'FROM liquidaciones' in query:
+            return [{'filas': self.filas_liquidaciones, 'ultima': datetime(2025, 10, 31)}]
+        if 'SET hits = hits + 1' in query:
+            clave, huella = params
+            fila = self.artefactos.get(clave)
+            if not fila or fila['huella'] != huella or fila['vencido']:
+                return []
+            fila['hits'] += 1
+            fila['ultimo_uso'] = next(self.reloj)
+            return [{k: fila[k] for k in ('resultado', 'contenedor', 'archivos')}]
+        if 'WITH anterior' in query:
+            clave, _, tipo, empresa_id, periodo, huella, contenedor, nombre, archivos, bytes_, resultado = params
+            anterior = self.artefactos.get(clave, {})
+            self.artefactos[clave] = {
+                'clave': clave, 'empresa_id': empresa_id, 'periodo': periodo, 'huella': huella,
+                'contenedor': contenedor, 'archivos': json.loads(archivos), 'bytes': bytes_,
+                'resultado': json.loads(resultado), 'hits': 0, 'vencido': False,
+                'ultimo_uso': next(self.reloj)
+            }
+            return [{'contenedor': anterior.get('contenedor'), 'archivos': anterior.get('archivos')}]
+        if 'WITH orden' in query:
+            conservar, max_bytes, max_items = params
+            orden = sorted(self.artefactos.values(), key=lambda f: (f['vencido'], -f['ultimo_uso'], f['clave']))
+            borrados = []
+            acumulado = 0
+            for posicion, fila in enumerate(orden, 1):
+                acumulado += fila['bytes']
+                if fila['clave'] != conservar and (fila['vencido'] or acumulado > max_bytes or posicion > max_items):
+                    borrados.append(self.artefactos.pop(fila['clave']))
+            return [{'contenedor': f['contenedor'], 'archivos': f['archivos']} for f in borrados]
+        if query.startswith('DELETE FROM artefactos WHERE clave'):
+            fila = self.artefactos.pop(params[0], None)
+            return [{'contenedor': fila['contenedor'], 'archivos': fila['archivos']}] if fila else []
+        if 'SET vencido = TRUE' in query:
+            for fila in self.artefactos.values():
+                if fila['empresa_id'] == params[0] and (len(params) == 1 or fila['periodo'] == params[1]):
+                    fila['vencido'] = True
+            return True
+        raise AssertionError(f"Consulta no esperada: {query}")
+
+
+class Generador:
+    """generar() de una tarea: escribe el archivo (y opcionalmente uno extra) y cuenta las llamadas"""
+
+    def __init__(self, storage, nombre, contenido=b'123456', extra=None):
+        self.storage = storage
+        self.nombre = nombre
+        self.contenido = contenido
+        self.extra = extra
+        self.llamadas = 0
+
+    def __call__(self):
+        self.llamadas += 1
+        archivo = self.storage.guardar('reportes', self.nombre, self.contenido)
+        resultado = {'estado': 'completada', 'archivo': archivo['nombre'], 'bytes': archivo['bytes']}
+        if self.extra:
+            otro = self.storage.guardar('reportes', self.extra, self.contenido)
+            resultado['archivos'] = {'extra': {'archivo': otro['nombre']}}
+        return resultado
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return LocalStorage(str(tmp_path))
+
+
+def parametros(empresa_id=1, periodo='2025-10'):
+    return {'empresa_id': empresa_id, 'periodo': periodo}
+
+
+def test_miss_y_hit(storage):
+    db = BaseArtefactos()
+    cache = CacheArtefactos(db, storage)
+    generar = Generador(storage, 'reporte_1.txt')
+
+    primero = cache.resolver('reporte', parametros(), 'reportes', generar)
+    segundo = cache.resolver('reporte', parametros(), 'reportes', generar)
+
+    assert generar.llamadas == 1
+    assert 'cache' not in primero
+    assert segundo == dict(primero, cache=True)
+    assert cache.metricas() == {'hits': 1, 'misses': 1, 'hit_ratio': 0.5, 'expulsados': 0}
+
+
+def test_regenerar_ignora_la_cache(storage):
+    cache = CacheArtefactos(BaseArtefactos(), storage)
+    generar = Generador(storage, 'reporte_1.txt')
+
+    cache.resolver('reporte', parametros(), 'reportes', generar)
+    cache.resolver('reporte', parametros(), 'reportes', generar, regenerar=True)
+
+    assert generar.llamadas == 2
+    assert storage.existe('reportes', 'reporte_1.txt')
+
+
+def test_huella_distinta_regenera_y_borra_el_archivo_anterior(storage):
+    db = BaseArtefactos()
+    cache = CacheArtefactos(db, storage)
+    cache.resolver('reporte', parametros(), 'reportes', Generador(storage, 'reporte_v1.txt'))
+
+    db.filas_liquidaciones = 4
+    generar = Generador(storage, 'reporte_v2.txt')
+    resultado = cache.resolver('reporte', parametros(), 'reportes', generar)
+
+    assert generar.llamadas == 1
+    assert resultado['archivo'] == 'reporte_v2.txt'
+    assert not storage.existe('reportes', 'reporte_v1.txt')
+    assert list(db.artefactos.values())[0]['archivos'] == ['reporte_v2.txt']
+
+
+def test_invalidar_borra_filas_y_archivos(storage):
+    db = BaseArtefactos()
+    cache = CacheArtefactos(db, storage)
+    cache.resolver('reporte', parametros(periodo='2025-09'), 'reportes', Generador(storage, 'reporte_09.txt'))
+    cache.resolver('reporte', parametros(periodo='2025-10'), 'reportes', Generador(storage, 'reporte_10.txt'))
+
+    cache.invalidar(1, '2025-09')
+
+    assert [f['periodo'] for f in db.artefactos.values()] == ['2025-10']
+    assert not storage.existe('reportes', 'reporte_09.txt')
+    assert storage.existe('reportes', 'reporte_10.txt')
+
+
+def test_expulsa_la_menos_usada_por_cantidad(storage):
+    db = BaseArtefactos()
+    cache = CacheArtefactos(db, storage, max_items=2)
+    for empresa_id in (1, 2):
+        cache.resolver('reporte', parametros(empresa_id), 'reportes', Generador(storage, f"reporte_{empresa_id}.txt"))
+    # La 1 se vuelve a usar: la menos usada pasa a ser la 2
+    cache.resolver('reporte', parametros(1), 'reportes', Generador(storage, 'reporte_1.txt'))
+
+    cache.resolver('reporte', parametros(3), 'reportes', Generador(storage, 'reporte_3.txt'))
+
+    assert sorted(f['empresa_id'] for f in db.artefactos.values()) == [1, 3]
+    assert not storage.existe('reportes', 'reporte_2.txt')
+    assert cache.metricas()['expulsados'] == 1
+
+
+def test_expulsa_por_bytes_pero_conserva_la_recien_guardada(storage):
+    db = BaseArtefactos()
+    cache = CacheArtefactos(db, storage, max_bytes=10)
+    cache.resolver('reporte', parametros(1), 'reportes', Generador(storage, 'reporte_1.txt'))
+
+    cache.resolver('reporte', parametros(2), 'reportes', Generador(storage, 'reporte_2.txt', contenido=b'x' * 20))
+
+    assert [f['empresa_id'] for f in db.artefactos.values()] == [2]
+    assert not storage.existe('reportes', 'reporte_1.txt')
+    assert storage.existe('reportes', 'reporte_2.txt')
+
+
+def test_archivo_faltante_descarta_la_entrada(storage):
+    db = BaseArtefactos()
+    cache = CacheArtefactos(db, storage)
+    cache.resolver('reporte', parametros(), 'reportes', Generador(storage, 'reporte_1.txt', extra='detalle_1.txt'))
+    clave = CacheArtefactos.clave('reporte', parametros())
+    huella = cache.huella(1, '2025-10')
+
+    storage.eliminar('reportes', 'detalle_1.txt')
+
+    assert cache.obtener(clave, huella) is None
+    assert db.artefactos == {}
+    # El archivo que quedaba se borra junto con la fila
+    assert not storage.existe('reportes', 'reporte_1.txt')
+
+
+def test_archivo_faltante_se_regenera(storage):
+    cache = CacheArtefactos(BaseArtefactos(), storage)
+    generar = Generador(storage, 'reporte_1.txt')
+    cache.resolver('reporte', parametros(), 'reportes', generar)
+
+    storage.eliminar('reportes', 'reporte_1.txt')
+    resultado = cache.resolver('reporte', parametros(), 'reportes', generar)
+
+    assert generar.llamadas == 2
+    assert 'cache' not in resultado
+    assert storage.existe('reportes', 'reporte_1.txt')
+
+
+def test_error_no_se_guarda(storage):
+    db = BaseArtefactos()
+    cache = CacheArtefactos(db, storage)
+
+    resultado = cache.resolver('reporte', parametros(), 'reportes', lambda: {'estado': 'error', 'archivo': None})
+
+    assert resultado['estado'] == 'error'
+    assert db.artefactos == {}
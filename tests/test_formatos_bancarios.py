@@ -0,0 +1,107 @@
+import sys
+import os
+from decimal import Decimal
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from common.formatos_bancarios import Campo, Layout, FormatoError, obtener_formato, solo_digitos
+
+
+EMPRESA = {
+    'empresa_id': 1,
+    'cuit': '30-12345678-9',
+    'razon_social': 'Distribuidora Sur SA',
+    'fecha_proceso': '20251031',
+    'periodo': '202510'
+}
+
+LIQUIDACIONES = [
+    {'cuil': '20-12345678-6', 'cbu': '0110599520000001234567', 'apellido': 'Perez', 'nombre': 'Juan', 'sueldo_neto': Decimal('4.35')},
+    {'cuil': '27-23456789-0', 'cbu': None, 'apellido': 'Gomez', 'nombre': 'Maria Laura', 'sueldo_neto': Decimal('1234567.89')}
+]
+
+
+def test_generico_bytes():
+    formato = obtener_formato('generico')
+    resumen = {'total_registros': 2, 'total_importe': Decimal('1234572.24')}
+
+    archivo = formato.separador.join([
+        formato.header.codificar(EMPRESA),
+        formato.detalle.codificar_lote(LIQUIDACIONES, formato.separador),
+        formato.footer.codificar(resumen)
+    ]).encode(formato.encoding)
+
+    assert archivo == (
+        b"030-12345678-920251031202510\n"
+        b"120-12345678-60110599520000001234567Perez               Juan                000000000000435\n"
+        b"127-23456789-00000000000000000000000Gomez               Maria Laura         000000123456789\n"
+        b"900000002000000000123457224"
+    )
+
+
+def test_nacion_bytes():
+    formato = obtener_formato('nacion')
+    resumen = {'total_registros': 2, 'total_importe': Decimal('1234572.24')}
+
+    header = formato.header.codificar(EMPRESA)
+    detalle = formato.detalle.codificar_lote(LIQUIDACIONES, formato.separador)
+    footer = formato.footer.codificar(resumen)
+
+    assert header == "130123456789DISTRIBUIDORA SUR SA          20251031202510" + " " * 44
+    assert detalle.split("\r\n") == [
+        "2011059952000000123456720123456786PEREZ JUAN                    00000000000000435" + " " * 19,
+        "2000000000000000000000027234567890GOMEZ MARIA LAURA             00000000123456789" + " " * 19
+    ]
+    assert footer == "3000000200000000123457224" + " " * 75
+    for linea in [header, footer] + detalle.split("\r\n"):
+        assert len(linea) == 100
+
+
+@pytest.mark.parametrize('importe, centavos', [
+    (4.35, 435),
+    (0.29, 29),
+    (1.005, 101),
+    ('19.99', 1999),
+    (Decimal('0.125'), 13),
+    (Decimal('7'), 700),
+    (0, 0)
+])
+def test_importe_redondeo_half_up(importe, centavos):
+    layout = Layout('prueba', [Campo('importe', 10, 'num', escala=100)])
+
+    assert layout.codificar({'importe': importe}) == "%010d" % centavos
+
+
+def test_codificar_lote_igual_a_codificar():
+    formato = obtener_formato('generico')
+
+    lote = formato.detalle.codificar_lote(LIQUIDACIONES, "\n")
+
+    assert lote.split("\n") == [formato.detalle.codificar(fila) for fila in LIQUIDACIONES]
+
+
+def test_campos_literales_y_alineacion():
+    layout = Layout('prueba', [
+        Campo('tipo', 1, valor='5'),
+        Campo('codigo', 6, transformar=solo_digitos),
+        Campo('cantidad', 4, 'num', relleno=' '),
+        Campo('nombre', 5, alineacion='>'),
+        Campo('filler', 3, valor='')
+    ])
+
+    assert layout.codificar({'codigo': '12-34.5', 'cantidad': 7, 'nombre': 'Ana'}) == "512345    7  Ana   "
+
+
+def test_numero_que_no_entra_en_el_ancho():
+    layout = Layout('prueba', [Campo('importe', 5, 'num', escala=100)])
+
+    with pytest.raises(FormatoError):
+        layout.codificar({'importe': Decimal('1000.00')})
+    with pytest.raises(FormatoError):
+        layout.codificar_lote([{'importe': 1}, {'importe': Decimal('1000.00')}])
+
+
+def test_banco_sin_formato_usa_generico():
+    assert obtener_formato('banco_inexistente') is obtener_formato('generico')
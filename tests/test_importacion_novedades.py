@@ -0,0 +1,169 @@
+import sys
+import os
+import io
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from common.importacion_novedades import ImportacionNovedades, FormatoInvalido, registros_csv, registros_ndjson
+
+CODIGOS = {'00001', '000100', '03000'}
+
+
+def importacion(**kwargs):
+    return ImportacionNovedades({1, 2, 3, 4}, CODIGOS, **kwargs)
+
+
+def test_csv_agrupa_filas_seguidas():
+    texto = io.StringIO(
+        "empleado_id,codigo,monto,tipo\n"
+        "1,00001,500000,remunerativo\n"
+        "1,000100,50000,\n"
+        "2,00001,400000,\n"
+    )
+
+    registros = list(registros_csv(texto))
+
+    assert registros == [
+        (2, '1', [(2, {'codigo': '00001', 'tipo': 'remunerativo', 'monto': '500000'}),
+                  (3, {'codigo': '000100', 'monto': '50000'})], None),
+        (4, '2', [(4, {'codigo': '00001', 'monto': '400000'})], None)
+    ]
+
+
+def test_csv_faltan_columnas():
+    with pytest.raises(FormatoInvalido, match='monto'):
+        list(registros_csv(io.StringIO("empleado_id,codigo\n1,00001\n")))
+
+
+def test_csv_desordenado_se_rechaza_entero():
+    texto = io.StringIO(
+        "empleado_id,codigo,monto\n"
+        "1,00001,500000\n"
+        "2,00001,400000\n"
+        "1,000100,50000\n"
+    )
+
+    with pytest.raises(FormatoInvalido, match='Fila 4: el empleado 1 ya aparecio antes'):
+        list(registros_csv(texto))
+
+
+def test_csv_desordenado_no_envia_ningun_bloque():
+    texto = io.StringIO(
+        "empleado_id,codigo,monto\n"
+        "1,00001,500000\n"
+        "2,00001,400000\n"
+        "3,00001,300000\n"
+        "1,000100,50000\n"
+    )
+    enviados = []
+
+    with pytest.raises(FormatoInvalido):
+        for bloque in importacion(tamano=1).bloques_validados(registros_csv(texto)):
+            enviados.append(bloque)
+
+    assert enviados == []
+
+
+def test_ndjson():
+    texto = io.StringIO(
+        '{"empleado_id": 1, "conceptos": [{"codigo": "00001", "monto": 500000}]}\n'
+        '\n'
+        '{"empleado_id": 2\n'
+        '[1, 2]\n'
+    )
+
+    registros = list(registros_ndjson(texto))
+
+    assert registros[0] == (1, 1, [(1, {'codigo': '00001', 'monto': 500000})], None)
+    assert registros[1][0] == 3 and registros[1][3].startswith('JSON invalido')
+    assert registros[2] == (4, None, [], 'Se esperaba un objeto con empleado_id y una lista de conceptos')
+
+
+@pytest.mark.parametrize('concepto, mensaje', [
+    ({'monto': 1}, 'Concepto sin codigo'),
+    ({'codigo': '99999', 'monto': 1}, 'Concepto 99999 inexistente'),
+    ({'codigo': '00001', 'monto': 1, 'tipo': 'bono'}, 'Tipo de concepto invalido: bono'),
+    ({'codigo': '00001', 'monto': 'mil'}, 'Monto invalido en el concepto 00001: mil'),
+    ({'codigo': '00001', 'monto': -1}, 'Monto invalido en el concepto 00001: -1'),
+    ({'codigo': '00001', 'monto': 'nan'}, 'Monto invalido en el concepto 00001: nan')
+])
+def test_concepto_invalido(concepto, mensaje):
+    assert importacion().validar_concepto(concepto) == (None, mensaje)
+
+
+def test_concepto_valido():
+    valido, motivo = importacion().validar_concepto({'codigo': ' 00001 ', 'monto': '1500.5', 'nombre': 'Basico'})
+
+    assert motivo is None
+    assert valido == {'codigo': '00001', 'nombre': 'Basico', 'monto': 1500.5}
+
+
+@pytest.mark.parametrize('empleado_id, mensaje', [
+    ('x', 'empleado_id invalido: x'),
+    (9, 'Empleado inexistente, inactivo o de otra empresa'),
+    (3, 'Empleado ya liquidado en el periodo')
+])
+def test_empleado_rechazado(empleado_id, mensaje):
+    validador = importacion(liquidados={3})
+
+    assert validador.validar(7, empleado_id, [(7, {'codigo': '00001', 'monto': 1})], None) is None
+    assert validador.rechazos == [{'fila': 7, 'empleado_id': empleado_id, 'mensaje': mensaje}]
+
+
+def test_un_concepto_invalido_rechaza_al_empleado():
+    validador = importacion()
+    conceptos = [(2, {'codigo': '00001', 'monto': 1000}), (3, {'codigo': '99999', 'monto': 5})]
+
+    assert validador.validar(2, '1', conceptos, None) is None
+    assert validador.rechazos == [{'fila': 3, 'empleado_id': 1, 'mensaje': 'Concepto 99999 inexistente'}]
+    assert validador.filas == 2
+
+
+def test_empleado_repetido():
+    validador = importacion()
+    conceptos = [(1, {'codigo': '00001', 'monto': 1000})]
+
+    assert validador.validar(1, 1, conceptos, None) == {'empleado_id': 1, 'conceptos': [{'codigo': '00001', 'monto': 1000.0}]}
+    assert validador.validar(2, 1, conceptos, None) is None
+    assert validador.rechazos[-1]['mensaje'] == 'Empleado repetido en el archivo'
+
+
+def test_bloques():
+    texto = io.StringIO(
+        "empleado_id,codigo,monto\n"
+        "1,00001,100\n"
+        "1,000100,10\n"
+        "9,00001,100\n"
+        "2,00001,200\n"
+        "3,00001,300\n"
+    )
+    validador = importacion(tamano=2)
+
+    bloques = list(validador.bloques_validados(registros_csv(texto)))
+
+    assert [(desde, hasta, [n['empleado_id'] for n in novedades]) for desde, hasta, novedades in bloques] == [
+        (2, 5, [1, 2]),
+        (6, 6, [3])
+    ]
+    assert bloques[0][2][0]['conceptos'] == [{'codigo': '00001', 'monto': 100.0}, {'codigo': '000100', 'monto': 10.0}]
+    assert validador.resumen() == {
+        'filas': 5,
+        'empleados_aceptados': 3,
+        'empleados_rechazados': 1,
+        'rechazos': [{'fila': 4, 'empleado_id': 9, 'mensaje': 'Empleado inexistente, inactivo o de otra empresa'}],
+        'rechazos_omitidos': 0
+    }
+
+
+def test_rechazos_acotados():
+    validador = importacion(max_rechazos=2)
+
+    for fila in range(5):
+        validador.validar(fila, 99, [(fila, {'codigo': '00001', 'monto': 1})], None)
+
+    resumen = validador.resumen()
+    assert len(resumen['rechazos']) == 2
+    assert resumen['empleados_rechazados'] == 5
+    assert resumen['rechazos_omitidos'] == 3
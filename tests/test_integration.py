@@ -6,11 +6,15 @@ import logging
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
 from cliente.cliente import Cliente
-from common.database import Database
+from common.database import Database, cerrar_listener
+from common.espera_tareas import EsperaTareas, ESTADOS_FINALES
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# task_id de las tareas aceptadas: se espera su resultado antes de verificar la BD
+TAREAS_ACEPTADAS = []
+
 
 def test_liquidacion():
     """Test de liquidacion de sueldo"""
@@ -147,6 +151,95 @@ def test_carga_concurrente():
         return False
 
 
+def test_pipeline():
+    """Test de varias tareas en pipeline sobre una conexion persistente"""
+    logger.info("\n=== TEST 6: PIPELINE EN CONEXION PERSISTENTE ===")
+    
+    cliente = Cliente()
+    
+    # Muchos conceptos: el mensaje supera el viejo limite de 4096 bytes
+    conceptos = [
+        {'codigo': f'{n:05d}', 'nombre': f'Concepto {n}', 'tipo': 'remunerativo', 'monto': 1000}
+        for n in range(200)
+    ]
+    tareas = [
+        {
+            'tipo': 'liquidacion',
+            'empresa_id': 1,
+            'empleado_id': i,
+            'periodo': '2025-10',
+            'procesado_por': f'Test Pipeline {i}',
+            'conceptos': conceptos
+        }
+        for i in range(1, 6)
+    ]
+    
+    respuestas = cliente.enviar_tareas(tareas)
+    cliente.cerrar()
+    
+    if respuestas and all(r['status'] == 'aceptada' for r in respuestas):
+        logger.info("TEST PIPELINE: PASS")
+        return True
+    else:
+        logger.error("TEST PIPELINE: FAIL")
+        return False
+
+
+def test_lote():
+    """Test de envio de tareas en lote"""
+    logger.info("\n=== TEST 7: ENVIO EN LOTE ===")
+    
+    cliente = Cliente()
+    
+    tareas = [
+        {
+            'tipo': 'liquidacion',
+            'empresa_id': 1,
+            'empleado_id': i,
+            'periodo': '2025-10',
+            'procesado_por': f'Test Lote {i}',
+            'conceptos': [
+                {'codigo': '00001', 'nombre': 'Sueldo Basico', 'tipo': 'remunerativo', 'monto': 400000 + (i * 10000)}
+            ]
+        }
+        for i in range(1, 6)
+    ]
+    # Una tarea invalida: debe rechazarse sin afectar al resto del lote
+    tareas.append({'tipo': 'liquidacion', 'empresa_id': 1})
+    
+    respuesta = cliente.enviar_lote(tareas)
+    cliente.cerrar()
+    
+    if respuesta:
+        TAREAS_ACEPTADAS.extend(t['task_id'] for t in respuesta.get('tareas', []) if t.get('status') == 'aceptada')
+    
+    if respuesta and respuesta['aceptadas'] == 5 and respuesta['tareas'][5]['status'] == 'error':
+        logger.info("TEST LOTE: PASS")
+        return True
+    else:
+        logger.error("TEST LOTE: FAIL")
+        return False
+
+
+def esperar_tareas(timeout=30):
+    """
+    Espera el resultado de las tareas aceptadas (tabla tareas + NOTIFY) en lugar
+    de dormir. Devuelve el estado de cada task_id (None si no termino a tiempo).
+    """
+    espera = EsperaTareas()
+    limite = time.monotonic() + timeout
+    estados = {}
+    for task_id in TAREAS_ACEPTADAS:
+        tarea = espera.esperar(task_id, max(0, limite - time.monotonic()))
+        if not tarea or tarea['estado'] not in ESTADOS_FINALES:
+            logger.warning(f"Tarea {task_id} sin resultado despues de {timeout}s")
+            estados[task_id] = None
+        else:
+            logger.info(f"Tarea {task_id}: {tarea['estado']}")
+            estados[task_id] = tarea['estado']
+    return estados
+
+
 def verificar_resultados():
     """Verifica resultados en la base de datos"""
     logger.info("\n=== VERIFICACION DE RESULTADOS EN BD ===")
@@ -183,10 +276,17 @@ if __name__ == '__main__':
     resultados.append(test_archivo_bancario())
     resultados.append(test_cargas_sociales())
     resultados.append(test_carga_concurrente())
+    resultados.append(test_pipeline())
+    resultados.append(test_lote())
     
     # Esperar procesamiento
     logger.info("\nEsperando que los workers procesen las tareas...")
-    time.sleep(5)
+    estados = esperar_tareas()
+    cerrar_listener()
+    
+    assert len(estados) == 5, f"Se esperaban 5 tareas del lote, hay {len(estados)}"
+    pendientes = {task_id: estado for task_id, estado in estados.items() if estado != 'completada'}
+    assert not pendientes, f"Tareas del lote sin completar: {pendientes}"
     
     # Verificar resultados
     resultados.append(verificar_resultados())
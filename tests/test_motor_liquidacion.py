@@ -0,0 +1,87 @@
+import sys
+import os
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from common.motor_liquidacion import liquidar_periodo, armar_matrices
+from common.reglas import Concepto, PlanLiquidacion, PLAN_POR_DEFECTO
+
+COMERCIO = PlanLiquidacion(1, [
+    Concepto('00001', 'Sueldo Basico', 'remunerativo'),
+    Concepto('000200', 'Presentismo', 'remunerativo'),
+    Concepto('03000', 'Jubilacion 11%', 'deduccion', 0.11, 10),
+    Concepto('03002', 'Ley 19032 3%', 'deduccion', 0.03, 20),
+    Concepto('03010', 'Obra Social 3%', 'deduccion', 0.03, 30),
+    Concepto('03500', 'Aporte Sindical 2.5%', 'deduccion', 0.025, 40),
+    Concepto('04000', 'Contribuciones Patronales 23%', 'contribucion', 0.23, 100)
+])
+
+NOVEDADES = [
+    (1, [{'codigo': '00001', 'tipo': 'remunerativo', 'monto': 500000}, {'codigo': '000100', 'tipo': 'remunerativo', 'monto': 50000}]),
+    (2, [{'codigo': '00001', 'monto': 812345.67}, {'codigo': '000200', 'monto': 67695.47}, {'codigo': '03000', 'monto': 1}]),
+    (3, [{'codigo': '00300', 'tipo': 'no_remunerativo', 'monto': 1000.1}]),
+    (4, [])
+]
+
+
+def por_empleado(novedades, planes):
+    return [
+        (empleado_id,) + tuple(plan.ejecutar(conceptos))
+        for (empleado_id, conceptos), plan in zip(novedades, planes)
+    ]
+
+
+@pytest.mark.parametrize('planes', [
+    [PLAN_POR_DEFECTO] * len(NOVEDADES),
+    [COMERCIO] * len(NOVEDADES),
+    [PLAN_POR_DEFECTO, COMERCIO, PLAN_POR_DEFECTO, COMERCIO]
+])
+def test_igual_a_la_liquidacion_por_empleado(planes):
+    resultado = liquidar_periodo(NOVEDADES, planes)
+
+    esperado = [(i, bruto, neto, cargas) for i, bruto, _, neto, cargas in por_empleado(NOVEDADES, planes)]
+    obtenido = [(i, bruto, neto, cargas) for i, bruto, _, neto, cargas in resultado.filas()]
+    # Mismo orden de operaciones: identico bit a bit, no solo aproximado
+    assert obtenido == esperado
+
+
+def test_plan_por_defecto():
+    resultado = liquidar_periodo([(1, [{'tipo': 'remunerativo', 'monto': 100000}])])
+
+    assert list(resultado.filas()) == [(1, 100000.0, 17000.0, 83000.0, 23000.0)]
+
+
+def test_conceptos_sin_tipo_usan_el_del_plan():
+    _, montos, remunerativo = armar_matrices(NOVEDADES[1:2], [COMERCIO])
+
+    assert montos.tolist() == [[812345.67, 67695.47, 1.0]]
+    assert remunerativo.tolist() == [[True, True, False]]
+
+
+def test_totales():
+    resultado = liquidar_periodo(NOVEDADES, COMERCIO)
+    filas = list(resultado.filas())
+
+    totales = resultado.totales()
+
+    assert totales['total_empleados'] == 4
+    assert totales['total_bruto'] == pytest.approx(sum(f[1] for f in filas))
+    assert totales['total_neto'] == pytest.approx(sum(f[3] for f in filas))
+    assert totales['total_bruto'] - totales['total_deducciones'] == pytest.approx(totales['total_neto'])
+    assert list(totales['deducciones_detalle']) == ['03000', '03002', '03010', '03500']
+    assert totales['deducciones_detalle']['03500'] == pytest.approx(totales['total_bruto'] * 0.025)
+
+
+def test_convenio_sin_el_concepto_lleva_tasa_cero():
+    resultado = liquidar_periodo(NOVEDADES[:2], [PLAN_POR_DEFECTO, COMERCIO])
+
+    assert resultado.deducciones_detalle['03500'].tolist() == [0.0, pytest.approx(880041.14 * 0.025)]
+
+
+def test_periodo_vacio():
+    resultado = liquidar_periodo([], COMERCIO)
+
+    assert len(resultado) == 0
+    assert resultado.totales()['total_neto'] == 0.0
@@ -0,0 +1,144 @@
+import sys
+import os
+import json
+import socket
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from common.protocol import (
+    FrameDecoder, ProtocolError, ConexionFramed, HEADER, HEADER_SIZE, MAGIC,
+    encode_frame, decode_header, recv_frame, es_legacy, legacy_completo
+)
+from config.settings import SOCKET_MAX_FRAME_SIZE
+
+
+def test_encode_frame_bytes():
+    frame = encode_frame({'tipo': 'ping'}, request_id=7)
+
+    assert frame == b'LQ\x01\x01\x00\x00\x00\x10\x00\x00\x00\x07{"tipo": "ping"}'
+
+
+def test_encode_frame_sin_request_id():
+    frame = encode_frame(b'{}')
+
+    assert decode_header(frame[:HEADER_SIZE]) == (2, None)
+
+
+def test_frames_completos():
+    decoder = FrameDecoder()
+    decoder.feed(encode_frame({'n': 1}, 1) + encode_frame({'n': 2}, 2))
+
+    frames = [(json.loads(payload), request_id) for payload, request_id in decoder.frames()]
+
+    assert frames == [({'n': 1}, 1), ({'n': 2}, 2)]
+    assert decoder.buffer == bytearray()
+
+
+def test_frames_de_a_un_byte():
+    datos = encode_frame({'tipo': 'liquidacion', 'nombre': 'Muñoz'}, 3) + encode_frame({}, 4)
+    decoder = FrameDecoder()
+
+    frames = []
+    for i in range(len(datos)):
+        decoder.feed(datos[i:i + 1])
+        frames.extend(decoder.frames())
+
+    assert [request_id for _, request_id in frames] == [3, 4]
+    assert json.loads(frames[0][0]) == {'tipo': 'liquidacion', 'nombre': 'Muñoz'}
+
+
+def test_frame_incompleto_queda_en_el_buffer():
+    frame = encode_frame({'n': 1}, 9)
+    decoder = FrameDecoder()
+    decoder.feed(frame[:-1])
+
+    assert list(decoder.frames()) == []
+    assert len(decoder.buffer) == len(frame) - 1
+
+    decoder.feed(frame[-1:])
+    assert list(decoder.frames()) == [(b'{"n": 1}', 9)]
+
+
+def test_frame_vacio():
+    decoder = FrameDecoder()
+    decoder.feed(encode_frame(b'', 5))
+
+    assert list(decoder.frames()) == [(b'', 5)]
+
+
+@pytest.mark.parametrize('header', [
+    HEADER.pack(b'XX', 1, 0, 0, 0),
+    HEADER.pack(MAGIC, 2, 0, 0, 0),
+    HEADER.pack(MAGIC, 1, 0, SOCKET_MAX_FRAME_SIZE + 1, 0)
+])
+def test_header_invalido(header):
+    decoder = FrameDecoder()
+    decoder.feed(header)
+
+    with pytest.raises(ProtocolError):
+        list(decoder.frames())
+
+
+def test_frame_demasiado_grande():
+    with pytest.raises(ProtocolError):
+        encode_frame(b'x' * (SOCKET_MAX_FRAME_SIZE + 1))
+
+
+@pytest.mark.parametrize('data, legacy', [
+    (b'{"tipo"', True),
+    (b'L', False),
+    (b'LQ\x01', False),
+    (b'Lx', True)
+])
+def test_es_legacy(data, legacy):
+    assert es_legacy(data) is legacy
+
+
+@pytest.mark.parametrize('data, completo', [
+    (b'{"tipo": "ping"}', True),
+    (b'{"tipo": "pi', False),
+    (b'{"tipo": "ping", ', False),
+    ('{"nombre": "Muñ'.encode('utf-8')[:-1], False),
+    (b'{"tipo": ping}', True)
+])
+def test_legacy_completo(data, completo):
+    assert legacy_completo(data) is completo
+
+
+def conexion_con_servidor(responder, ventana):
+    """ConexionFramed sobre un socketpair; el servidor lee un frame y no lee el siguiente hasta haber respondido"""
+    cliente, servidor = socket.socketpair()
+
+    def atender():
+        with servidor:
+            while True:
+                frame = recv_frame(servidor)
+                if frame is None:
+                    return
+                mensaje, request_id = frame
+                servidor.sendall(encode_frame(responder(mensaje), request_id))
+
+    threading.Thread(target=atender, daemon=True).start()
+    cliente.settimeout(10)
+    conexion = ConexionFramed('localhost', 0, timeout=10, ventana=ventana)
+    conexion.socket = cliente
+    return conexion
+
+
+def test_pipeline_respuestas_en_orden():
+    with conexion_con_servidor(lambda m: {'eco': m['n']}, ventana=3) as conexion:
+        assert conexion.solicitar_varios([{'n': n} for n in range(10)]) == [{'eco': n} for n in range(10)]
+        assert conexion.solicitar({'n': 99}) == {'eco': 99}
+
+
+def test_pipeline_no_se_traba_con_mensajes_grandes():
+    # Solicitudes y respuestas de 1 MB: con un sendall de toda la ventana el cliente no
+    # lee mientras envia y el servidor queda bloqueado escribiendo su primera respuesta
+    relleno = 'x' * (1 << 20)
+    with conexion_con_servidor(lambda m: {'n': m['n'], 'relleno': relleno}, ventana=8) as conexion:
+        respuestas = conexion.solicitar_varios([{'n': n, 'relleno': relleno} for n in range(8)])
+
+    assert [r['n'] for r in respuestas] == list(range(8))
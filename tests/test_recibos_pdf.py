@@ -0,0 +1,119 @@
+import sys
+import os
+import io
+import re
+import zlib
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from common.recibos_pdf import PlantillaRecibo, DocumentoRecibos, Slot, importe
+
+DATOS = {
+    'razon_social': 'Distribuidora Sur SA',
+    'cuit': '30-50001091-2',
+    'periodo': '2025-10',
+    'apellido': 'Muñoz',
+    'nombre': 'José (h)',
+    'cuil': '20-12345678-6',
+    'legajo': None,
+    'liquidacion_id': 42,
+    'fecha': '31/10/2025',
+    'conceptos': [
+        ('00001', 'Sueldo Basico', 500000.0, None),
+        ('03000', 'Jubilacion 11%', None, 55000.0)
+    ],
+    'total_haberes': 500000.0,
+    'total_deducciones': 55000.0,
+    'neto': 445000.0
+}
+
+
+def verificar_estructura(pdf):
+    """La xref apunta a cada objeto y startxref a la xref"""
+    assert pdf.startswith(b"%PDF-1.4\n")
+    assert pdf.endswith(b"\n%%EOF\n")
+    inicio_xref = int(re.search(rb"startxref\n(\d+)\n%%EOF\n$", pdf).group(1))
+    assert pdf[inicio_xref:].startswith(b"xref\n0 ")
+    total = int(re.match(rb"xref\n0 (\d+)\n", pdf[inicio_xref:]).group(1))
+    offsets = re.findall(rb"(\d{10}) 00000 n \n", pdf[inicio_xref:])
+    assert len(offsets) == total - 1
+    for numero, offset in enumerate(offsets, start=1):
+        assert pdf[int(offset):].startswith(f"{numero} 0 obj\n".encode('ascii'))
+    for largo, stream in re.findall(rb"/Length (\d+) >>\nstream\n(.*?)\nendstream", pdf, re.S):
+        assert int(largo) == len(stream)
+
+
+@pytest.mark.parametrize('valor, texto', [
+    (0, '0,00'),
+    (4.35, '4,35'),
+    (1234567.8, '1.234.567,80'),
+    (-1500.5, '-1.500,50')
+])
+def test_importe(valor, texto):
+    assert importe(valor) == texto
+
+
+@pytest.mark.parametrize('comprimir', [False, True])
+def test_render_estructura(comprimir):
+    verificar_estructura(PlantillaRecibo(comprimir).render(DATOS))
+
+
+def test_render_contenido():
+    plantilla = PlantillaRecibo(comprimir=False)
+
+    contenido = plantilla.contenido(DATOS)
+
+    assert contenido == zlib.decompress(PlantillaRecibo(comprimir=True).stream(DATOS))
+    assert b"(RECIBO DE HABERES) Tj" in contenido
+    assert b"(Periodo 2025-10) Tj" in contenido
+    # WinAnsiEncoding y parentesis escapados
+    assert "(Muñoz, José \\(h\\)) Tj".encode('cp1252') in contenido
+    assert b"(-) Tj" in contenido
+    assert b"(500.000,00) Tj" in contenido
+    assert b"($ 445.000,00) Tj" in contenido
+
+
+def test_slot_alineado_a_derecha():
+    slot = Slot('F1', 10, 100, 50, 'derecha')
+
+    assert slot.texto('11') == "BT /F1 10 Tf 88.88 50 Td (11) Tj ET\n"
+
+
+def test_slot_recorta_al_ancho():
+    slot = Slot('F1', 10, 0, 0, ancho=50)
+
+    recortado = slot.ajustar('Sueldo Anual Complementario')
+
+    assert recortado.endswith('...')
+    assert slot.medir(recortado) <= 50
+    assert slot.ajustar('Sueldo') == 'Sueldo'
+
+
+def test_conceptos_que_no_entran_se_agrupan():
+    plantilla = PlantillaRecibo(comprimir=False)
+    conceptos = [(f"{i:05d}", f"Concepto {i}", 100.0, 10.0) for i in range(30)]
+
+    contenido = plantilla.contenido(dict(DATOS, conceptos=conceptos))
+
+    assert contenido.count(b"(Concepto ") == PlantillaRecibo.MAX_FILAS - 1
+    assert b"(Otros \\(9 conceptos\\)) Tj" in contenido
+    assert b"(900,00) Tj" in contenido
+    assert b"(90,00) Tj" in contenido
+
+
+@pytest.mark.parametrize('comprimir', [False, True])
+def test_documento_varias_paginas(comprimir):
+    plantilla = PlantillaRecibo(comprimir)
+    destino = io.BytesIO()
+
+    documento = DocumentoRecibos(destino, comprimir)
+    for i in range(3):
+        documento.agregar(plantilla.stream(dict(DATOS, liquidacion_id=i)))
+    documento.cerrar()
+
+    pdf = destino.getvalue()
+    verificar_estructura(pdf)
+    assert documento.posicion == len(pdf)
+    assert b"/Kids [5 0 R 7 0 R 9 0 R] /Count 3" in pdf
@@ -0,0 +1,133 @@
+import sys
+import os
+from decimal import Decimal
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from common.reglas import CatalogoReglas, PLAN_POR_DEFECTO, tasa_decimal
+
+CONCEPTOS = [
+    {'id': 1, 'codigo': '00001', 'nombre': 'Sueldo Basico', 'tipo': 'remunerativo', 'es_comun': True, 'porcentaje': None, 'orden': 100},
+    {'id': 6, 'codigo': '03000', 'nombre': 'Jubilacion 11%', 'tipo': 'deduccion', 'es_comun': True, 'porcentaje': Decimal('11.000'), 'orden': 10},
+    {'id': 8, 'codigo': '03010', 'nombre': 'Obra Social 3%', 'tipo': 'deduccion', 'es_comun': True, 'porcentaje': Decimal('3.000'), 'orden': 30},
+    {'id': 9, 'codigo': '03500', 'nombre': 'Aporte Sindical 2.5%', 'tipo': 'deduccion', 'es_comun': False, 'porcentaje': Decimal('2.500'), 'orden': 40},
+    {'id': 10, 'codigo': '04000', 'nombre': 'Contribuciones Patronales 23%', 'tipo': 'contribucion', 'es_comun': True, 'porcentaje': Decimal('23.000'), 'orden': 100}
+]
+
+
+class BaseReglas:
+    """Devuelve las filas de las tablas de reglas y cuenta las consultas"""
+
+    def __init__(self, conceptos=CONCEPTOS, vinculos=({'convenio_id': 1, 'concepto_id': 9},), huella='h1'):
+        self.conceptos = list(conceptos)
+        self.vinculos = list(vinculos)
+        self.huella = huella
+        self.consultas = []
+        self.falla = False
+
+    def execute_query(self, query, params=None):
+        if self.falla:
+            return None
+        if 'huella' in query:
+            self.consultas.append('huella')
+            return [{'huella': self.huella}]
+        if 'convenio_conceptos' in query:
+            self.consultas.append('vinculos')
+            return self.vinculos
+        self.consultas.append('conceptos')
+        return self.conceptos
+
+
+@pytest.mark.parametrize('porcentaje, tasa', [
+    (Decimal('11.000'), 0.11),
+    (Decimal('3.000'), 0.03),
+    (Decimal('2.500'), 0.025),
+    (None, None)
+])
+def test_tasa_decimal(porcentaje, tasa):
+    assert tasa_decimal(porcentaje) == tasa
+
+
+def test_plan_por_defecto():
+    assert PLAN_POR_DEFECTO.ejecutar([{'tipo': 'remunerativo', 'monto': 100000}]) == (100000, 17000.0, 83000.0, 23000.0)
+    assert PLAN_POR_DEFECTO.tasa('03000') == 0.11
+    assert PLAN_POR_DEFECTO.tasa('99999') == 0.0
+
+
+def test_plan_por_convenio():
+    catalogo = CatalogoReglas(BaseReglas(), intervalo=60)
+
+    comercio = catalogo.plan(1)
+    sin_convenio = catalogo.plan(None)
+
+    assert [c.codigo for c in comercio.deducciones] == ['03000', '03010', '03500']
+    assert [c.codigo for c in sin_convenio.deducciones] == ['03000', '03010']
+    assert [c.codigo for c in comercio.contribuciones] == ['04000']
+    assert comercio.tasa('03500') == 0.025
+    assert sin_convenio.tasa('03500') == 0.0
+
+
+def test_tipo_sale_de_la_novedad_o_del_concepto():
+    plan = CatalogoReglas(BaseReglas(), intervalo=60).plan(1)
+
+    assert plan.tipo({'codigo': '00001'}) == 'remunerativo'
+    assert plan.tipo({'codigo': '00001', 'tipo': 'no_remunerativo'}) == 'no_remunerativo'
+    assert plan.tipo({'codigo': '99999'}) is None
+    assert plan.calcular_bruto([{'codigo': '00001', 'monto': 1000}, {'codigo': '03000', 'monto': 5}, {'codigo': '99999', 'monto': 7}]) == 1000
+
+
+def test_ejecutar():
+    plan = CatalogoReglas(BaseReglas(), intervalo=60).plan(1)
+
+    bruto, deducciones, neto, cargas = plan.ejecutar([{'codigo': '00001', 'monto': 200000}])
+
+    assert bruto == 200000
+    assert deducciones == pytest.approx(200000 * (0.11 + 0.03 + 0.025))
+    assert neto == bruto - deducciones
+    assert cargas == pytest.approx(46000)
+
+
+def test_planes_compilados_una_vez():
+    db = BaseReglas()
+    catalogo = CatalogoReglas(db, intervalo=60)
+
+    primero = catalogo.plan(1)
+
+    assert catalogo.plan(1) is primero
+    assert db.consultas == ['huella', 'conceptos', 'vinculos']
+    assert catalogo.compilaciones == 1
+
+
+def test_recompila_si_cambia_la_huella():
+    db = BaseReglas()
+    catalogo = CatalogoReglas(db, intervalo=0)
+    anterior = catalogo.plan(1)
+
+    assert catalogo.plan(1) is anterior
+
+    db.huella = 'h2'
+    db.conceptos[1] = dict(db.conceptos[1], porcentaje=Decimal('12.000'))
+    nuevo = catalogo.plan(1)
+
+    assert nuevo is not anterior
+    assert nuevo.tasa('03000') == 0.12
+    assert catalogo.compilaciones == 2
+
+
+def test_sin_tablas_usa_el_plan_por_defecto():
+    db = BaseReglas()
+    db.falla = True
+
+    assert CatalogoReglas(db, intervalo=60).plan(1) is PLAN_POR_DEFECTO
+
+
+def test_si_la_base_falla_mantiene_los_planes_compilados():
+    db = BaseReglas()
+    catalogo = CatalogoReglas(db, intervalo=0)
+    plan = catalogo.plan(1)
+
+    db.falla = True
+
+    assert catalogo.plan(1) is plan
@@ -0,0 +1,87 @@
+import sys
+import os
+from decimal import Decimal
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from common.snapshot_periodo import escribir_snapshot, SnapshotPeriodo, NULO
+from common.storage import LocalStorage
+from common.validaciones import validar_cbus
+
+FILAS = [
+    {'id': 10, 'empleado_id': 1, 'estado': 'completada', 'sueldo_bruto': Decimal('500000.00'),
+     'sueldo_neto': Decimal('415000.00'), 'cargas_sociales': Decimal('115000.00'),
+     'created_at': datetime(2025, 10, 31, 12, 30, 0, 123456), 'legajo': 'A-1', 'apellido': 'Muñoz',
+     'nombre': 'José', 'cuil': '20123456786', 'cbu': '2850590940090418135201', 'posicion_nombre': 1},
+    {'id': 11, 'empleado_id': 2, 'estado': 'error', 'sueldo_bruto': None, 'sueldo_neto': None,
+     'cargas_sociales': None, 'created_at': None, 'legajo': None, 'apellido': 'Acosta',
+     'nombre': '', 'cuil': '27234567891', 'cbu': None, 'posicion_nombre': 0}
+]
+
+
+class BaseSnapshot:
+    """Devuelve FILAS en bloques como Database.stream_query"""
+
+    def stream_query(self, query, params=None):
+        yield FILAS[:1]
+        yield FILAS[1:]
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    storage = LocalStorage(str(tmp_path))
+    resultado = escribir_snapshot(BaseSnapshot(), storage, 1, '2025-10')
+    with SnapshotPeriodo(storage.ruta('snapshots', resultado['archivo'])) as snapshot:
+        yield snapshot
+
+
+def test_resultado(tmp_path):
+    resultado = escribir_snapshot(BaseSnapshot(), LocalStorage(str(tmp_path)), 1, '2025-10')
+
+    assert resultado['archivo'] == 'periodo_1_202510.lqs'
+    assert resultado['filas'] == 2
+    assert resultado['estados'] == {'completada': 1, 'error': 1}
+
+
+def test_bloques_igual_a_la_base(snapshot):
+    filas = [fila for bloque in snapshot.bloques() for fila in bloque]
+
+    esperado = [
+        {clave: valor for clave, valor in fila.items() if clave != 'posicion_nombre'}
+        for fila in FILAS
+    ]
+    assert filas == [dict(fila, periodo='2025-10') for fila in esperado]
+
+
+def test_nulos_no_son_textos_vacios(snapshot):
+    filas = [fila for bloque in snapshot.bloques() for fila in bloque]
+
+    assert filas[1]['cbu'] is None
+    assert filas[1]['legajo'] is None
+    assert filas[1]['nombre'] == ''
+    assert validar_cbus([f['cbu'] for f in filas]).errores == [None, 'vacio']
+
+
+def test_columnas_numericas(snapshot):
+    assert snapshot.columna('sueldo_neto').tolist() == [41500000, NULO]
+    assert snapshot.columna('created_at')[1] == NULO
+
+
+def test_orden_y_estado(snapshot):
+    assert snapshot.indices(orden='orden_nombre').tolist() == [1, 0]
+    assert snapshot.cantidad('completada') == 1
+    assert snapshot.cantidad('anulada') == 0
+    assert [f['id'] for b in snapshot.bloques(orden='orden_nombre') for f in b] == [11, 10]
+    assert snapshot.texto('apellido', snapshot.indices('completada')) == ['Muñoz']
+
+
+def test_sin_liquidaciones(tmp_path):
+    class BaseVacia:
+        def stream_query(self, query, params=None):
+            return iter([])
+
+    with pytest.raises(Exception):
+        escribir_snapshot(BaseVacia(), LocalStorage(str(tmp_path)), 1, '2025-10')
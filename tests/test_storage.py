@@ -0,0 +1,193 @@
+import sys
+import os
+import hashlib
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from common.storage import LocalStorage, S3Storage, nombre_con_hash
+
+
+class ClienteS3:
+    """Cliente boto3 en memoria: registra las llamadas y guarda los objetos por (bucket, clave)"""
+
+    def __init__(self, falla_parte=None):
+        self.falla_parte = falla_parte
+        self.objetos = {}
+        self.partes = {}
+        self.llamadas = []
+        self.lock = threading.Lock()
+
+    def registrar(self, nombre, **kwargs):
+        with self.lock:
+            self.llamadas.append((nombre, kwargs))
+
+    def nombres(self):
+        return [nombre for nombre, _ in self.llamadas]
+
+    def head_bucket(self, Bucket):
+        raise Exception('NoSuchBucket')
+
+    def create_bucket(self, Bucket):
+        self.registrar('create_bucket', Bucket=Bucket)
+
+    def put_object(self, Bucket, Key, Body):
+        self.registrar('put_object', Bucket=Bucket, Key=Key)
+        self.objetos[(Bucket, Key)] = Body
+
+    def create_multipart_upload(self, Bucket, Key):
+        self.registrar('create_multipart_upload', Bucket=Bucket, Key=Key)
+        return {'UploadId': 'up-1'}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self.registrar('upload_part', PartNumber=PartNumber)
+        if PartNumber == self.falla_parte:
+            raise Exception(f"Fallo la parte {PartNumber}")
+        with self.lock:
+            self.partes[PartNumber] = Body
+        return {'ETag': f"etag-{PartNumber}"}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self.registrar('complete_multipart_upload', Parts=MultipartUpload['Parts'])
+        self.objetos[(Bucket, Key)] = b''.join(self.partes[p['PartNumber']] for p in MultipartUpload['Parts'])
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.registrar('abort_multipart_upload', Key=Key, UploadId=UploadId)
+
+    def copy(self, origen, bucket, clave):
+        self.registrar('copy', origen=origen, bucket=bucket, clave=clave)
+        self.objetos[(bucket, clave)] = self.objetos[(origen['Bucket'], origen['Key'])]
+
+    def delete_object(self, Bucket, Key):
+        self.registrar('delete_object', Bucket=Bucket, Key=Key)
+        self.objetos.pop((Bucket, Key), None)
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objetos:
+            raise Exception('404')
+
+
+@pytest.fixture
+def s3():
+    cliente = ClienteS3()
+    storage = S3Storage(client=cliente, bucket_prefix='test-', threads=2, max_en_vuelo=2)
+    yield cliente, storage
+    storage.close()
+
+
+def test_s3_archivo_chico_un_put(s3):
+    cliente, storage = s3
+
+    resultado = storage.guardar('recibos', 'recibo_1.pdf', b'contenido')
+
+    assert cliente.objetos == {('test-recibos', 'recibo_1.pdf'): b'contenido'}
+    assert 'create_multipart_upload' not in cliente.nombres()
+    assert resultado['url'] == 's3://test-recibos/recibo_1.pdf'
+    assert resultado['bytes'] == 9
+    assert resultado['sha256'] == hashlib.sha256(b'contenido').hexdigest()
+    assert storage.existe('recibos', 'recibo_1.pdf')
+
+
+def test_s3_multipart(s3):
+    cliente, storage = s3
+    datos = b'a' * storage.part_size + b'b' * storage.part_size + b'c' * 10
+
+    with storage.escritor('bancos', 'pagos.txt') as escritor:
+        for inicio in range(0, len(datos), 1 << 20):
+            escritor.write(datos[inicio:inicio + (1 << 20)])
+
+    partes = [llamada for llamada in cliente.llamadas if llamada[0] == 'complete_multipart_upload'][0][1]['Parts']
+    assert [p['PartNumber'] for p in partes] == [1, 2, 3]
+    assert cliente.objetos[('test-bancos', 'pagos.txt')] == datos
+    assert 'put_object' not in cliente.nombres()
+
+
+def test_s3_parte_fallida_aborta(s3):
+    cliente, storage = s3
+    cliente.falla_parte = 2
+
+    with pytest.raises(Exception, match='Fallo la parte 2'):
+        with storage.escritor('bancos', 'pagos.txt') as escritor:
+            escritor.write(b'x' * (storage.part_size * 2 + 10))
+
+    nombres = cliente.nombres()
+    assert 'abort_multipart_upload' in nombres
+    assert 'complete_multipart_upload' not in nombres
+    assert escritor.resultado is None
+    assert not cliente.objetos
+
+
+def test_s3_hash_en_nombre_copia_y_borra_temporal(s3):
+    cliente, storage = s3
+    sha256 = hashlib.sha256(b'contenido').hexdigest()
+
+    resultado = storage.guardar('recibos', 'recibo_1.pdf', b'contenido', hash_en_nombre=True)
+
+    final = nombre_con_hash('recibo_1.pdf', sha256)
+    assert resultado['nombre'] == final
+    put = [kwargs for nombre, kwargs in cliente.llamadas if nombre == 'put_object'][0]
+    assert put['Key'].startswith('.tmp/')
+    assert cliente.nombres()[-2:] == ['copy', 'delete_object']
+    assert cliente.llamadas[-1][1] == {'Bucket': 'test-recibos', 'Key': put['Key']}
+    assert cliente.objetos == {('test-recibos', final): b'contenido'}
+
+
+def test_s3_eliminar(s3):
+    cliente, storage = s3
+    storage.guardar('recibos', 'recibo_1.pdf', b'contenido')
+
+    storage.eliminar('recibos', 'recibo_1.pdf')
+
+    assert not storage.existe('recibos', 'recibo_1.pdf')
+
+
+def test_local_no_visible_hasta_publicar(tmp_path):
+    storage = LocalStorage(str(tmp_path))
+
+    with storage.escritor('recibos', 'recibo_1.pdf') as escritor:
+        escritor.write(b'parte 1 ')
+        assert not storage.existe('recibos', 'recibo_1.pdf')
+        assert os.listdir(storage.ruta('recibos', '')) == [os.path.basename(escritor.temporal)]
+        escritor.write('parte 2')
+
+    assert os.listdir(storage.ruta('recibos', '')) == ['recibo_1.pdf']
+    with storage.abrir('recibos', 'recibo_1.pdf') as archivo:
+        assert archivo.read() == b'parte 1 parte 2'
+    assert escritor.resultado['bytes'] == 15
+
+
+def test_local_error_descarta_temporal(tmp_path):
+    storage = LocalStorage(str(tmp_path))
+    storage.guardar('recibos', 'recibo_1.pdf', b'anterior')
+
+    with pytest.raises(ValueError):
+        with storage.escritor('recibos', 'recibo_1.pdf') as escritor:
+            escritor.write(b'nuevo')
+            raise ValueError('corte')
+
+    assert escritor.resultado is None
+    assert os.listdir(storage.ruta('recibos', '')) == ['recibo_1.pdf']
+    with storage.abrir('recibos', 'recibo_1.pdf') as archivo:
+        assert archivo.read() == b'anterior'
+
+
+def test_local_hash_en_nombre(tmp_path):
+    storage = LocalStorage(str(tmp_path))
+
+    resultado = storage.guardar('recibos', 'recibo_1.pdf', b'contenido', hash_en_nombre=True)
+
+    assert resultado['nombre'] == nombre_con_hash('recibo_1.pdf', hashlib.sha256(b'contenido').hexdigest())
+    assert os.listdir(storage.ruta('recibos', '')) == [resultado['nombre']]
+
+
+def test_local_existe_y_eliminar(tmp_path):
+    storage = LocalStorage(str(tmp_path))
+    storage.guardar('recibos', 'recibo_1.pdf', b'contenido')
+
+    assert storage.existe('recibos', 'recibo_1.pdf')
+    storage.eliminar('recibos', 'recibo_1.pdf')
+    assert not storage.existe('recibos', 'recibo_1.pdf')
+    # Eliminar algo que ya no esta no es un error
+    storage.eliminar('recibos', 'recibo_1.pdf')
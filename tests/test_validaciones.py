@@ -0,0 +1,89 @@
+import sys
+import os
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from common.validaciones import validar_cbus, validar_cuils, validar_cuits, digito_cbu, digito_cuil
+
+
+@pytest.mark.parametrize('cbu, error', [
+    ('2850590940090418135201', None),
+    ('0170099220000067797370', None),
+    ('285-0590-9 40090418135201', None),
+    ('2850590940090418135202', 'digito_bloque2'),
+    ('2850591940090418135201', 'digito_bloque1'),
+    ('1850590940090418135202', 'digito_bloque1'),
+    ('285059094009041813520', 'longitud'),
+    ('28505909400904181352011', 'longitud'),
+    ('28505909400904181352O1', 'caracteres'),
+    ('28505909400904181352ñ1', 'caracteres'),
+    ('', 'vacio'),
+    (None, 'vacio')
+])
+def test_cbu(cbu, error):
+    assert validar_cbus([cbu]).errores == [error]
+
+
+@pytest.mark.parametrize('cuil, error', [
+    ('20123456786', None),
+    ('20-12345678-6', None),
+    ('23000000000', None),
+    ('20123456780', 'digito_verificador'),
+    ('27234567890', 'digito_verificador'),
+    ('20200000090', 'digito_verificador'),
+    ('30500010912', 'prefijo'),
+    ('11123456786', 'prefijo'),
+    ('2012345678', 'longitud'),
+    ('201234567861', 'longitud'),
+    ('20-1234567A-6', 'caracteres'),
+    ('', 'vacio')
+])
+def test_cuil(cuil, error):
+    assert validar_cuils([cuil]).errores == [error]
+
+
+@pytest.mark.parametrize('cuit, error', [
+    ('30500010912', None),
+    ('33-69345023-9', None),
+    ('20123456786', None),
+    ('30500010913', 'digito_verificador'),
+    ('40500010912', 'prefijo')
+])
+def test_cuit(cuit, error):
+    assert validar_cuits([cuit]).errores == [error]
+
+
+def test_lote_mezclado():
+    valores = ['2850590940090418135201', None, '2850590940090418135202', '0170099220000067797370', '123']
+
+    reporte = validar_cbus(valores)
+
+    assert reporte.errores == [None, 'vacio', 'digito_bloque2', None, 'longitud']
+    assert reporte.validos.tolist() == [True, False, False, True, False]
+    assert reporte.total_invalidos == 3
+    assert reporte.normalizados[0] == '2850590940090418135201'
+    assert reporte.errores_por_fila(limite=1) == [{'indice': 1, 'valor': None, 'error': 'vacio'}]
+    assert reporte.resumen() == {
+        'total': 5,
+        'validos': 2,
+        'invalidos': 3,
+        'por_error': {'vacio': 1, 'longitud': 1, 'digito_bloque2': 1}
+    }
+
+
+def test_lote_vacio():
+    reporte = validar_cuils([])
+
+    assert reporte.errores == []
+    assert reporte.total_invalidos == 0
+
+
+def test_digitos_verificadores():
+    assert digito_cbu('2850590') == 9
+    assert digito_cbu('4009041813520') == 1
+    assert digito_cuil('2012345678') == 6
+    assert digito_cuil('3050001091') == 2
+    # Un resto de 10 no tiene digito valido
+    assert digito_cuil('2020000009') == -1